@@ -136,6 +136,12 @@ class Driver(AbstractCustomUser):
 
     objects = BaseCustomUserManager()
 
+    class Meta:
+        indexes = [
+            # Serves the nearest-driver candidate query (availability, vehicle and bounding box)
+            models.Index(fields=['is_available', 'vehicle_type', 'latitude', 'longitude']),
+        ]
+
     def __str__(self):
         return f"{self.email} - {self.vehicle_type or 'No Vehicle Data'}"
 
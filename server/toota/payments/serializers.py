@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from .models import Payment
 from trips.models import Trip
+from trips.quotes import InvalidQuoteToken, verify_quote
 
 
 class PaymentSerializer(serializers.ModelSerializer):
@@ -9,21 +10,19 @@ class PaymentSerializer(serializers.ModelSerializer):
     currency = serializers.CharField(max_length=3)
     trip_id = serializers.UUIDField()
     location = serializers.CharField(max_length=3)
+    quote_token = serializers.CharField(required=False, write_only=True)
 
     class Meta:
         model = Payment
         fields = ['trip_id', 'currency', 'payment_method', 'user', 'amount', 'transaction_id',
-                  'payment_reference', 'created_at', 'location']
+                  'payment_reference', 'created_at', 'location', 'quote_token']
         read_only_fields = ['amount', 'transaction_id', 'payment_reference', 'created_at']
 
     def validate_trip_id(self, value):
-        try:
-            trip = Trip.objects.get(id=value)
-            if Payment.objects.filter(trip_id=value, status='success').exists():
-                raise serializers.ValidationError("This trip has already been paid for.")
-            return value
-        except Trip.DoesNotExist:
-            raise serializers.ValidationError("Invalid trip ID. Trip does not exist.")
+        # Whether the trip exists is checked in validate(), where a quote token can vouch for it.
+        if Payment.objects.filter(trip_id=value, status='success').exists():
+            raise serializers.ValidationError("This trip has already been paid for.")
+        return value
 
     def validate_currency(self, value):
         valid_currencies = ['USD', 'NGN', 'KES', 'ZAR', 'GHS']
@@ -36,3 +35,20 @@ class PaymentSerializer(serializers.ModelSerializer):
         if value.upper() not in valid_locations:
             raise serializers.ValidationError(f"Unsupported location: {value}. Use one of {valid_locations}")
         return value.upper()
+
+    def validate(self, attrs):
+        # A verified quote was signed for an existing trip and carries the amount,
+        # so the trip is not loaded at all; it is not a Payment field.
+        token = attrs.pop("quote_token", None)
+        if token:
+            try:
+                attrs["quote"] = verify_quote(token, attrs["trip_id"])
+            except InvalidQuoteToken as e:
+                raise serializers.ValidationError({"quote_token": str(e)})
+        elif not Trip.objects.filter(id=attrs["trip_id"]).exists():
+            raise serializers.ValidationError({"trip_id": "Invalid trip ID. Trip does not exist."})
+        return attrs
+
+    def create(self, validated_data):
+        validated_data.pop("quote", None)
+        return super().create(validated_data)
@@ -1,5 +1,6 @@
 from django.shortcuts import render
 import logging, requests, uuid, json
+from decimal import Decimal
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from django.http import JsonResponse
@@ -52,6 +53,10 @@ class PaymentView(APIView):
                 'location': openapi.Schema(
                     type=openapi.TYPE_STRING,
                     description="country code (e.g., NG, ZA)"
+                ),
+                'quote_token': openapi.Schema(
+                    type=openapi.TYPE_STRING,
+                    description="Signed quote from create_trip; the fare is taken from it instead of the trip"
                 )
             },
             example={
@@ -106,8 +111,12 @@ class PaymentView(APIView):
         currency = serializer.validated_data["currency"]
         location = serializer.validated_data["location"]
 
-        trip = get_object_or_404(Trip, id=trip_id)
-        amount = trip.accepted_fare
+        quote = serializer.validated_data.get("quote")
+        if quote:
+            amount = Decimal(str(quote["fare"]))
+        else:
+            trip = get_object_or_404(Trip, id=trip_id)
+            amount = trip.accepted_fare
         if amount is None:
             return Response({"error": "Trip has no accepted fare set."}, status=status.HTTP_400_BAD_REQUEST)
         transaction_id = str(uuid.uuid4())
@@ -168,6 +168,33 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Driver location store shared by all workers ("redis") or kept per process ("memory")
+REDIS_URL = config('REDIS_URL', default='redis://127.0.0.1:6379/0')
+DRIVER_LOCATION_BACKEND = config('DRIVER_LOCATION_BACKEND', default='redis')
+# Candidate source for find_nearest_drivers: "grid" (in-process index), "geo" (Redis GEOSEARCH)
+# or "db" (bounding-box query on the Driver table)
+DRIVER_MATCHING_MODE = config('DRIVER_MATCHING_MODE', default='grid')
+# Drivers silent for longer than this are skipped by matching and swept to unavailable
+DRIVER_STALE_AFTER_SECONDS = config('DRIVER_STALE_AFTER_SECONDS', default=120, cast=int)
+# OSRM routes are cached per rounded pickup/destination pair (4 decimals is ~11 m)
+ROUTE_CACHE_PRECISION = config('ROUTE_CACHE_PRECISION', default=4, cast=int)
+ROUTE_CACHE_TTL_SECONDS = config('ROUTE_CACHE_TTL_SECONDS', default=900, cast=int)
+# Routing backend used by trips.osrm (per-request timeout in seconds)
+OSRM_BASE_URL = config('OSRM_BASE_URL', default='http://router.project-osrm.org')
+OSRM_TIMEOUT_SECONDS = config('OSRM_TIMEOUT_SECONDS', default=5.0, cast=float)
+# Optional second OSRM deployment; slow primary requests are hedged to it
+OSRM_SECONDARY_URL = config('OSRM_SECONDARY_URL', default=None)
+# Zone-to-zone route matrix written by `manage.py build_zone_matrix` (.npy/.json suffixes added)
+ZONE_MATRIX_PATH = config('ZONE_MATRIX_PATH', default=str(BASE_DIR / 'zone_matrix'))
+
+# Shared cache (driver cards etc.) on the same Redis instance
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    },
+}
+
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'UTC'
 USE_I18N = True
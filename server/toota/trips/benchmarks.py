@@ -0,0 +1,148 @@
+"""
+Synthetic fleet benchmarks for the matching path.
+
+Drivers are seeded around South African and Nigerian city centres into a
+throwaway test database, with the in-memory location store and presence
+tracker standing in for Redis. Used by `python manage.py benchmark_matching`.
+"""
+import time
+import uuid
+from contextlib import ExitStack
+from unittest.mock import patch
+
+import numpy as np
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from authentication.models import Driver, User
+from .location_store import InMemoryLocationStore
+from .models import Trip
+from .presence import InMemoryPresence
+from .spatial import DriverGridIndex
+
+CITY_CENTRES = {
+    "Johannesburg": (-26.2041, 28.0473),
+    "Pretoria": (-25.7479, 28.2293),
+    "Cape Town": (-33.9249, 18.4241),
+    "Durban": (-29.8587, 31.0218),
+    "Lagos": (6.5244, 3.3792),
+    "Abuja": (9.0765, 7.3986),
+}
+# Standard deviation (degrees) of the driver spread around each centre, ~17 km.
+CITY_SPREAD_DEG = 0.15
+VEHICLE_TYPES = [choice for choice, _ in Driver.VEHICLE_CHOICES]
+
+
+def synthetic_points(count, rng, spread=CITY_SPREAD_DEG):
+    """`count` (lat, lon) pairs scattered normally around randomly chosen city centres."""
+    centres = np.array(list(CITY_CENTRES.values()))
+    picks = centres[rng.integers(0, len(centres), count)]
+    return picks + rng.normal(0.0, spread, (count, 2))
+
+
+def seed_drivers(count, rng, batch_size=5000):
+    """Bulk-insert `count` available drivers and return their (id, lat, lon, vehicle_type) rows."""
+    password = make_password(None)
+    points = synthetic_points(count, rng)
+    vehicles = rng.choice(VEHICLE_TYPES, count)
+    rows = []
+    for start in range(0, count, batch_size):
+        batch = []
+        for i in range(start, min(start + batch_size, count)):
+            driver_id = uuid.uuid4()
+            lat, lon = float(points[i][0]), float(points[i][1])
+            batch.append(Driver(
+                id=driver_id, email=f"bench-{driver_id}@example.com", password=password,
+                latitude=lat, longitude=lon, vehicle_type=str(vehicles[i]), is_available=True, is_active=True,
+            ))
+            rows.append((driver_id, lat, lon, str(vehicles[i])))
+        Driver.objects.bulk_create(batch)
+    return rows
+
+
+def summarize(timings_ms, query_counts):
+    """p50/p95/p99 latency in ms and mean queries per call."""
+    timings = np.asarray(timings_ms, dtype=np.float64)
+    p50, p95, p99 = np.percentile(timings, [50, 95, 99])
+    return {
+        "calls": len(timings),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "queries_per_call": round(float(np.mean(query_counts)), 2),
+    }
+
+
+def time_calls(fn, args_list):
+    """Run fn(*args) for every entry, timing each call and counting its SQL queries."""
+    timings, query_counts = [], []
+    for args in args_list:
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            fn(*args)
+            timings.append((time.perf_counter() - started) * 1000.0)
+        query_counts.append(len(queries))
+    return summarize(timings, query_counts)
+
+
+def run_matching_benchmark(fleet_size, calls=200, modes=("grid", "db", "geo"), seed=42):
+    """
+    Seed `fleet_size` drivers and time nearest-driver queries (per matching
+    mode), fare quotes and trip creation. Returns {benchmark name: summary}.
+    The caller is responsible for providing a disposable database.
+    """
+    from .utils import find_nearest_drivers
+
+    rng = np.random.default_rng(seed)
+    rows = seed_drivers(fleet_size, rng)
+
+    index = DriverGridIndex()
+    index.warm(rows)
+    store = InMemoryLocationStore()
+    presence = InMemoryPresence()
+    for driver_id, lat, lon, vehicle_type in rows:
+        store.update(driver_id, lat, lon, vehicle_type=vehicle_type)
+        presence.mark_seen(driver_id)
+
+    pickups = synthetic_points(calls, rng)
+    destinations = pickups + rng.normal(0.0, 0.1, pickups.shape)
+    vehicle_types = rng.choice(VEHICLE_TYPES, calls)
+    user = User.objects.create_user(email=f"bench-rider-{uuid.uuid4()}@example.com", password=None)
+
+    results = {}
+    with ExitStack() as stack:
+        stack.enter_context(patch("trips.utils.driver_index", index))
+        stack.enter_context(patch("trips.utils.get_location_store", return_value=store))
+        stack.enter_context(patch("trips.utils.get_presence", return_value=presence))
+
+        for mode in modes:
+            results[f"find_nearest_drivers[{mode}]"] = time_calls(
+                lambda lat, lon, vehicle: find_nearest_drivers(lat, lon, [vehicle], mode=mode),
+                [(float(lat), float(lon), str(v)) for (lat, lon), v in zip(pickups, vehicle_types)],
+            )
+
+        distances_km = rng.uniform(1, 60, calls)
+        minutes = distances_km * rng.uniform(1.5, 3.0, calls)
+        results["Trip.calculate_fare"] = time_calls(
+            lambda vehicle, km, mins: Trip(vehicle_type=vehicle).calculate_fare(km, mins, surge=False),
+            [(str(v), float(km), float(m)) for v, km, m in zip(vehicle_types, distances_km, minutes)],
+        )
+
+        def create_trip(pickup, destination, vehicle, km, mins):
+            trip = Trip.objects.create(
+                user=user, vehicle_type=vehicle, pickup="Benchmark pickup", destination="Benchmark destination",
+                pickup_lat=pickup[0], pickup_long=pickup[1], dest_lat=destination[0], dest_long=destination[1],
+            )
+            trip.accepted_fare = trip.calculate_fare(km, mins, surge=False)
+            trip.save()
+            find_nearest_drivers(trip.pickup_lat, trip.pickup_long, [trip.vehicle_type])
+
+        results["create_trip"] = time_calls(
+            create_trip,
+            [
+                (tuple(map(float, p)), tuple(map(float, d)), str(v), float(km), float(m))
+                for p, d, v, km, m in zip(pickups, destinations, vehicle_types, distances_km, minutes)
+            ],
+        )
+    return results
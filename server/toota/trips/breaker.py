@@ -0,0 +1,78 @@
+import threading
+import time
+
+from django.conf import settings
+
+# Consecutive failed (or too slow) calls that open the breaker.
+BREAKER_FAILURE_THRESHOLD = getattr(settings, 'OSRM_BREAKER_FAILURES', 5)
+# How long an open breaker rejects calls before letting one probe through.
+BREAKER_OPEN_SECONDS = getattr(settings, 'OSRM_BREAKER_OPEN_SECONDS', 30.0)
+# Successful calls slower than this still count as failures.
+BREAKER_SLOW_CALL_SECONDS = getattr(settings, 'OSRM_SLOW_CALL_SECONDS', 2.0)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after `failure_threshold` consecutive failures or slow calls.
+    Open rejects calls for `open_seconds`, then half-open lets a single probe
+    through: success closes the breaker, failure re-opens it.
+
+    Callers ask allow() before each call and report the outcome with
+    record_success(elapsed) / record_failure(), or abandon() if the call was
+    cancelled before it finished.
+    """
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, open_seconds=BREAKER_OPEN_SECONDS,
+                 slow_call_seconds=BREAKER_SLOW_CALL_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.slow_call_seconds = slow_call_seconds
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                return HALF_OPEN
+            return self._state
+
+    def allow(self):
+        with self._lock:
+            if self._state == OPEN:
+                if time.monotonic() - self._opened_at < self.open_seconds:
+                    return False
+                self._state = HALF_OPEN
+            if self._state == HALF_OPEN:
+                if self._probing:
+                    return False
+                self._probing = True
+            return True
+
+    def record_success(self, elapsed=0.0):
+        if elapsed > self.slow_call_seconds:
+            self.record_failure()
+            return
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+
+    def abandon(self):
+        """The allowed call was cancelled; free the half-open probe slot without a verdict."""
+        with self._lock:
+            self._probing = False
@@ -1,24 +1,32 @@
 import json
 import logging
-from datetime import datetime
+from decimal import Decimal
 from asgiref.sync import sync_to_async
 from channels.layers import get_channel_layer
-import re
-from asyncio import sleep, create_task
 import asyncio
+import redis
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from authentication.models import User, Driver
 from .models import Trip
 from channels.exceptions import StopConsumer
 from payments.models import Payment
-from .utils import get_route_data, find_nearest_drivers, is_peak_hour_or_festive
+from .utils import get_driver_etas, get_route_data_async, get_trip_route, find_nearest_drivers
+from .spatial import driver_index
+from .location_store import get_location_store
+from .dispatch import dispatcher
+from .presence import ensure_sweeper_running, get_presence
+from .surge import current_multiplier, get_surge_engine
+from .quotes import InvalidQuoteToken, quote_route, sign_quote, verify_quote
+from .heartbeat import HeartbeatMixin
+from .ingest import LocationCoalescer
+from .position_buffer import position_buffer
 
 
 logger = logging.getLogger(__name__)
 
 
-class DriverLocationConsumer(AsyncWebsocketConsumer):
+class DriverLocationConsumer(HeartbeatMixin, AsyncWebsocketConsumer):
     """Updates the location of the driver in real-time."""
     async def connect(self):
 
@@ -26,20 +34,29 @@ class DriverLocationConsumer(AsyncWebsocketConsumer):
             self.driver = self.scope.get("user")
             self.driver_id = self.driver.id
             self.room_group_name = f"driver_{self.driver_id}"
+            # Only this socket listens here, unlike the room group riders watching the driver join.
+            self.availability_group_name = f"driver_availability_{self.driver_id}"
             await self.channel_layer.group_add(self.room_group_name, self.channel_name)
+            await self.channel_layer.group_add(self.availability_group_name, self.channel_name)
             await self.accept()
             logger.info("User connection accepted")
-            self.ping_task = create_task(self.send_ping())
+            self.locations = LocationCoalescer(self.publish_location)
+            ensure_sweeper_running()
+            position_buffer.ensure_running()
 
         else:
             logger.warning("User connection rejected")
             await self.close()
 
     async def disconnect(self, close_code):
+        if hasattr(self, 'locations'):
+            try:
+                await self.locations.flush()
+            except Exception as e:
+                logger.error(f"Could not publish final location for driver {self.driver_id}: {e}")
         if hasattr(self, 'room_group_name'):
             await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
-        if hasattr(self, 'ping_task'):
-            self.ping_task.cancel()
+            await self.channel_layer.group_discard(self.availability_group_name, self.channel_name)
         raise StopConsumer()
 
     async def receive(self, text_data):
@@ -47,18 +64,11 @@ class DriverLocationConsumer(AsyncWebsocketConsumer):
             data = json.loads(text_data)
             latitude = data.get("latitude")
             longitude = data.get("longitude")
-
-            self.driver.latitude = latitude
-            self.driver.longitude = longitude
-            await self.save_driver(self.driver)
-            driver_info = await self.get_driver_details(self.driver)  # Returns payload of driver details
-
-            # Ensure message is serializable
-            message = {
-                "type": "driver_location_update",
-                "driver_details": driver_info
-            }
-            await self.channel_layer.group_send(self.room_group_name, message)
+            if latitude is None or longitude is None:
+                await self.send(text_data=json.dumps({"error": "latitude and longitude are required"}))
+                return
+            # Bursts of pings collapse to the latest position; only meaningful moves are published.
+            await self.locations.offer(latitude, longitude)
 
         except json.JSONDecodeError as e:
             logger.error(f"Invalid JSON from driver: {e}")
@@ -67,6 +77,32 @@ class DriverLocationConsumer(AsyncWebsocketConsumer):
             logger.error(f"Error processing driver message: {e}", exc_info=True)
             await self.send(text_data=json.dumps({"error": "Internal server error"}))
 
+    async def publish_location(self, latitude, longitude):
+        """Persist a position, update the matching indexes and broadcast it to watching riders."""
+        self.driver.latitude = latitude
+        self.driver.longitude = longitude
+        if await self.mark_seen():
+            # The stale-driver sweeper took this driver offline while they were silent.
+            self.driver.is_available = True
+            position_buffer.discard(self.driver_id)
+            await self.save_driver(self.driver, fields=["latitude", "longitude", "is_available", "updated_at"])
+        else:
+            # Written in the next batched flush rather than one UPDATE per ping.
+            position_buffer.put(self.driver_id, latitude, longitude)
+        driver_index.update(
+            self.driver_id, latitude, longitude,
+            vehicle_type=self.driver.vehicle_type,
+            is_available=self.driver.is_available,
+        )
+        await self.store_location(latitude, longitude)
+        driver_info = await self.get_driver_details(self.driver)  # Returns payload of driver details
+
+        # Ensure message is serializable
+        message = {
+            "type": "driver_location_update",
+            "driver_details": driver_info
+        }
+        await self.channel_layer.group_send(self.room_group_name, message)
 
     async def driver_location_update(self, event):
         await self.send(
@@ -75,23 +111,42 @@ class DriverLocationConsumer(AsyncWebsocketConsumer):
             })
         )
 
-    async def send_ping(self):
-        """Periodically sends a ping to the client to keep the connection alive."""
-        try:
-            while True:
-                await self.send(text_data=json.dumps({"type": "ping"}))
-                logger.debug(f"Ping sent to driver {self.driver_id}")
-                await sleep(30)  # Ping every 30 seconds
-        except Exception as e:
-            logger.error(f"Ping loop stopped for driver {self.driver_id}: {e}")
+    async def driver_availability_update(self, event):
+        """Sent by DriverTripConsumer when the driver accepts a trip, so later pings keep them out of matching."""
+        self.driver.is_available = event["is_available"]
 
     @database_sync_to_async
     def is_driver(self, driver):
         return Driver.objects.filter(id=driver.id).exists()
 
     @database_sync_to_async
-    def save_driver(self, driver):
-        driver.save()
+    def save_driver(self, driver, fields=("latitude", "longitude", "updated_at")):
+        # Location-only saves patch the cached driver card instead of invalidating it;
+        # updated_at must be listed or auto_now is skipped.
+        driver.save(update_fields=list(fields))
+
+    @sync_to_async(thread_sensitive=False)
+    def mark_seen(self):
+        """Record the ping time; returns True if the driver had been swept as stale."""
+        try:
+            return get_presence().mark_seen(self.driver_id)
+        except redis.RedisError as e:
+            logger.warning(f"Could not record ping for driver {self.driver_id}: {e}")
+            return False
+
+    @sync_to_async(thread_sensitive=False)
+    def store_location(self, latitude, longitude):
+        """GEOADD the ping into the shared location store so every worker sees it, and count it as surge supply."""
+        try:
+            get_location_store().update(
+                self.driver_id, latitude, longitude,
+                vehicle_type=self.driver.vehicle_type,
+                is_available=self.driver.is_available,
+            )
+        except redis.RedisError as e:
+            logger.warning(f"Could not write location for driver {self.driver_id}: {e}")
+        if self.driver.is_available:
+            get_surge_engine().record_driver(self.driver_id, latitude, longitude)
 
     @database_sync_to_async
     def get_driver_details(self, driver):
@@ -110,7 +165,7 @@ class DriverLocationConsumer(AsyncWebsocketConsumer):
         }
 
 
-class UserGetLocationConsumer(AsyncWebsocketConsumer):
+class UserGetLocationConsumer(HeartbeatMixin, AsyncWebsocketConsumer):
     """Gets the location of the driver and sends it to the user in real-time."""
     async def connect(self):
         self.driver_id = self.scope["url_route"]["kwargs"]["driver_id"]
@@ -120,7 +175,6 @@ class UserGetLocationConsumer(AsyncWebsocketConsumer):
             await self.channel_layer.group_add(self.room_group_name, self.channel_name)
             await self.accept()
             logger.info("User connection accepted")
-            self.ping_task = create_task(self.send_ping())
         else:
             logger.warning("User connection rejected")
             await self.close()
@@ -128,8 +182,6 @@ class UserGetLocationConsumer(AsyncWebsocketConsumer):
     async def disconnect(self, close_code):
         if hasattr(self, 'room_group_name'):
             await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
-        if hasattr(self, 'ping_task'):
-            self.ping_task.cancel()
         raise StopConsumer()
 
     async def driver_location_update(self, event):
@@ -147,23 +199,11 @@ class UserGetLocationConsumer(AsyncWebsocketConsumer):
             })
         )
 
-    async def send_ping(self):
-        """Periodically sends a ping to the client to keep the connection alive."""
-        try:
-             while True:
-                  await self.send(text_data=json.dumps({"type": "ping"}))
-                  logger.debug(f"Ping sent to user {self.scope['user'].id}")
-                  await sleep(30)  # Ping every 30 seconds
-
-       
-        except Exception as e:
-            logger.error(f"Ping loop stopped for user {self.scope['user'].id}: {e}")
-
     @database_sync_to_async
     def is_passenger(self, user):
         return User.objects.filter(id=user.id).exists()
 
-class TripRequestConsumer(AsyncWebsocketConsumer):
+class TripRequestConsumer(HeartbeatMixin, AsyncWebsocketConsumer):
     """Handles trip requests from users in real-time."""
 
     async def connect(self):
@@ -175,7 +215,6 @@ class TripRequestConsumer(AsyncWebsocketConsumer):
                 await self.channel_layer.group_add(self.user_group_name, self.channel_name)
                 await self.accept()
                 logger.info("User connection accepted")
-                self.ping_task = create_task(self.send_ping())
 
             else:
                 logger.warning("User connection rejected")
@@ -188,8 +227,6 @@ class TripRequestConsumer(AsyncWebsocketConsumer):
         if hasattr(self, 'room_group_name'):
             await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
         logger.info(f"User disconnected with code: {close_code}")
-        if hasattr(self, 'ping_task'):
-            self.ping_task.cancel()
         raise StopConsumer()
 
     async def receive(self, text_data):
@@ -200,8 +237,6 @@ class TripRequestConsumer(AsyncWebsocketConsumer):
             return
         if action == "create_trip":
             try:
-                now = datetime.now()
-                surge = is_peak_hour_or_festive(now)
                 vehicle_type = data.get("vehicle_type")
                 pickup = data.get("pickup")
                 destination = data.get("destination")
@@ -210,37 +245,12 @@ class TripRequestConsumer(AsyncWebsocketConsumer):
                 dest_lat = data.get("dest_lat")
                 dest_lon = data.get("dest_lon")
                 load_description = data.get("load_description", "")
+                surge = await sync_to_async(current_multiplier, thread_sensitive=False)(pickup_lat, pickup_lon)
 
-                route_data = await asyncio.wait_for(
-                    database_sync_to_async(get_route_data)(pickup_lat, pickup_lon, dest_lat, dest_lon),
-                    timeout=10
-                )
-                logger.info(f"Route data received: {route_data}")
-
-                distance_km = route_data.get("distance_km", 0.0)
-                duration_str = route_data.get("duration", "0 min")
+                route = await get_route_data_async(pickup_lat, pickup_lon, dest_lat, dest_lon, vehicle_type)
+                logger.info(f"Route data received: {route}")
 
-                def parse_duration_to_minutes(duration_str):
-                    try:
-                        hours = re.search(r"(\d+)\s*hour", duration_str)
-                        minutes = re.search(r"(\d+)\s*min", duration_str)
-                        seconds = re.search(r"(\d+)\s*sec", duration_str)
-                        total_minutes = 0.0
-                        if hours:
-                            total_minutes += float(hours.group(1)) * 60
-                        if minutes:
-                            total_minutes += float(minutes.group(1))
-                        if seconds:
-                            total_minutes += float(seconds.group(1)) / 60
-                        return total_minutes
-                    except Exception as e:
-                        logger.error(f"Failed to parse duration '{duration_str}': {e}")
-                        return 0.0
-
-                estimated_time_minutes = parse_duration_to_minutes(duration_str)
-                duration_formatted = duration_str
-
-                trip = await database_sync_to_async(Trip.objects.create)(
+                trip = Trip(
                     user=self.user,
                     vehicle_type=vehicle_type,
                     pickup=pickup,
@@ -251,26 +261,32 @@ class TripRequestConsumer(AsyncWebsocketConsumer):
                     dest_long=dest_lon,
                     load_description=load_description
                 )
-
-                fare = trip.calculate_fare(distance_km, estimated_time_minutes, surge)
+                trip.set_route(route)
+                fare = trip.calculate_route_fare(route, surge)
                 trip.accepted_fare = fare
                 await database_sync_to_async(trip.save)()
+                await sync_to_async(get_surge_engine().record_request, thread_sensitive=False)(pickup_lat, pickup_lon)
 
-                available_drivers = await self.get_available_drivers(trip)
+                candidates = await self.get_driver_candidates(trip)
+                available_drivers = [candidate["driver"] for candidate in candidates]
+                # Batched with other riders' requests so concurrent riders get different suggestions.
+                suggestion = await dispatcher.submit(trip.id, candidates)
                 user_data = await self.get_user_details(self.user)
 
                 response_data = {
                     "message": "Trip created successfully - select a driver",
                     "trip_id": str(trip.id),
                     "estimated_fare": fare,
-                    "distance_km": distance_km,
-                    "estimated_time": duration_formatted,
+                    "quote_token": sign_quote(trip.id, fare, route, surge, vehicle_type),
+                    "distance_km": round(route.distance_km, 2),
+                    "estimated_time": route.format_duration(),
                     "pickup": pickup,
                     "destination": destination,
                     "vehicle_type": vehicle_type,
                     "load_description": load_description,
                     "user_info": user_data,
                     "available_drivers": available_drivers,
+                    "suggested_driver": suggestion["driver"] if suggestion else None,
                     "status": "pending"
                 }
                 logger.info(f"Sending response: {response_data}") 
@@ -288,8 +304,16 @@ class TripRequestConsumer(AsyncWebsocketConsumer):
                 trip_id = data.get("trip_id")
                 print(f"this is the trip id: {trip_id}")
                 selected_driver_id = data.get("driver_id")
+                quote = None
+                if data.get("quote_token"):
+                    try:
+                        quote = verify_quote(data["quote_token"], trip_id)
+                    except InvalidQuoteToken as e:
+                        await self.send(text_data=json.dumps({"error": str(e)}))
+                        return
 
                 trip = await self.get_trip(trip_id)
+                await sync_to_async(dispatcher.release_trip, thread_sensitive=False)(trip_id)
 
                 driver = await self.get_driver(selected_driver_id)
 
@@ -304,11 +328,17 @@ class TripRequestConsumer(AsyncWebsocketConsumer):
                         await self.send(text_data=json.dumps({"error": "Payment not found. Please complete payment before requesting a driver."}))
                         return
 
-                    if payment.payment_method == "card" and (payment.status != "success" or payment.amount != trip.accepted_fare or not trip.is_paid):
+                    fare = Decimal(str(quote["fare"])) if quote else trip.accepted_fare
+                    if payment.payment_method == "card" and (payment.status != "success" or payment.amount != fare or not trip.is_paid):
                         await self.send(text_data=json.dumps({"error": "Card payment not completed. Please complete payment before requesting a driver."}))
                         return
 
-                    trip_details = await self.get_trip_details(trip)
+                    if quote:
+                        # The signed quote already carries the route; no need to load it again.
+                        route = quote_route(quote)
+                        trip_details = {"distance_km": round(route.distance_km, 2), "estimated_time": route.format_duration()}
+                    else:
+                        trip_details = await self.get_trip_details(trip)
                     driver_details = await self.get_driver_details(driver)
                     trip_user = await sync_to_async(lambda: trip.user)()
                     user_details = await self.get_user_details(trip_user)
@@ -415,17 +445,6 @@ class TripRequestConsumer(AsyncWebsocketConsumer):
         except Exception as e:
             logger.error(f"Error in await_driver_response for trip {trip_id}: {e}", exc_info=True)
 
-
-    async def send_ping(self):
-        """Periodically sends a ping to the client to keep the connection alive."""
-        try:
-            while True:
-                await self.send(text_data=json.dumps({"type": "ping"}))
-                logger.debug(f"Ping sent to user {self.user_id}")
-                await sleep(30)  # Ping every 30 seconds
-        except Exception as e:
-            logger.error(f"Ping loop stopped for user {self.user_id}: {e}")
-
     async def trip_status_update(self, event):
         await self.send(text_data=json.dumps({
             "type": "trip_status_update",
@@ -472,11 +491,8 @@ class TripRequestConsumer(AsyncWebsocketConsumer):
     def save_trip(self, trip):
         trip.save()
 
-    @database_sync_to_async
-    def get_trip_details(self, trip):
-        route_data = get_route_data(trip.pickup_lat, trip.pickup_long, trip.dest_lat, trip.dest_long)
-        distance_km = route_data.get("distance_km", 0.0)
-        duration_str = route_data.get("duration", "0 min")
+    async def get_trip_details(self, trip):
+        route = await get_trip_route(trip)
         return {
             "id": str(trip.id),
             "pickup": trip.pickup,
@@ -489,8 +505,9 @@ class TripRequestConsumer(AsyncWebsocketConsumer):
             "load_description": trip.load_description or "",
             "fare": float(trip.accepted_fare) if trip.accepted_fare else None,
             "status": trip.status,
-            "distance_km": distance_km,
-            "estimated_time": duration_str,
+            "distance_km": round(route.distance_km, 2),
+            "estimated_time": route.format_duration(),
+            "route_polyline": route.polyline,
             "created_at": trip.created_at.isoformat() if hasattr(trip, 'created_at') else None
         }
 
@@ -509,6 +526,10 @@ class TripRequestConsumer(AsyncWebsocketConsumer):
         drivers = find_nearest_drivers(trip.pickup_lat, trip.pickup_long, [trip.vehicle_type])
         return [driver_data["driver"] for driver_data in drivers]
 
+    @database_sync_to_async
+    def get_driver_candidates(self, trip):
+        return find_nearest_drivers(trip.pickup_lat, trip.pickup_long, [trip.vehicle_type])
+
     @database_sync_to_async
     def get_payment_for_trip(self, trip_id):
         try:
@@ -517,7 +538,7 @@ class TripRequestConsumer(AsyncWebsocketConsumer):
             return None
 
 
-class DriverTripConsumer(AsyncWebsocketConsumer):
+class DriverTripConsumer(HeartbeatMixin, AsyncWebsocketConsumer):
     """Handles trip requests to drivers in real-time with improved stability."""
     
     async def connect(self):
@@ -532,9 +553,6 @@ class DriverTripConsumer(AsyncWebsocketConsumer):
 
             logger.info(f"Driver {self.driver.id} connection accepted")
             
-            # Start heartbeat / ping loop
-            self.ping_task = create_task(self.send_ping())
-            
             # Send welcome message
             await self.send(text_data=json.dumps({
                 "message": "Connection established",
@@ -550,8 +568,6 @@ class DriverTripConsumer(AsyncWebsocketConsumer):
         if hasattr(self, 'room_group_name'):
             await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
         logger.info(f"Driver {self.driver.id} disconnected with code: {close_code}")
-        if hasattr(self, 'ping_task'):
-            self.ping_task.cancel()
         raise StopConsumer()
 
     async def receive(self, text_data):
@@ -600,6 +616,12 @@ class DriverTripConsumer(AsyncWebsocketConsumer):
 
             await self.save_driver(self.driver)
             await self.save_trip(trip)
+            driver_index.remove(self.driver.id)
+            await self.store_unavailable()
+            await self.channel_layer.group_send(
+                f"driver_availability_{self.driver.id}",
+                {"type": "driver_availability_update", "is_available": False}
+            )
 
             trip_details = await self.get_trip_details(trip)
             driver_details = await self.get_driver_details(self.driver)
@@ -633,16 +655,6 @@ class DriverTripConsumer(AsyncWebsocketConsumer):
                 "error": f"Unknown response status: {driver_response_status}"
             }))
 
-    async def send_ping(self):
-        """Periodically sends a ping to the client to keep the connection alive."""
-        try:
-            while True:
-                await self.send(text_data=json.dumps({"type": "ping"}))
-                logger.debug(f"Ping sent to driver {self.driver.id}")
-                await sleep(30)  # Ping every 30 seconds
-        except Exception as e:
-            logger.error(f"Ping loop stopped for driver {self.driver.id}: {e}")
-
     async def trip_rejected(self, event):
         await self.send(text_data=json.dumps({
             "status": event["status"],
@@ -680,11 +692,19 @@ class DriverTripConsumer(AsyncWebsocketConsumer):
     def save_driver(self, driver):
         driver.save()
 
-    @database_sync_to_async
-    def get_trip_details(self, trip):
-        route_data = get_route_data(trip.pickup_lat, trip.pickup_long, trip.dest_lat, trip.dest_long)
-        distance_km = route_data.get("distance_km", 0.0)
-        duration_str = route_data.get("duration", "0 min")
+    @sync_to_async(thread_sensitive=False)
+    def store_unavailable(self):
+        """Move the driver to the busy set of the shared location store."""
+        try:
+            get_location_store().update(
+                self.driver.id, self.driver.latitude, self.driver.longitude,
+                vehicle_type=self.driver.vehicle_type, is_available=False,
+            )
+        except redis.RedisError as e:
+            logger.warning(f"Could not update location store for driver {self.driver.id}: {e}")
+
+    async def get_trip_details(self, trip):
+        route = await get_trip_route(trip)
         return {
             "id": str(trip.id),
             "pickup": trip.pickup,
@@ -697,8 +717,9 @@ class DriverTripConsumer(AsyncWebsocketConsumer):
             "load_description": trip.load_description or "",
             "fare": float(trip.accepted_fare) if trip.accepted_fare else None,
             "status": trip.status,
-            "distance_km": distance_km,
-            "estimated_time": duration_str,
+            "distance_km": round(route.distance_km, 2),
+            "estimated_time": route.format_duration(),
+            "route_polyline": route.polyline,
             "created_at": trip.created_at.isoformat() if hasattr(trip, 'created_at') else None
         }
 
@@ -730,7 +751,7 @@ class DriverTripConsumer(AsyncWebsocketConsumer):
     def is_driver(self, driver):
         return Driver.objects.filter(id=driver.id).exists()
 
-class DriverUpdateTripStatusConsumer(AsyncWebsocketConsumer):
+class DriverUpdateTripStatusConsumer(HeartbeatMixin, AsyncWebsocketConsumer):
     """(Driver socket): updates the status of the trip in real-time, notifying both driver and user."""
     async def connect(self):
         self.trip_id = self.scope["url_route"]["kwargs"]["trip_id"]
@@ -739,7 +760,6 @@ class DriverUpdateTripStatusConsumer(AsyncWebsocketConsumer):
             await self.channel_layer.group_add(self.trip_group_name, self.channel_name)
             await self.accept()
             logger.info("Driver connection accepted")
-            self.ping_task = create_task(self.send_ping())
 
         else:
             logger.warning("Driver connection rejected")
@@ -749,8 +769,6 @@ class DriverUpdateTripStatusConsumer(AsyncWebsocketConsumer):
         if hasattr(self, 'trip_group_name'):
             await self.channel_layer.group_discard(self.trip_group_name, self.channel_name)
             logger.info(f"Driver disconnected with code: {close_code}")
-        if hasattr(self, 'ping_task'):
-            self.ping_task.cancel()
         raise StopConsumer()
 
     async def receive(self, text_data):
@@ -826,20 +844,9 @@ class DriverUpdateTripStatusConsumer(AsyncWebsocketConsumer):
     @database_sync_to_async
     def is_driver(self, driver):
         return Driver.objects.filter(id=driver.id).exists()
-    
-    async def send_ping(self):
-        """Periodically sends a ping to the client to keep the connection alive."""
-        try:
-            while True:
-                await self.send(text_data=json.dumps({"type": "ping"}))
-                logger.debug(f"Ping sent to driver {self.scope['user'].id}")
-                await sleep(30)  # Ping every 30 seconds
-        except Exception as e:
-            logger.error(f"Ping loop stopped for driver {self.scope['user'].id}: {e}")
 
 
-
-class UserGetAvailableDrivers(AsyncWebsocketConsumer):
+class UserGetAvailableDrivers(HeartbeatMixin, AsyncWebsocketConsumer):
     """Handles requests for available drivers in real-time."""
 
     async def connect(self):
@@ -851,7 +858,6 @@ class UserGetAvailableDrivers(AsyncWebsocketConsumer):
                 await self.channel_layer.group_add(self.user_group_name, self.channel_name)
                 await self.accept()
                 logger.info(f"{self.user} connection accepted")
-                self.ping_task = create_task(self.send_ping())
             else:
                 logger.warning("User connection rejected")
                 await self.close(code=4403)
@@ -863,8 +869,6 @@ class UserGetAvailableDrivers(AsyncWebsocketConsumer):
         if hasattr(self, 'user_group_name'):
             await self.channel_layer.group_discard(self.user_group_name, self.channel_name)
         logger.info(f"User disconnected with code: {close_code}")
-        if hasattr(self, 'ping_task'):
-            self.ping_task.cancel()
         raise StopConsumer()
 
     async def receive(self, text_data):
@@ -893,13 +897,7 @@ class UserGetAvailableDrivers(AsyncWebsocketConsumer):
                 "drivers": []
             }))
         else:
-            nearest_drivers = []
-            for driver in drivers:
-                route_data = await asyncio.wait_for(
-                    database_sync_to_async(get_route_data)(user_latitude, user_longitude, driver.latitude, driver.longitude),
-                    timeout=10
-                )
-                nearest_drivers.append([driver, route_data])
+            nearest_drivers = await self.with_route_data(user_latitude, user_longitude, drivers)
             await self.send(text_data=json.dumps({
                 "type": "nearest_drivers",
                 "nearest_drivers": nearest_drivers
@@ -917,30 +915,19 @@ class UserGetAvailableDrivers(AsyncWebsocketConsumer):
             user_lat, user_lon, vehicle_type
         )
 
-        nearest_drivers = []
-        for driver in drivers:
-            route_data = await asyncio.wait_for(
-                database_sync_to_async(get_route_data)(
-                    user_lat, user_lon, driver.latitude, driver.longitude
-                ),
-                timeout=10
-            )
-            nearest_drivers.append([driver, route_data])
+        nearest_drivers = await self.with_route_data(user_lat, user_lon, drivers)
 
         await self.send(text_data=json.dumps({
             "type": "nearest_drivers",
             "nearest_drivers": nearest_drivers
         }))
 
+    async def with_route_data(self, user_lat, user_lon, drivers):
+        """Pair every driver with its route to the rider, resolved in one batched ETA lookup."""
+        points = [(driver["driver"]["latitude"], driver["driver"]["longitude"]) for driver in drivers]
+        etas = await get_driver_etas(user_lat, user_lon, points)
+        return [[driver, route.as_dict()] for driver, route in zip(drivers, etas)]
+
     @database_sync_to_async
     def is_user(self, user):
         return User.objects.filter(id=user.id).exists()
-
-    async def send_ping(self):
-        """Keeps the socket alive by sending periodic pings."""
-        try:
-            while True:
-                await self.send(text_data=json.dumps({"type": "ping"}))
-                await sleep(30)
-        except Exception as e:
-            logger.error(f"Ping loop stopped: {e}")
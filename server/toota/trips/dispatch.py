@@ -0,0 +1,310 @@
+import asyncio
+import logging
+import threading
+import time
+
+import numpy as np
+import redis
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .estimator import DEFAULT_DETOUR_FACTOR, route_estimator
+from .location_store import DRIVER_LOCATION_BACKEND, REDIS_URL
+
+logger = logging.getLogger(__name__)
+
+# How long pending trip requests are collected before one assignment is solved.
+DISPATCH_WINDOW_SECONDS = getattr(settings, 'DISPATCH_WINDOW_SECONDS', 0.5)
+# How long a driver offered to one rider is kept out of later batches.
+OFFER_HOLD_SECONDS = getattr(settings, 'DISPATCH_OFFER_HOLD_SECONDS', 30)
+
+
+###############################################################################
+# Cost functions: (request, candidate) -> float, lower is better.
+# `candidate` is one entry of find_nearest_drivers: {"driver": card, "distance": km}
+###############################################################################
+def distance_cost(request, candidate):
+    return candidate["distance"]
+
+
+def eta_cost(request, candidate):
+    """Estimated minutes for the driver to reach the pickup at their vehicle's current speed."""
+    driver = candidate["driver"]
+    lat, lon = driver.get("latitude"), driver.get("longitude")
+    # Candidates are within the search radius, so the driver's region is the pickup's.
+    detour = DEFAULT_DETOUR_FACTOR if lat is None or lon is None else route_estimator.detour_factor(lat, lon)
+    return candidate["distance"] * detour / route_estimator.speed_kmh(driver.get("vehicle_type")) * 60.0
+
+
+def rating_weighted_cost(km_per_star=2.0):
+    """
+    Distance cost where every missing rating star counts as km_per_star extra km,
+    so a 5-star driver slightly further away can beat a 3-star driver next door.
+    """
+    def cost(request, candidate):
+        rating = float(candidate["driver"].get("rating") or 0.0)
+        return candidate["distance"] + km_per_star * (5.0 - rating)
+    return cost
+
+
+###############################################################################
+# Assignment solver
+###############################################################################
+def min_cost_assignment(cost):
+    """
+    Solve the rectangular assignment problem for a cost matrix (rows = riders,
+    columns = drivers). Infinite entries mark pairs that must not be matched.
+
+    Shortest augmenting path (Hungarian) with the inner column scan vectorized,
+    so a few hundred riders against a few thousand drivers stays fast.
+    Returns a list of (row, col) pairs; rows left unmatched are omitted.
+    """
+    cost = np.asarray(cost, dtype=np.float64)
+    if cost.size == 0:
+        return []
+    transposed = cost.shape[0] > cost.shape[1]
+    if transposed:
+        cost = cost.T
+    n, m = cost.shape
+
+    finite = np.isfinite(cost)
+    # Forbidden pairs get a cost larger than any complete finite assignment.
+    forbidden = (np.abs(cost[finite]).max() if finite.any() else 0.0) * (n + 1) + 1.0
+    c = np.where(finite, cost, forbidden)
+
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    p = np.zeros(m + 1, dtype=np.intp)  # p[j]: row (1-based) assigned to column j
+    way = np.zeros(m + 1, dtype=np.intp)
+
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            free = ~used[1:]
+            reduced = c[i0 - 1] - u[i0] - v[1:]
+            improve = free & (reduced < minv[1:])
+            minv[1:][improve] = reduced[improve]
+            way[1:][improve] = j0
+
+            candidates = np.where(free, minv[1:], np.inf)
+            j1 = int(np.argmin(candidates)) + 1
+            delta = candidates[j1 - 1]
+
+            used_cols = np.flatnonzero(used)
+            u[p[used_cols]] += delta
+            v[used_cols] -= delta
+            minv[1:][free] -= delta
+
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+
+    pairs = []
+    for col in range(1, m + 1):
+        row = p[col] - 1
+        if row >= 0 and finite[row, col - 1]:
+            pairs.append((col - 1, row) if transposed else (row, col - 1))
+    return sorted(pairs)
+
+
+###############################################################################
+# Batch dispatch
+###############################################################################
+class DispatchRequest:
+    """One rider waiting for an offer, with the candidates find_nearest_drivers returned."""
+    __slots__ = ("trip_id", "candidates")
+
+    def __init__(self, trip_id, candidates):
+        self.trip_id = str(trip_id)
+        self.candidates = [c for c in candidates if c.get("distance") is not None]
+
+
+def solve_batch(requests, cost_fn=distance_cost, excluded_driver_ids=()):
+    """
+    Assign at most one driver per request and one request per driver,
+    minimising the total cost across the batch.
+    Returns {trip_id: candidate or None}.
+    """
+    excluded = set(excluded_driver_ids)
+    driver_columns = {}
+    for request in requests:
+        for candidate in request.candidates:
+            driver_id = str(candidate["driver"]["id"])
+            if driver_id not in excluded:
+                driver_columns.setdefault(driver_id, len(driver_columns))
+
+    offers = {request.trip_id: None for request in requests}
+    if not driver_columns:
+        return offers
+
+    cost = np.full((len(requests), len(driver_columns)), np.inf)
+    lookup = {}
+    for row, request in enumerate(requests):
+        for candidate in request.candidates:
+            col = driver_columns.get(str(candidate["driver"]["id"]))
+            if col is not None:
+                cost[row, col] = cost_fn(request, candidate)
+                lookup[row, col] = candidate
+
+    for row, col in min_cost_assignment(cost):
+        offers[requests[row].trip_id] = lookup[row, col]
+    return offers
+
+
+class InMemoryOfferHolds:
+    """Process-local offer holds; used by the tests and single-process servers."""
+    def __init__(self):
+        self._held = {}  # driver_id -> expiry
+        self._offers = {}  # trip_id -> driver_id
+        self._lock = threading.Lock()
+
+    def _prune_locked(self, now):
+        self._held = {driver_id: expiry for driver_id, expiry in self._held.items() if expiry > now}
+        self._offers = {trip_id: driver_id for trip_id, driver_id in self._offers.items() if driver_id in self._held}
+
+    def held(self):
+        with self._lock:
+            self._prune_locked(time.time())
+            return set(self._held)
+
+    def claim(self, trip_id, driver_id, seconds):
+        """Hold driver_id for trip_id; False if another trip holds them already."""
+        now = time.time()
+        with self._lock:
+            self._prune_locked(now)
+            if driver_id in self._held:
+                return False
+            self._held[driver_id] = now + seconds
+            self._offers[trip_id] = driver_id
+            return True
+
+    def release(self, trip_id):
+        with self._lock:
+            driver_id = self._offers.pop(trip_id, None)
+            if driver_id is not None:
+                self._held.pop(driver_id, None)
+
+
+class RedisOfferHolds:
+    """
+    Offer holds shared by every worker: a sorted set of held drivers scored by
+    expiry, plus one expiring key per trip naming the driver it was offered.
+    Claiming is ZADD NX, so two workers can never hold the same driver.
+    """
+    HELD_KEY = "dispatch:held"
+
+    def __init__(self, client):
+        self.client = client
+
+    def _offer_key(self, trip_id):
+        return f"dispatch:offer:{trip_id}"
+
+    def held(self):
+        pipe = self.client.pipeline()
+        pipe.zremrangebyscore(self.HELD_KEY, "-inf", time.time())
+        pipe.zrange(self.HELD_KEY, 0, -1)
+        _, members = pipe.execute()
+        return {member.decode() if isinstance(member, bytes) else member for member in members}
+
+    def claim(self, trip_id, driver_id, seconds):
+        now = time.time()
+        self.client.zremrangebyscore(self.HELD_KEY, "-inf", now)
+        if not self.client.zadd(self.HELD_KEY, {driver_id: now + seconds}, nx=True):
+            return False
+        self.client.set(self._offer_key(trip_id), driver_id, ex=max(int(seconds), 1))
+        return True
+
+    def release(self, trip_id):
+        driver_id = self.client.getdel(self._offer_key(trip_id))
+        if driver_id is not None:
+            self.client.zrem(self.HELD_KEY, driver_id)
+
+
+def get_offer_holds():
+    """Offer holds on the same backend as the location store."""
+    if DRIVER_LOCATION_BACKEND == "memory":
+        return InMemoryOfferHolds()
+    return RedisOfferHolds(redis.Redis.from_url(REDIS_URL))
+
+
+class DispatchBatcher:
+    """
+    Collects trip requests for DISPATCH_WINDOW_SECONDS and solves one
+    min-cost assignment for the whole batch, so concurrent riders are never
+    offered the same driver. Offered drivers are held out of later batches
+    for OFFER_HOLD_SECONDS or until released.
+
+    The batch window is per process: each worker solves the requests it
+    received. The holds are shared through `holds`, so a driver offered by
+    one worker is skipped by every other worker's batches.
+    """
+    def __init__(self, window=DISPATCH_WINDOW_SECONDS, cost_fn=distance_cost, hold_seconds=OFFER_HOLD_SECONDS,
+                 holds=None):
+        self.window = window
+        self.cost_fn = cost_fn
+        self.hold_seconds = hold_seconds
+        self.holds = holds if holds is not None else InMemoryOfferHolds()
+        self._pending = []  # (DispatchRequest, future)
+        self._flush_task = None
+
+    async def submit(self, trip_id, candidates):
+        """Queue a request and wait for the batch it lands in to be solved."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((DispatchRequest(trip_id, candidates), future))
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = loop.create_task(self._flush_after_window())
+        return await future
+
+    async def _flush_after_window(self):
+        await asyncio.sleep(self.window)
+        batch, self._pending = self._pending, []
+        try:
+            offers = await sync_to_async(self.assign, thread_sensitive=False)([request for request, _ in batch])
+        except Exception as e:
+            logger.error(f"Dispatch batch of {len(batch)} failed: {e}", exc_info=True)
+            offers = {}
+        for request, future in batch:
+            if not future.done():
+                future.set_result(offers.get(request.trip_id))
+
+    def assign(self, requests):
+        """Solve one batch against the current holds and hold every offered driver."""
+        try:
+            held = self.holds.held()
+        except redis.RedisError as e:
+            logger.warning(f"Could not read dispatch holds: {e}")
+            held = set()
+        offers = solve_batch(requests, self.cost_fn, held)
+        for trip_id, offer in offers.items():
+            if offer is None:
+                continue
+            try:
+                claimed = self.holds.claim(trip_id, str(offer["driver"]["id"]), self.hold_seconds)
+            except redis.RedisError as e:
+                logger.warning(f"Could not hold driver {offer['driver']['id']} for trip {trip_id}: {e}")
+                claimed = True
+            if not claimed:
+                # Another worker offered this driver between reading the holds and now.
+                offers[trip_id] = None
+        logger.info(f"Dispatched batch of {len(requests)} requests, {sum(o is not None for o in offers.values())} offers")
+        return offers
+
+    def release_trip(self, trip_id):
+        """Free the driver offered for a trip once the rider has made a choice."""
+        try:
+            self.holds.release(str(trip_id))
+        except redis.RedisError as e:
+            logger.warning(f"Could not release dispatch hold for trip {trip_id}: {e}")
+
+
+dispatcher = DispatchBatcher(holds=get_offer_holds())
@@ -0,0 +1,94 @@
+import math
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def bounding_box(lat, lon, radius_km):
+    """
+    Lat/lon box that fully contains the circle of radius_km around (lat, lon).
+    Returns (min_lat, max_lat, min_lon, max_lon); cheap enough to push into SQL.
+    """
+    lat, lon = float(lat), float(lon)
+    angular_radius = radius_km / EARTH_RADIUS_KM
+    lat_delta = math.degrees(angular_radius)
+    cos_lat = max(math.cos(math.radians(lat)), 0.01)
+    lon_delta = math.degrees(math.asin(min(1.0, math.sin(angular_radius) / cos_lat)))
+    return lat - lat_delta, lat + lat_delta, lon - lon_delta, lon + lon_delta
+
+
+def haversine_km(lat, lon, lats, lons):
+    """
+    Great-circle distance in km from one point to every point in lats/lons.
+
+    :param lat: Latitude of the origin (e.g. the pickup).
+    :param lon: Longitude of the origin.
+    :param lats: Array-like of candidate latitudes.
+    :param lons: Array-like of candidate longitudes.
+    :return: float64 array of distances, same length as lats.
+    """
+    lat = np.radians(float(lat))
+    lon = np.radians(float(lon))
+    lats = np.radians(np.asarray(lats, dtype=np.float64))
+    lons = np.radians(np.asarray(lons, dtype=np.float64))
+
+    a = np.sin((lats - lat) / 2.0) ** 2 + np.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2.0) ** 2
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def top_k(distances, k):
+    """
+    Indices of the k smallest distances, nearest first.
+    Uses argpartition so only the selected k are fully sorted.
+    """
+    n = len(distances)
+    if k is None or k >= n:
+        return np.argsort(distances, kind="stable")
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    nearest = np.argpartition(distances, k - 1)[:k]
+    return nearest[np.argsort(distances[nearest], kind="stable")]
+
+
+class CandidateCoordinates:
+    """
+    Candidate driver positions held in contiguous float64 arrays so a whole
+    batch can be ranked against a pickup in a single vectorized pass.
+    """
+    __slots__ = ("ids", "lats", "lons")
+
+    def __init__(self, ids, lats, lons):
+        self.ids = list(ids)
+        self.lats = np.ascontiguousarray(lats, dtype=np.float64)
+        self.lons = np.ascontiguousarray(lons, dtype=np.float64)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build from an iterable of (driver_id, lat, lon) rows."""
+        rows = [row for row in rows if row[1] is not None and row[2] is not None]
+        if not rows:
+            return cls([], np.empty(0), np.empty(0))
+        ids, lats, lons = zip(*rows)
+        return cls(ids, lats, lons)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def distances_from(self, lat, lon):
+        return haversine_km(lat, lon, self.lats, self.lons)
+
+    def nearest(self, lat, lon, limit=None, max_distance_km=None):
+        """
+        Return up to `limit` (driver_id, distance_km) pairs, nearest first,
+        optionally dropping anything further than max_distance_km.
+        """
+        if not self.ids:
+            return []
+        distances = self.distances_from(lat, lon)
+        ids = self.ids
+        if max_distance_km is not None:
+            within = np.flatnonzero(distances <= max_distance_km)
+            distances = distances[within]
+            ids = [ids[i] for i in within]
+        return [(ids[i], float(distances[i])) for i in top_k(distances, limit)]
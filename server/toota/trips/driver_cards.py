@@ -0,0 +1,117 @@
+import logging
+
+import redis
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.dateparse import parse_datetime
+from rest_framework import serializers
+
+from authentication.models import Driver
+from .serializers import FindDriversSerializer
+
+logger = logging.getLogger(__name__)
+
+DRIVER_CARD_CACHE_ALIAS = getattr(settings, 'DRIVER_CARD_CACHE_ALIAS', 'default')
+DRIVER_CARD_TIMEOUT = getattr(settings, 'DRIVER_CARD_TIMEOUT', 60 * 60)
+# Bump whenever the card fields change so stale payloads are never served.
+DRIVER_CARD_VERSION = 2
+# Saves touching only these fields update the cached position instead of
+# invalidating the card; updated_at is written with them so "most recently
+# active" ordering stays current.
+LOCATION_FIELDS = frozenset(["latitude", "longitude", "updated_at"])
+
+
+def card_key(driver_id):
+    return f"driver_card:v{DRIVER_CARD_VERSION}:{driver_id}"
+
+
+def location_key(driver_id):
+    return f"driver_card_location:v{DRIVER_CARD_VERSION}:{driver_id}"
+
+
+def _card_cache():
+    return caches[DRIVER_CARD_CACHE_ALIAS]
+
+
+def build_driver_card(driver):
+    """Serialize a driver into the plain dict stored in the card cache."""
+    return dict(FindDriversSerializer(driver).data)
+
+
+def _with_location(card, location):
+    """
+    The card with a cached (latitude, longitude, updated_at) merged in, unless
+    the card itself was built from a newer save.
+    """
+    if location is None:
+        return card
+    latitude, longitude, updated_at = location
+    if updated_at is not None and card.get("updated_at"):
+        card_updated_at = parse_datetime(card["updated_at"])
+        if card_updated_at is not None and card_updated_at > parse_datetime(updated_at):
+            return card
+    card = dict(card, latitude=latitude, longitude=longitude)
+    if updated_at is not None:
+        card["updated_at"] = updated_at
+    return card
+
+
+def get_driver_cards(driver_ids):
+    """
+    Return {driver_id: card} for the given ids. Cards missing from the cache
+    are built from a single query and written back. Positions are cached
+    apart from the cards and merged in here, so a location update never
+    rewrites a card.
+    """
+    ids = [str(driver_id) for driver_id in driver_ids]
+    try:
+        cached = _card_cache().get_many([card_key(driver_id) for driver_id in ids] +
+                                        [location_key(driver_id) for driver_id in ids])
+    except redis.RedisError as e:
+        logger.warning(f"Driver card cache unavailable: {e}")
+        cached = {}
+
+    cards = {driver_id: cached[card_key(driver_id)] for driver_id in ids if card_key(driver_id) in cached}
+    missing = [driver_id for driver_id in ids if driver_id not in cards]
+    if missing:
+        fresh = {
+            str(driver.id): build_driver_card(driver)
+            for driver in Driver.objects.filter(id__in=missing).prefetch_related("groups", "user_permissions")
+        }
+        cards.update(fresh)
+        try:
+            _card_cache().set_many({card_key(driver_id): card for driver_id, card in fresh.items()}, DRIVER_CARD_TIMEOUT)
+        except redis.RedisError as e:
+            logger.warning(f"Could not store driver cards: {e}")
+    return {driver_id: _with_location(card, cached.get(location_key(driver_id))) for driver_id, card in cards.items()}
+
+
+def invalidate_driver_card(driver_id):
+    try:
+        _card_cache().delete(card_key(driver_id))
+    except redis.RedisError as e:
+        logger.warning(f"Could not invalidate driver card {driver_id}: {e}")
+
+
+def _location(latitude, longitude, updated_at=None):
+    if updated_at is not None:
+        updated_at = serializers.DateTimeField().to_representation(updated_at)
+    return (latitude, longitude, updated_at)
+
+
+def patch_driver_card_location(driver_id, latitude, longitude, updated_at=None):
+    """Record a driver's new coordinates (and updated_at) for their card without rebuilding it."""
+    try:
+        _card_cache().set(location_key(driver_id), _location(latitude, longitude, updated_at), DRIVER_CARD_TIMEOUT)
+    except redis.RedisError as e:
+        logger.warning(f"Could not patch driver card {driver_id}: {e}")
+
+
+def patch_driver_card_locations(positions):
+    """Batch form of patch_driver_card_location for {driver_id: (latitude, longitude, updated_at)}."""
+    try:
+        _card_cache().set_many({
+            location_key(driver_id): _location(*position) for driver_id, position in positions.items()
+        }, DRIVER_CARD_TIMEOUT)
+    except redis.RedisError as e:
+        logger.warning(f"Could not patch {len(positions)} driver cards: {e}")
@@ -0,0 +1,204 @@
+"""
+Offline route estimates: straight-line distance stretched by a per-region
+detour factor, driven at a per-vehicle, per-time-of-day speed.
+
+Used as the instant answer when OSRM is slow or down, and to pre-rank drivers
+without a network call. Speeds and detour factors are fitted from completed
+trips by `python manage.py fit_route_estimator`; detour factors are also
+nudged by the OSRM routes this process sees.
+"""
+import logging
+import math
+import statistics
+import threading
+import time
+from collections import defaultdict
+from zoneinfo import ZoneInfo
+
+import redis
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+from .distance import haversine_km
+
+logger = logging.getLogger(__name__)
+
+# Road distance / straight-line distance until a region has been observed.
+DEFAULT_DETOUR_FACTOR = getattr(settings, 'ROUTE_DETOUR_FACTOR', 1.3)
+# Regions are square lat/lon cells of this size (1 deg is roughly a metro area).
+REGION_SIZE_DEG = getattr(settings, 'ROUTE_ESTIMATOR_REGION_DEG', 1.0)
+# Local time zone used to decide whether a trip falls in peak hours.
+ESTIMATOR_TIME_ZONE = getattr(settings, 'ROUTE_ESTIMATOR_TIME_ZONE', 'Africa/Johannesburg')
+# How often the fitted profile is re-read from the shared cache.
+ESTIMATOR_RELOAD_SECONDS = getattr(settings, 'ROUTE_ESTIMATOR_RELOAD_SECONDS', 300)
+ESTIMATOR_CACHE_ALIAS = getattr(settings, 'ROUTE_ESTIMATOR_CACHE_ALIAS', 'default')
+PROFILE_CACHE_KEY = "route_estimator:profile"
+
+# Typical urban speed (km/h) per vehicle type, used until enough trips are fitted.
+DEFAULT_SPEEDS_KMH = {
+    'Motorbike': 35.0,
+    'Bakkie': 32.0,
+    '1 ton Truck': 30.0,
+    '1.5 ton Truck': 28.0,
+    '2 ton Truck': 28.0,
+    '4 ton Truck': 25.0,
+    '8 ton Truck': 22.0,
+}
+DEFAULT_SPEED_KMH = 30.0
+# Speed multipliers per time-of-day band, applied to the defaults above.
+BAND_SPEED_FACTORS = {"peak": 0.7, "day": 1.0, "night": 1.25}
+PEAK_HOURS = frozenset({6, 7, 8, 16, 17, 18})
+NIGHT_HOURS = frozenset({21, 22, 23, 0, 1, 2, 3, 4})
+
+# Fitting limits: groups need this many trips, and implausible trips are ignored.
+MIN_FIT_SAMPLES = 20
+MIN_FIT_SPEED_KMH = 3.0
+MAX_FIT_SPEED_KMH = 120.0
+# Weight of a new OSRM observation in a region's running detour factor.
+DETOUR_SMOOTHING = 0.05
+
+
+def time_band(when=None):
+    """'peak', 'day' or 'night' for a datetime (default: now) in the estimator's local time."""
+    when = when or timezone.now()
+    if timezone.is_aware(when):
+        when = when.astimezone(ZoneInfo(ESTIMATOR_TIME_ZONE))
+    if when.hour in PEAK_HOURS:
+        return "peak"
+    if when.hour in NIGHT_HOURS:
+        return "night"
+    return "day"
+
+
+def region_for(lat, lon, size=REGION_SIZE_DEG):
+    return f"{math.floor(float(lat) / size)},{math.floor(float(lon) / size)}"
+
+
+def straight_line_km(pickup_lat, pickup_lon, dest_lat, dest_lon):
+    return float(haversine_km(pickup_lat, pickup_lon, [dest_lat], [dest_lon])[0])
+
+
+class RouteEstimator:
+    """
+    Network-free route estimates from a fitted profile:
+    {"detour": {region: factor}, "speeds": {"vehicle_type|band": km/h}}.
+    """
+    def __init__(self, profile=None, cache_alias=ESTIMATOR_CACHE_ALIAS, reload_seconds=ESTIMATOR_RELOAD_SECONDS):
+        self.cache_alias = cache_alias
+        self.reload_seconds = reload_seconds
+        self.detour = {}
+        self.speeds = {}
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        if profile is not None:
+            self.load(profile)
+
+    def load(self, profile):
+        with self._lock:
+            self.detour = dict(profile.get("detour", {}))
+            self.speeds = dict(profile.get("speeds", {}))
+            self._loaded_at = time.monotonic()
+
+    def profile(self):
+        with self._lock:
+            return {"detour": dict(self.detour), "speeds": dict(self.speeds)}
+
+    def _maybe_reload(self):
+        if not self.cache_alias:
+            return
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.reload_seconds:
+            return
+        try:
+            profile = caches[self.cache_alias].get(PROFILE_CACHE_KEY)
+        except redis.RedisError as e:
+            logger.warning(f"Could not load route estimator profile: {e}")
+            profile = None
+        if profile is None:
+            self._loaded_at = time.monotonic()
+            return
+        # Keep what this process has learnt about regions the fitted profile lacks.
+        learnt = {region: factor for region, factor in self.detour.items() if region not in profile.get("detour", {})}
+        self.load(profile)
+        with self._lock:
+            self.detour.update(learnt)
+
+    def detour_factor(self, lat, lon):
+        self._maybe_reload()
+        return self.detour.get(region_for(lat, lon), DEFAULT_DETOUR_FACTOR)
+
+    def speed_kmh(self, vehicle_type=None, when=None):
+        self._maybe_reload()
+        band = time_band(when)
+        fitted = self.speeds.get(f"{vehicle_type}|{band}")
+        if fitted:
+            return fitted
+        return DEFAULT_SPEEDS_KMH.get(vehicle_type, DEFAULT_SPEED_KMH) * BAND_SPEED_FACTORS[band]
+
+    def estimate(self, pickup_lat, pickup_lon, dest_lat, dest_lon, vehicle_type=None, when=None):
+        """(distance in metres, duration in seconds) for one trip."""
+        distance_km = straight_line_km(pickup_lat, pickup_lon, dest_lat, dest_lon) \
+            * self.detour_factor(pickup_lat, pickup_lon)
+        return distance_km * 1000.0, distance_km / self.speed_kmh(vehicle_type, when) * 3600.0
+
+    def observe(self, pickup_lat, pickup_lon, dest_lat, dest_lon, road_distance_m):
+        """Nudge the pickup region's detour factor towards a real OSRM distance."""
+        straight_km = straight_line_km(pickup_lat, pickup_lon, dest_lat, dest_lon)
+        if straight_km < 0.5:
+            return
+        ratio = road_distance_m / 1000.0 / straight_km
+        if not 1.0 <= ratio <= 3.0:
+            return
+        region = region_for(pickup_lat, pickup_lon)
+        with self._lock:
+            current = self.detour.get(region, DEFAULT_DETOUR_FACTOR)
+            self.detour[region] = round(current + DETOUR_SMOOTHING * (ratio - current), 4)
+
+
+def fit_profile(trips, estimator=None):
+    """
+    Fit the estimator from completed trip rows of (pickup_lat, pickup_long,
+    dest_lat, dest_long, vehicle_type, created_at, route_distance_km,
+    route_duration_sec, route_estimated).
+
+    Only routes OSRM returned are used: the estimator's own estimates would
+    just reproduce its current factors. Detour factors are fitted per pickup
+    region from the routed distance, and speeds per vehicle type / time band
+    from the routed distance and duration (driving time only, no waiting).
+    """
+    estimator = estimator or RouteEstimator(cache_alias=None)
+    speed_samples = defaultdict(list)
+    detour_samples = defaultdict(list)
+    for (pickup_lat, pickup_lon, dest_lat, dest_lon, vehicle_type, created_at,
+         route_km, route_sec, estimated) in trips:
+        if None in (pickup_lat, pickup_lon, dest_lat, dest_lon) or not created_at or estimated or not route_km:
+            continue
+        straight_km = straight_line_km(pickup_lat, pickup_lon, dest_lat, dest_lon)
+        if straight_km >= 0.5 and 1.0 <= route_km / straight_km <= 3.0:
+            detour_samples[region_for(pickup_lat, pickup_lon)].append(route_km / straight_km)
+        if not route_sec or route_sec <= 0:
+            continue
+        speed = route_km / (route_sec / 3600.0)
+        if MIN_FIT_SPEED_KMH <= speed <= MAX_FIT_SPEED_KMH:
+            speed_samples[f"{vehicle_type}|{time_band(created_at)}"].append(speed)
+
+    profile = estimator.profile()
+    profile["detour"].update({
+        region: round(statistics.median(ratios), 4)
+        for region, ratios in detour_samples.items() if len(ratios) >= MIN_FIT_SAMPLES
+    })
+    profile["speeds"] = {
+        group: round(statistics.median(speeds), 2)
+        for group, speeds in speed_samples.items() if len(speeds) >= MIN_FIT_SAMPLES
+    }
+    profile["samples"] = {group: len(speeds) for group, speeds in speed_samples.items()}
+    return profile
+
+
+def publish_profile(profile, cache_alias=ESTIMATOR_CACHE_ALIAS):
+    """Share a fitted profile with every worker (picked up within ESTIMATOR_RELOAD_SECONDS)."""
+    caches[cache_alias].set(PROFILE_CACHE_KEY, profile, None)
+    route_estimator.load(profile)
+
+
+route_estimator = RouteEstimator()
@@ -0,0 +1,137 @@
+"""
+One heartbeat loop per process for every WebSocket, instead of a sleeping
+ping task per connection.
+
+Connections are spread over HEARTBEAT_SLOTS slots of a wheel. Every
+HEARTBEAT_INTERVAL_SECONDS / HEARTBEAT_SLOTS the wheel advances one slot and
+pings the connections in it with the same pre-encoded frame, so each socket
+is still pinged once per interval. A peer is evicted when a ping cannot be
+sent, or when it has answered a ping with {"type": "pong"} and then stays
+silent for HEARTBEAT_DEAD_AFTER_SECONDS. Clients that never send a pong are
+only evicted on send errors.
+"""
+import asyncio
+import json
+import logging
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_INTERVAL_SECONDS = getattr(settings, 'HEARTBEAT_INTERVAL_SECONDS', 30)
+HEARTBEAT_SLOTS = getattr(settings, 'HEARTBEAT_SLOTS', 10)
+HEARTBEAT_DEAD_AFTER_SECONDS = getattr(settings, 'HEARTBEAT_DEAD_AFTER_SECONDS', 3 * HEARTBEAT_INTERVAL_SECONDS)
+
+PING_FRAME = json.dumps({"type": "ping"})
+PING_MESSAGE = {"type": "websocket.send", "text": PING_FRAME}
+PONG_FRAMES = frozenset({json.dumps({"type": "pong"}), '{"type":"pong"}'})
+
+
+class HeartbeatWheel:
+    def __init__(self, interval=HEARTBEAT_INTERVAL_SECONDS, slots=HEARTBEAT_SLOTS,
+                 dead_after=HEARTBEAT_DEAD_AFTER_SECONDS):
+        self.interval = interval
+        self.dead_after = dead_after
+        self._slots = [set() for _ in range(slots)]
+        self._slot_of = {}  # connection -> slot index
+        self._last_seen = {}  # connection -> monotonic time of its last frame, once it has sent a pong
+        self._next_slot = 0
+        self._cursor = 0
+        self._task = None
+        self.pings = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._slot_of)
+
+    def register(self, connection):
+        if connection in self._slot_of:
+            return
+        slot = self._next_slot
+        self._next_slot = (self._next_slot + 1) % len(self._slots)
+        self._slots[slot].add(connection)
+        self._slot_of[connection] = slot
+        self._ensure_running()
+
+    def unregister(self, connection):
+        slot = self._slot_of.pop(connection, None)
+        if slot is not None:
+            self._slots[slot].discard(connection)
+        self._last_seen.pop(connection, None)
+
+    def touch(self, connection, pong=False):
+        """
+        Record a frame from the peer. A pong opts the peer in to dead-peer
+        eviction; other frames only refresh peers that have opted in.
+        """
+        if connection in self._slot_of and (pong or connection in self._last_seen):
+            self._last_seen[connection] = time.monotonic()
+
+    async def _ping(self, connection, now):
+        seen = self._last_seen.get(connection)
+        if seen is not None and now - seen > self.dead_after:
+            raise TimeoutError(f"silent for {now - seen:.0f}s")
+        await connection.base_send(PING_MESSAGE)
+
+    async def _evict(self, connection, reason):
+        self.unregister(connection)
+        self.evictions += 1
+        logger.info(f"Evicting dead WebSocket peer {getattr(connection, 'channel_name', connection)}: {reason}")
+        try:
+            await connection.close()
+        except Exception as e:
+            logger.debug(f"Closing evicted peer failed: {e}")
+
+    async def tick(self, now=None):
+        """Ping the connections in the current slot and advance the wheel."""
+        slot = list(self._slots[self._cursor])
+        self._cursor = (self._cursor + 1) % len(self._slots)
+        if not slot:
+            return
+        now = time.monotonic() if now is None else now
+        results = await asyncio.gather(*(self._ping(connection, now) for connection in slot), return_exceptions=True)
+        for connection, result in zip(slot, results):
+            if isinstance(result, Exception):
+                await self._evict(connection, result)
+            else:
+                self.pings += 1
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval / len(self._slots))
+            try:
+                await self.tick()
+            except Exception as e:
+                logger.error(f"Heartbeat tick failed: {e}", exc_info=True)
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stats(self):
+        return {"connections": len(self), "pings": self.pings, "evictions": self.evictions}
+
+
+heartbeat = HeartbeatWheel()
+
+
+class HeartbeatMixin:
+    """
+    Mixin for AsyncWebsocketConsumer: registers the socket with the process
+    heartbeat wheel once accepted and drops it again on disconnect.
+    """
+    async def accept(self, *args, **kwargs):
+        await super().accept(*args, **kwargs)
+        heartbeat.register(self)
+
+    async def websocket_receive(self, message):
+        if message.get("text") in PONG_FRAMES:
+            heartbeat.touch(self, pong=True)
+            return
+        heartbeat.touch(self)
+        await super().websocket_receive(message)
+
+    async def websocket_disconnect(self, message):
+        heartbeat.unregister(self)
+        await super().websocket_disconnect(message)
@@ -0,0 +1,114 @@
+"""
+Public holiday and peak-hour calendar for the countries we operate in.
+
+Holiday sets are computed once per (country, year) and cached, so a surge
+check is a timezone conversion plus two set lookups. Holidays that follow the
+lunar calendar (Eid al-Fitr, Eid al-Adha, ...) are announced each year and
+must be listed in TRIP_EXTRA_HOLIDAYS, e.g. {"NG": ["2025-03-31"]}.
+"""
+import datetime
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.utils import timezone
+
+DEFAULT_COUNTRY = getattr(settings, 'TRIP_DEFAULT_COUNTRY', 'ZA')
+EXTRA_HOLIDAYS = getattr(settings, 'TRIP_EXTRA_HOLIDAYS', {})
+# Local hours that count as peak: 6 PM to 9 AM.
+PEAK_HOURS = frozenset(getattr(settings, 'TRIP_PEAK_HOURS', [18, 19, 20, 21, 22, 23, 0, 1, 2, 3, 4, 5, 6, 7, 8, 9]))
+
+COUNTRY_TIME_ZONES = {
+    "ZA": ZoneInfo("Africa/Johannesburg"),
+    "NG": ZoneInfo("Africa/Lagos"),
+    "KE": ZoneInfo("Africa/Nairobi"),
+    "GH": ZoneInfo("Africa/Accra"),
+}
+COUNTRY_BY_CURRENCY = {"ZAR": "ZA", "NGN": "NG", "KES": "KE", "GHS": "GH"}
+# (min_lat, max_lat, min_lon, max_lon); the four boxes do not overlap.
+COUNTRY_BOUNDS = {
+    "ZA": (-35.0, -22.0, 16.0, 33.0),
+    "NG": (4.0, 14.0, 2.6, 15.0),
+    "KE": (-4.8, 5.1, 33.9, 42.0),
+    "GH": (4.5, 11.2, -3.3, 1.2),
+}
+
+# Fixed-date public holidays as (month, day).
+FIXED_HOLIDAYS = {
+    "ZA": [(1, 1), (3, 21), (4, 27), (5, 1), (6, 16), (8, 9), (9, 24), (12, 16), (12, 25), (12, 26)],
+    "NG": [(1, 1), (5, 1), (6, 12), (10, 1), (12, 25), (12, 26)],
+    "KE": [(1, 1), (5, 1), (6, 1), (10, 10), (10, 20), (12, 12), (12, 25), (12, 26)],
+    "GH": [(1, 1), (3, 6), (5, 1), (8, 4), (9, 21), (12, 25), (12, 26)],
+}
+# Countries where a holiday falling on a Sunday is observed on the Monday.
+SUNDAY_TO_MONDAY = {"ZA", "KE"}
+
+
+def calculate_easter(year):
+    """
+    Calculate Easter for the given year (Gregorian calendar)
+    using the Anonymous Gregorian algorithm.
+    Returns a datetime.date object.
+    """
+    a = year % 19
+    b = year // 100
+    c = year % 100
+    d = b // 4
+    e = b % 4
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i = c // 4
+    k = c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month = (h + l - 7 * m + 114) // 31  # Month: 3=March, 4=April
+    day = ((h + l - 7 * m + 114) % 31) + 1
+    return datetime.date(year, month, day)
+
+
+@lru_cache(maxsize=None)
+def holidays_for(country, year):
+    """Every festive date of `year` in `country`: public holidays plus Easter Sunday."""
+    days = {datetime.date(year, month, day) for month, day in FIXED_HOLIDAYS.get(country, [(1, 1), (12, 25)])}
+    if country in SUNDAY_TO_MONDAY:
+        days |= {day + datetime.timedelta(days=1) for day in days if day.weekday() == 6}
+    easter = calculate_easter(year)
+    days |= {easter - datetime.timedelta(days=2), easter, easter + datetime.timedelta(days=1)}
+    if country == "GH":
+        # Farmers' Day: first Friday of December.
+        december = datetime.date(year, 12, 1)
+        days.add(december + datetime.timedelta(days=(4 - december.weekday()) % 7))
+    days |= {
+        day for day in map(datetime.date.fromisoformat, EXTRA_HOLIDAYS.get(country, [])) if day.year == year
+    }
+    return frozenset(days)
+
+
+def country_for_point(lat, lon):
+    """Country code for a pickup location, or DEFAULT_COUNTRY outside the known boxes."""
+    if lat is None or lon is None:
+        return DEFAULT_COUNTRY
+    lat, lon = float(lat), float(lon)
+    for country, (min_lat, max_lat, min_lon, max_lon) in COUNTRY_BOUNDS.items():
+        if min_lat <= lat <= max_lat and min_lon <= lon <= max_lon:
+            return country
+    return DEFAULT_COUNTRY
+
+
+def local_time(dt, country=DEFAULT_COUNTRY):
+    """`dt` in the country's local time. Naive datetimes are taken to be local already."""
+    tz = COUNTRY_TIME_ZONES.get(country, COUNTRY_TIME_ZONES[DEFAULT_COUNTRY])
+    if timezone.is_naive(dt):
+        return dt.replace(tzinfo=tz)
+    return dt.astimezone(tz)
+
+
+def is_holiday(day, country=DEFAULT_COUNTRY):
+    return day in holidays_for(country, day.year)
+
+
+def is_peak_hour_or_festive(dt=None, country=DEFAULT_COUNTRY):
+    """True during local peak hours or on a festive day in `country` (default: now)."""
+    local = local_time(dt or timezone.now(), country)
+    return local.hour in PEAK_HOURS or local.date() in holidays_for(country, local.year)
@@ -0,0 +1,95 @@
+"""
+Driver GPS ingestion.
+
+Phones can send positions several times a second. Each connection gets a
+LocationCoalescer that only lets a position through (to the database, the
+matching indexes and the rider broadcast) when the driver has moved at least
+DRIVER_LOCATION_MIN_DISTANCE_M and DRIVER_LOCATION_MIN_INTERVAL_SECONDS have
+passed since the last one. Pings inside the interval collapse to the latest
+position, which is published when the interval ends.
+"""
+import asyncio
+import logging
+import time
+
+from django.conf import settings
+
+from .estimator import straight_line_km
+
+logger = logging.getLogger(__name__)
+
+DRIVER_LOCATION_MIN_INTERVAL_SECONDS = getattr(settings, 'DRIVER_LOCATION_MIN_INTERVAL_SECONDS', 3.0)
+DRIVER_LOCATION_MIN_DISTANCE_M = getattr(settings, 'DRIVER_LOCATION_MIN_DISTANCE_M', 20.0)
+# A parked driver is still published this often, so the presence tracker and
+# the stale-driver sweeper keep seeing them (must stay below DRIVER_STALE_AFTER_SECONDS).
+DRIVER_LOCATION_KEEPALIVE_SECONDS = getattr(settings, 'DRIVER_LOCATION_KEEPALIVE_SECONDS', 30.0)
+
+
+class LocationCoalescer:
+    """
+    Throttles one driver's positions before `publish(lat, lon)` (a coroutine
+    function) is called. Not thread-safe; use one per consumer.
+    """
+    def __init__(self, publish, min_interval=DRIVER_LOCATION_MIN_INTERVAL_SECONDS,
+                 min_distance_m=DRIVER_LOCATION_MIN_DISTANCE_M, keepalive=DRIVER_LOCATION_KEEPALIVE_SECONDS):
+        self.publish = publish
+        self.min_interval = min_interval
+        self.min_distance_m = min_distance_m
+        self.keepalive = keepalive
+        self._last = None  # (lat, lon, monotonic time) of the last published position
+        self._pending = None  # latest position waiting for the interval to end
+        self._timer = None
+        self.received = 0
+        self.published = 0
+
+    async def offer(self, lat, lon):
+        """Take a ping. Returns True if it was published right away."""
+        self.received += 1
+        lat, lon = float(lat), float(lon)
+        now = time.monotonic()
+        if self._last is not None:
+            last_lat, last_lon, last_time = self._last
+            if now - last_time < self.keepalive and \
+                    straight_line_km(last_lat, last_lon, lat, lon) * 1000.0 < self.min_distance_m:
+                # Back within the last published spot: nothing new to publish.
+                self._pending = None
+                return False
+            if now - last_time < self.min_interval or self._timer_running():
+                self._pending = (lat, lon)
+                if not self._timer_running():
+                    self._timer = asyncio.get_running_loop().create_task(
+                        self._publish_pending(last_time + self.min_interval - now)
+                    )
+                return False
+        await self._emit(lat, lon, now)
+        return True
+
+    def _timer_running(self):
+        return self._timer is not None and not self._timer.done()
+
+    async def _emit(self, lat, lon, now):
+        self._pending = None
+        self._last = (lat, lon, now)
+        self.published += 1
+        await self.publish(lat, lon)
+
+    async def _publish_pending(self, delay):
+        await asyncio.sleep(delay)
+        if self._pending is None:
+            return
+        lat, lon = self._pending
+        try:
+            await self._emit(lat, lon, time.monotonic())
+        except Exception as e:
+            logger.error(f"Publishing coalesced driver location failed: {e}", exc_info=True)
+
+    async def flush(self):
+        """Publish the pending position now, e.g. when the driver disconnects."""
+        if self._timer_running():
+            self._timer.cancel()
+        if self._pending is not None:
+            lat, lon = self._pending
+            await self._emit(lat, lon, time.monotonic())
+
+    def stats(self):
+        return {"received": self.received, "published": self.published}
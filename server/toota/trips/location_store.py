@@ -0,0 +1,148 @@
+import logging
+import threading
+
+import redis
+from django.conf import settings
+
+from authentication.models import Driver
+from .distance import CandidateCoordinates
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = getattr(settings, 'REDIS_URL', 'redis://127.0.0.1:6379/0')
+DRIVER_LOCATION_BACKEND = getattr(settings, 'DRIVER_LOCATION_BACKEND', 'redis')
+
+KEY_PREFIX = "driver_geo"
+# Hash of driver_id -> GEO key the driver currently lives in, so a change of
+# vehicle type or availability removes the old entry.
+MEMBERSHIP_KEY = f"{KEY_PREFIX}:membership"
+NO_VEHICLE = "none"
+
+
+def location_key(vehicle_type, is_available=True):
+    """Return the GEO set key for drivers of the given vehicle type and availability."""
+    state = "available" if is_available else "busy"
+    return f"{KEY_PREFIX}:{vehicle_type or NO_VEHICLE}:{state}"
+
+
+def _search_keys(vehicle_types):
+    if not vehicle_types:
+        vehicle_types = [choice for choice, _ in Driver.VEHICLE_CHOICES] + [None]
+    return [location_key(vehicle_type) for vehicle_type in vehicle_types]
+
+
+class RedisLocationStore:
+    """
+    Driver positions kept in Redis GEO sets, one set per vehicle type and
+    availability, so every ASGI worker sees the same live fleet.
+    """
+    def __init__(self, client):
+        self.client = client
+
+    def update(self, driver_id, lat, lon, vehicle_type=None, is_available=True):
+        driver_id = str(driver_id)
+        if lat is None or lon is None:
+            self.remove(driver_id)
+            return
+        key = location_key(vehicle_type, is_available)
+        previous_key = self.client.hget(MEMBERSHIP_KEY, driver_id)
+        if isinstance(previous_key, bytes):
+            previous_key = previous_key.decode()
+
+        pipe = self.client.pipeline()
+        if previous_key and previous_key != key:
+            pipe.zrem(previous_key, driver_id)
+        pipe.geoadd(key, [float(lon), float(lat), driver_id])
+        pipe.hset(MEMBERSHIP_KEY, driver_id, key)
+        pipe.execute()
+
+    def remove(self, driver_id):
+        driver_id = str(driver_id)
+        previous_key = self.client.hget(MEMBERSHIP_KEY, driver_id)
+        if isinstance(previous_key, bytes):
+            previous_key = previous_key.decode()
+        pipe = self.client.pipeline()
+        if previous_key:
+            pipe.zrem(previous_key, driver_id)
+        pipe.hdel(MEMBERSHIP_KEY, driver_id)
+        pipe.execute()
+
+    def search(self, lat, lon, radius_km, vehicle_types=None, count=None):
+        """
+        GEOSEARCH every available-driver set for the requested vehicle types.
+        Returns (driver_id, lat, lon, distance_km) tuples, nearest first.
+        """
+        pipe = self.client.pipeline()
+        for key in _search_keys(vehicle_types):
+            pipe.geosearch(
+                key, longitude=float(lon), latitude=float(lat), radius=radius_km, unit="km",
+                sort="ASC", count=count, withcoord=True, withdist=True,
+            )
+        results = []
+        for matches in pipe.execute():
+            for member, distance, (d_lon, d_lat) in matches:
+                if isinstance(member, bytes):
+                    member = member.decode()
+                results.append((member, d_lat, d_lon, float(distance)))
+        results.sort(key=lambda match: match[3])
+        return results[:count] if count else results
+
+
+class InMemoryLocationStore:
+    """
+    Process-local stand-in for RedisLocationStore with the same interface.
+    Used by the tests and for single-process development servers.
+    """
+    def __init__(self):
+        self._positions = {}  # key -> {driver_id: (lat, lon)}
+        self._membership = {}
+        self._lock = threading.Lock()
+
+    def update(self, driver_id, lat, lon, vehicle_type=None, is_available=True):
+        driver_id = str(driver_id)
+        if lat is None or lon is None:
+            self.remove(driver_id)
+            return
+        key = location_key(vehicle_type, is_available)
+        with self._lock:
+            previous_key = self._membership.get(driver_id)
+            if previous_key and previous_key != key:
+                self._positions[previous_key].pop(driver_id, None)
+            self._positions.setdefault(key, {})[driver_id] = (float(lat), float(lon))
+            self._membership[driver_id] = key
+
+    def remove(self, driver_id):
+        driver_id = str(driver_id)
+        with self._lock:
+            previous_key = self._membership.pop(driver_id, None)
+            if previous_key:
+                self._positions[previous_key].pop(driver_id, None)
+
+    def search(self, lat, lon, radius_km, vehicle_types=None, count=None):
+        with self._lock:
+            positions = {
+                driver_id: position
+                for key in _search_keys(vehicle_types)
+                for driver_id, position in self._positions.get(key, {}).items()
+            }
+        candidates = CandidateCoordinates.from_rows(
+            (driver_id, d_lat, d_lon) for driver_id, (d_lat, d_lon) in positions.items()
+        )
+        return [
+            (driver_id, *positions[driver_id], distance)
+            for driver_id, distance in candidates.nearest(lat, lon, count, max_distance_km=radius_km)
+        ]
+
+
+_location_store = None
+
+
+def get_location_store():
+    """Return the process-wide driver location store configured by DRIVER_LOCATION_BACKEND."""
+    global _location_store
+    if _location_store is None:
+        if DRIVER_LOCATION_BACKEND == "memory":
+            _location_store = InMemoryLocationStore()
+        else:
+            _location_store = RedisLocationStore(redis.Redis.from_url(REDIS_URL))
+    return _location_store
@@ -0,0 +1,49 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings, setup_databases, teardown_databases
+
+from trips.benchmarks import run_matching_benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed synthetic driver fleets into a throwaway test database and report "
+        "p50/p95/p99 latency and queries per call for the matching path."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fleet-sizes", nargs="+", type=int, default=[1000, 10000, 100000])
+        parser.add_argument("--calls", type=int, default=200, help="Timed calls per benchmark.")
+        parser.add_argument("--modes", nargs="+", default=["grid", "db", "geo"], help="Matching modes to time.")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--json", action="store_true", help="Print machine-readable results.")
+
+    def handle(self, *args, **options):
+        report = {}
+        # Driver cards go to a local cache so no Redis is needed for the run.
+        with override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}):
+            for fleet_size in options["fleet_sizes"]:
+                # A fresh test database per fleet size keeps runs independent of each other
+                # and never touches the configured database.
+                old_config = setup_databases(verbosity=0, interactive=False, aliases={"default"})
+                try:
+                    report[fleet_size] = run_matching_benchmark(
+                        fleet_size, calls=options["calls"], modes=options["modes"], seed=options["seed"]
+                    )
+                finally:
+                    teardown_databases(old_config, verbosity=0)
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        header = f"{'fleet':>8}  {'benchmark':<28} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'queries':>8}"
+        self.stdout.write(header)
+        self.stdout.write("-" * len(header))
+        for fleet_size, results in report.items():
+            for name, summary in results.items():
+                self.stdout.write(
+                    f"{fleet_size:>8}  {name:<28} {summary['p50_ms']:>9.3f} {summary['p95_ms']:>9.3f} "
+                    f"{summary['p99_ms']:>9.3f} {summary['queries_per_call']:>8.2f}"
+                )
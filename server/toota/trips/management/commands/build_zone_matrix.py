@@ -0,0 +1,46 @@
+import asyncio
+
+from django.core.management.base import BaseCommand, CommandError
+
+from trips.models import Zone
+from trips.osrm import OSRM_BASE_URL, AsyncRoutingClient
+from trips.zones import ZONE_MATRIX_PATH, ZONE_TABLE_CHUNK, build_matrix
+
+
+class Command(BaseCommand):
+    help = (
+        "Route every pair of active zones through the OSRM table API and write the "
+        "zone-to-zone distance/duration matrix that quotes are served from."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--osrm-url", default=OSRM_BASE_URL,
+                            help="OSRM to build against, e.g. a local osrm-routed instance.")
+        parser.add_argument("--path", default=ZONE_MATRIX_PATH, help="Output path without the .npy/.json suffix.")
+        parser.add_argument("--chunk", type=int, default=ZONE_TABLE_CHUNK,
+                            help="Sources/destinations per table request.")
+
+    def handle(self, *args, **options):
+        zones = list(
+            Zone.objects.filter(is_active=True).order_by("name")
+            .values_list("id", "latitude", "longitude", "radius_km")
+        )
+        if len(zones) < 2:
+            raise CommandError("At least two active zones are needed to build a matrix.")
+
+        matrix = asyncio.run(self._build(zones, options["osrm_url"], options["chunk"]))
+        matrix.save(options["path"])
+
+        routed = int((matrix.matrix[0] == matrix.matrix[0]).sum())  # NaN != NaN
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {len(zones)}x{len(zones)} zone matrix to {options['path']}.npy ({routed} routed pairs)"
+        ))
+
+    @staticmethod
+    async def _build(zones, osrm_url, chunk):
+        # A longer timeout than trip routing: table requests for big blocks are slow.
+        client = AsyncRoutingClient(base_url=osrm_url, timeout=60.0, secondary_url=None)
+        try:
+            return await build_matrix(zones, client, chunk=chunk)
+        finally:
+            await client.close()
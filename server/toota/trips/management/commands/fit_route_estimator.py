@@ -0,0 +1,36 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from trips.estimator import fit_profile, publish_profile
+from trips.models import Trip
+
+
+class Command(BaseCommand):
+    help = (
+        "Fit per vehicle type and time-of-day speeds and per-region detour factors for the "
+        "offline route estimator from completed trips and share them with every worker through the cache."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=50000, help="Most recent completed trips to fit on.")
+        parser.add_argument("--dry-run", action="store_true", help="Print the fitted profile without publishing it.")
+
+    def handle(self, *args, **options):
+        trips = (
+            Trip.objects.filter(status=Trip.StatusChoices.COMPLETED)
+            .order_by("-updated_at")
+            .values_list(
+                "pickup_lat", "pickup_long", "dest_lat", "dest_long", "vehicle_type",
+                "created_at", "route_distance_km", "route_duration_sec", "route_estimated",
+            )
+        )[:options["limit"]]
+        profile = fit_profile(trips.iterator())
+
+        if options["dry_run"]:
+            self.stdout.write(json.dumps(profile, indent=2))
+            return
+        publish_profile(profile)
+        self.stdout.write(self.style.SUCCESS(
+            f"Published route estimator profile with {len(profile['speeds'])} fitted speed groups"
+        ))
@@ -3,6 +3,8 @@ from django.core.validators import MinLengthValidator
 import uuid
 from django.contrib.auth import get_user_model
 
+from .route_result import RouteResult
+
 User = get_user_model()  # Get the user model dynamically
 class Trip(models.Model):
     class StatusChoices(models.TextChoices):
@@ -69,6 +71,14 @@ class Trip(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_paid = models.BooleanField(default=False)
+    # Route computed once when the trip is created; later lifecycle steps reuse it.
+    route_distance_km = models.FloatField(null=True, blank=True)
+    route_duration_sec = models.FloatField(null=True, blank=True)
+    route_polyline = models.TextField(null=True, blank=True)
+    # True while the stored route is the offline estimate rather than an OSRM route.
+    route_estimated = models.BooleanField(default=False)
+
+    ROUTE_FIELDS = ["route_distance_km", "route_duration_sec", "route_polyline", "route_estimated"]
 
     def __str__(self):
         return f"{self.pickup} to {self.destination} and status is {self.status}"
@@ -79,7 +89,8 @@ class Trip(models.Model):
           - Base fare according to the vehicle type.
           - Cost per kilometer.
           - Cost per minute.
-          - Optional surge pricing.
+          - Optional surge pricing: True applies SURGE_MULTIPLIER, a number
+            (e.g. from the surge engine) is used as the multiplier itself.
         """
         base_fare = self.VEHICLE_BASE_FARES.get(self.vehicle_type, 100.0)
         distance_cost = distance_km * self.COST_PER_KM
@@ -87,6 +98,45 @@ class Trip(models.Model):
         total_fare = base_fare + distance_cost + time_cost
         
         if surge:
-            total_fare *= self.SURGE_MULTIPLIER
+            total_fare *= self.SURGE_MULTIPLIER if surge is True else float(surge)
         
         return round(total_fare, 2)
+
+    def set_route(self, route):
+        """Store a RouteResult on the trip (not saved)."""
+        self.route_distance_km = route.distance_km
+        self.route_duration_sec = route.duration_s
+        self.route_polyline = route.polyline
+        self.route_estimated = route.estimated
+
+    def stored_route(self):
+        """The RouteResult saved at creation, or None for trips created before routes were stored."""
+        if self.route_distance_km is None or self.route_duration_sec is None:
+            return None
+        return RouteResult(self.route_distance_km * 1000.0, self.route_duration_sec,
+                           estimated=self.route_estimated, polyline=self.route_polyline)
+
+    def calculate_route_fare(self, route, surge=False):
+        """Fare for a RouteResult, using its unrounded distance and duration."""
+        return self.calculate_fare(route.distance_km, route.duration_minutes, surge)
+
+
+class Zone(models.Model):
+    """A depot, township or industrial area whose zone-to-zone routes are precomputed."""
+    class KindChoices(models.TextChoices):
+        DEPOT = "depot", "Depot"
+        TOWNSHIP = "township", "Township"
+        INDUSTRIAL = "industrial", "Industrial"
+        OTHER = "other", "Other"
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False, unique=True)
+    name = models.CharField(max_length=255)
+    kind = models.CharField(choices=KindChoices.choices, default=KindChoices.OTHER, max_length=20)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    # Trips starting/ending within this distance of the centre use the zone's routes.
+    radius_km = models.FloatField(default=2.0)
+    is_active = models.BooleanField(default=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.kind})"
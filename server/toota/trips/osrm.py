@@ -0,0 +1,228 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+import aiohttp
+import numpy as np
+from django.conf import settings
+
+from .breaker import CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+OSRM_BASE_URL = getattr(settings, 'OSRM_BASE_URL', 'http://router.project-osrm.org')
+# Optional second OSRM deployment that slow primary requests are hedged to.
+OSRM_SECONDARY_URL = getattr(settings, 'OSRM_SECONDARY_URL', None)
+OSRM_PROFILE = getattr(settings, 'OSRM_PROFILE', 'driving')
+# Ask for a simplified encoded polyline with each route (stored on the trip for maps).
+OSRM_ROUTE_POLYLINE = getattr(settings, 'OSRM_ROUTE_POLYLINE', False)
+# Per-call budget for one OSRM request, connect + read.
+OSRM_TIMEOUT_SECONDS = getattr(settings, 'OSRM_TIMEOUT_SECONDS', 5.0)
+# Upper bound on OSRM requests in flight from one worker process.
+OSRM_MAX_CONCURRENCY = getattr(settings, 'OSRM_MAX_CONCURRENCY', 16)
+# Idle keep-alive connections are reused for this long before being closed.
+OSRM_KEEPALIVE_SECONDS = getattr(settings, 'OSRM_KEEPALIVE_SECONDS', 30)
+# A hedge is sent once the primary has taken longer than its recent p95,
+# clamped to this range (the maximum is used until enough calls were seen).
+OSRM_HEDGE_MIN_DELAY_SECONDS = getattr(settings, 'OSRM_HEDGE_MIN_DELAY_SECONDS', 0.05)
+OSRM_HEDGE_MAX_DELAY_SECONDS = getattr(settings, 'OSRM_HEDGE_MAX_DELAY_SECONDS', 1.0)
+LATENCY_WINDOW = 200
+MIN_LATENCY_SAMPLES = 20
+
+
+class RoutingUnavailable(Exception):
+    """An OSRM endpoint timed out, refused the connection or returned a server error."""
+
+
+class RoutingEndpoint:
+    """One OSRM deployment with its own circuit breaker and recent latencies."""
+    def __init__(self, base_url, breaker=None):
+        self.base_url = base_url.rstrip("/")
+        self.breaker = breaker or CircuitBreaker()
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def p95(self):
+        if len(self.latencies) < MIN_LATENCY_SAMPLES:
+            return None
+        return float(np.percentile(self.latencies, 95))
+
+
+class AsyncRoutingClient:
+    """
+    asyncio OSRM client sharing one pooled aiohttp session per event loop, so
+    route lookups neither occupy executor threads nor pay a new TCP handshake
+    per call. Requests are capped at max_concurrency and time out individually.
+
+    Each endpoint sits behind a circuit breaker, so a degraded OSRM fails fast
+    (callers fall back to the offline estimator) instead of stalling every
+    request. With a secondary endpoint configured, a primary request that runs
+    past its p95 latency is hedged to the secondary and the first answer wins.
+    """
+    def __init__(self, base_url=OSRM_BASE_URL, profile=OSRM_PROFILE, timeout=OSRM_TIMEOUT_SECONDS,
+                 max_concurrency=OSRM_MAX_CONCURRENCY, keepalive=OSRM_KEEPALIVE_SECONDS,
+                 secondary_url=OSRM_SECONDARY_URL, hedge_min_delay=OSRM_HEDGE_MIN_DELAY_SECONDS,
+                 hedge_max_delay=OSRM_HEDGE_MAX_DELAY_SECONDS, breaker_factory=CircuitBreaker,
+                 polyline=OSRM_ROUTE_POLYLINE):
+        self.primary = RoutingEndpoint(base_url, breaker_factory())
+        self.secondary = RoutingEndpoint(secondary_url, breaker_factory()) if secondary_url else None
+        self.profile = profile
+        self.polyline = polyline
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.keepalive = keepalive
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_max_delay = hedge_max_delay
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._session = None
+        self._loop = None
+        self._semaphore = None
+
+    @property
+    def base_url(self):
+        return self.primary.base_url
+
+    def _get_session(self):
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            # Sessions are bound to the loop they were created on.
+            connector = aiohttp.TCPConnector(
+                limit=self.max_concurrency, keepalive_timeout=self.keepalive, ttl_dns_cache=300,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        return self._session
+
+    def hedge_delay(self):
+        p95 = self.primary.p95()
+        if p95 is None:
+            return self.hedge_max_delay
+        return min(max(p95, self.hedge_min_delay), self.hedge_max_delay)
+
+    async def _call(self, endpoint, service, path, params):
+        """
+        One request to one endpoint, already admitted by its breaker.
+        Returns the decoded body; raises RoutingUnavailable if the endpoint failed.
+        """
+        session = self._get_session()
+        url = f"{endpoint.base_url}/{service}/v1/{self.profile}/{path}"
+        try:
+            async with self._semaphore:
+                # Timed once admitted, so queueing for a local slot is not counted as OSRM latency.
+                started = time.monotonic()
+                async with session.get(url, params=params) as response:
+                    if response.status >= 500:
+                        raise RoutingUnavailable(f"HTTP {response.status}")
+                    data = await response.json(content_type=None)
+                elapsed = time.monotonic() - started
+        except asyncio.CancelledError:
+            endpoint.breaker.abandon()
+            raise
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError, RoutingUnavailable) as e:
+            endpoint.breaker.record_failure()
+            logger.warning(f"OSRM {service} request to {endpoint.base_url} failed: {e!r}")
+            raise RoutingUnavailable(str(e)) from e
+        endpoint.latencies.append(elapsed)
+        endpoint.breaker.record_success(elapsed)
+        return data
+
+    async def _request(self, service, path, params):
+        """Primary with an optional hedge to the secondary; None if no endpoint answered."""
+        secondary = self.secondary
+        if not self.primary.breaker.allow():
+            if secondary is not None and secondary.breaker.allow():
+                try:
+                    return await self._call(secondary, service, path, params)
+                except RoutingUnavailable:
+                    return None
+            return None
+
+        loop = asyncio.get_running_loop()
+        primary_task = loop.create_task(self._call(self.primary, service, path, params))
+        tasks = {primary_task}
+        try:
+            if secondary is not None:
+                # Hedge when the primary is slow, or straight away if it already failed.
+                done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay())
+                primary_failed = bool(done) and primary_task.exception() is not None
+                if (not done or primary_failed) and secondary.breaker.allow():
+                    self.hedges += 1
+                    tasks.add(loop.create_task(self._call(secondary, service, path, params)))
+
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary_task:
+                            self.hedge_wins += 1
+                        return task.result()
+            return None
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def get_json(self, service, coordinates, **params):
+        """
+        GET /{service}/v1/{profile}/{lon,lat;...} and return the decoded body,
+        or None on timeouts, connection errors, open breakers and non-Ok responses.
+        """
+        path = ";".join(f"{float(lon)},{float(lat)}" for lat, lon in coordinates)
+        data = await self._request(service, path, params)
+        if data is None:
+            return None
+        if data.get("code") != "Ok":
+            logger.warning(f"OSRM {service} returned {data.get('code')}: {data.get('message')}")
+            return None
+        return data
+
+    async def route(self, pickup_lat, pickup_lon, dest_lat, dest_lon):
+        """The first OSRM route between two points ({"distance": m, "duration": s, ...}) or None."""
+        geometry = {"overview": "simplified", "geometries": "polyline"} if self.polyline else {"overview": "false"}
+        data = await self.get_json("route", [(pickup_lat, pickup_lon), (dest_lat, dest_lon)], **geometry)
+        if not data or not data.get("routes"):
+            return None
+        return data["routes"][0]
+
+    async def table(self, sources, destinations):
+        """
+        Duration (s) and distance (m) matrices from every source to every
+        destination in one request: {"durations": [[...]], "distances": [[...]]}.
+        Unroutable pairs are None. Returns None if the request failed.
+        """
+        sources, destinations = list(sources), list(destinations)
+        data = await self.get_json(
+            "table", sources + destinations,
+            sources=";".join(str(i) for i in range(len(sources))),
+            destinations=";".join(str(i) for i in range(len(sources), len(sources) + len(destinations))),
+            annotations="duration,distance",
+        )
+        if not data or "durations" not in data or "distances" not in data:
+            return None
+        return {"durations": data["durations"], "distances": data["distances"]}
+
+    def stats(self):
+        endpoints = {"primary": self.primary}
+        if self.secondary is not None:
+            endpoints["secondary"] = self.secondary
+        return {
+            **{
+                name: {"url": endpoint.base_url, "breaker": endpoint.breaker.state, "p95_seconds": endpoint.p95()}
+                for name, endpoint in endpoints.items()
+            },
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+        }
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+routing_client = AsyncRoutingClient()
@@ -0,0 +1,115 @@
+"""
+Write-behind persistence of driver positions.
+
+Published positions are kept in memory, latest per driver, and written every
+DRIVER_POSITION_FLUSH_MS with one bulk_update of latitude/longitude/updated_at
+instead of one UPDATE per ping. Whatever is still buffered is written when
+the process exits.
+"""
+import asyncio
+import atexit
+import logging
+import threading
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import DatabaseError
+from django.utils import timezone
+
+from authentication.models import Driver
+from .driver_cards import patch_driver_card_locations
+
+logger = logging.getLogger(__name__)
+
+DRIVER_POSITION_FLUSH_MS = getattr(settings, 'DRIVER_POSITION_FLUSH_MS', 500)
+DRIVER_POSITION_BATCH_SIZE = getattr(settings, 'DRIVER_POSITION_BATCH_SIZE', 500)
+# bulk_update skips auto_now, so updated_at is set from the ping time explicitly.
+POSITION_FIELDS = ["latitude", "longitude", "updated_at"]
+
+
+class PositionBuffer:
+    def __init__(self, flush_ms=DRIVER_POSITION_FLUSH_MS, batch_size=DRIVER_POSITION_BATCH_SIZE):
+        self.flush_seconds = flush_ms / 1000.0
+        self.batch_size = batch_size
+        self._positions = {}  # driver_id -> (lat, lon, ping time)
+        self._lock = threading.Lock()
+        self._task = None
+        self.buffered = 0
+        self.written = 0
+        self.flushes = 0
+
+    def __len__(self):
+        return len(self._positions)
+
+    def put(self, driver_id, latitude, longitude):
+        """Buffer a position; a newer one for the same driver replaces it."""
+        with self._lock:
+            self._positions[str(driver_id)] = (latitude, longitude, timezone.now())
+            self.buffered += 1
+
+    def discard(self, driver_id):
+        """Drop a buffered position that has been saved some other way."""
+        with self._lock:
+            self._positions.pop(str(driver_id), None)
+
+    def _take(self):
+        with self._lock:
+            batch, self._positions = self._positions, {}
+        return batch
+
+    def _restore(self, batch):
+        # Positions that arrived while the batch was being written are newer; keep those.
+        with self._lock:
+            for driver_id, position in batch.items():
+                self._positions.setdefault(driver_id, position)
+
+    def flush(self):
+        """Write every buffered position with bulk_update. Returns the number of drivers written."""
+        batch = self._take()
+        if not batch:
+            return 0
+        drivers = [
+            Driver(id=driver_id, latitude=lat, longitude=lon, updated_at=seen_at)
+            for driver_id, (lat, lon, seen_at) in batch.items()
+        ]
+        try:
+            Driver.objects.bulk_update(drivers, POSITION_FIELDS, batch_size=self.batch_size)
+        except DatabaseError as e:
+            logger.error(f"Could not write {len(batch)} driver positions, will retry: {e}")
+            self._restore(batch)
+            return 0
+        # bulk_update sends no post_save, so patch the cached driver cards here.
+        patch_driver_card_locations(batch)
+        self.written += len(batch)
+        self.flushes += 1
+        return len(batch)
+
+    async def _flush_forever(self):
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            if self._positions:
+                try:
+                    await database_sync_to_async(self.flush)()
+                except Exception as e:
+                    logger.error(f"Driver position flush failed: {e}", exc_info=True)
+
+    def ensure_running(self):
+        """Start the per-process flush loop if it is not already running."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._flush_forever())
+
+    def stats(self):
+        return {"pending": len(self), "buffered": self.buffered, "written": self.written, "flushes": self.flushes}
+
+
+position_buffer = PositionBuffer()
+
+
+@atexit.register
+def _flush_on_exit():
+    if len(position_buffer):
+        try:
+            written = position_buffer.flush()
+            logger.info(f"Wrote {written} buffered driver positions on shutdown")
+        except Exception as e:
+            logger.error(f"Could not write buffered driver positions on shutdown: {e}")
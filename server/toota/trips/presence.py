@@ -0,0 +1,172 @@
+import asyncio
+import logging
+import threading
+import time
+
+import redis
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import transaction
+
+from authentication.models import Driver
+from .location_store import DRIVER_LOCATION_BACKEND, REDIS_URL, get_location_store
+from .spatial import driver_index
+
+logger = logging.getLogger(__name__)
+
+# Drivers whose last GPS ping is older than this are not offered to riders.
+DRIVER_STALE_AFTER_SECONDS = getattr(settings, 'DRIVER_STALE_AFTER_SECONDS', 120)
+# How often the background sweeper marks silent drivers unavailable.
+DRIVER_SWEEP_INTERVAL_SECONDS = getattr(settings, 'DRIVER_SWEEP_INTERVAL_SECONDS', 60)
+
+LAST_SEEN_KEY = "driver_presence:last_seen"
+SWEPT_KEY = "driver_presence:swept"
+
+
+class RedisPresence:
+    """
+    Last-ping timestamps in a Redis sorted set (score = unix time), shared by
+    every worker and updated with a single ZADD per ping.
+    """
+    def __init__(self, client):
+        self.client = client
+
+    def mark_seen(self, driver_id, timestamp=None):
+        """Record a ping. Returns True if the sweeper had marked this driver unavailable."""
+        driver_id = str(driver_id)
+        pipe = self.client.pipeline()
+        pipe.zadd(LAST_SEEN_KEY, {driver_id: timestamp or time.time()})
+        pipe.srem(SWEPT_KEY, driver_id)
+        _, revived = pipe.execute()
+        return bool(revived)
+
+    def fresh(self, driver_ids, max_age=DRIVER_STALE_AFTER_SECONDS):
+        """Subset of driver_ids that pinged within the last max_age seconds."""
+        driver_ids = [str(driver_id) for driver_id in driver_ids]
+        if not driver_ids:
+            return set()
+        cutoff = time.time() - max_age
+        scores = self.client.zmscore(LAST_SEEN_KEY, driver_ids)
+        return {driver_id for driver_id, score in zip(driver_ids, scores) if score is not None and score >= cutoff}
+
+    def stale(self, max_age=DRIVER_STALE_AFTER_SECONDS):
+        members = self.client.zrangebyscore(LAST_SEEN_KEY, "-inf", time.time() - max_age)
+        return [member.decode() if isinstance(member, bytes) else member for member in members]
+
+    def mark_swept(self, driver_ids):
+        driver_ids = [str(driver_id) for driver_id in driver_ids]
+        if driver_ids:
+            pipe = self.client.pipeline()
+            pipe.zrem(LAST_SEEN_KEY, *driver_ids)
+            pipe.sadd(SWEPT_KEY, *driver_ids)
+            pipe.execute()
+
+    def forget(self, driver_ids):
+        """Stop tracking drivers without marking them for revival on their next ping."""
+        driver_ids = [str(driver_id) for driver_id in driver_ids]
+        if driver_ids:
+            self.client.zrem(LAST_SEEN_KEY, *driver_ids)
+
+
+class InMemoryPresence:
+    """Process-local stand-in for RedisPresence with the same interface."""
+    def __init__(self):
+        self._last_seen = {}
+        self._swept = set()
+        self._lock = threading.Lock()
+
+    def mark_seen(self, driver_id, timestamp=None):
+        driver_id = str(driver_id)
+        with self._lock:
+            self._last_seen[driver_id] = timestamp or time.time()
+            revived = driver_id in self._swept
+            self._swept.discard(driver_id)
+        return revived
+
+    def fresh(self, driver_ids, max_age=DRIVER_STALE_AFTER_SECONDS):
+        cutoff = time.time() - max_age
+        with self._lock:
+            return {
+                str(driver_id) for driver_id in driver_ids
+                if self._last_seen.get(str(driver_id), float("-inf")) >= cutoff
+            }
+
+    def stale(self, max_age=DRIVER_STALE_AFTER_SECONDS):
+        cutoff = time.time() - max_age
+        with self._lock:
+            return [driver_id for driver_id, seen in self._last_seen.items() if seen < cutoff]
+
+    def mark_swept(self, driver_ids):
+        with self._lock:
+            for driver_id in driver_ids:
+                self._last_seen.pop(str(driver_id), None)
+                self._swept.add(str(driver_id))
+
+    def forget(self, driver_ids):
+        with self._lock:
+            for driver_id in driver_ids:
+                self._last_seen.pop(str(driver_id), None)
+
+
+_presence = None
+
+
+def get_presence():
+    """Return the process-wide presence tracker, on the same backend as the location store."""
+    global _presence
+    if _presence is None:
+        if DRIVER_LOCATION_BACKEND == "memory":
+            _presence = InMemoryPresence()
+        else:
+            _presence = RedisPresence(redis.Redis.from_url(REDIS_URL))
+    return _presence
+
+
+def sweep_stale_drivers(max_age=DRIVER_STALE_AFTER_SECONDS):
+    """
+    Mark drivers that stopped pinging as unavailable and drop them from the
+    matching indexes. Returns the number of drivers swept.
+    """
+    presence = get_presence()
+    stale_ids = presence.stale(max_age)
+    if not stale_ids:
+        return 0
+    # Only drivers this sweep switches off may be revived by their next ping;
+    # busy drivers on a trip who lost signal must stay unavailable. The rows are
+    # locked between reading and updating them, so a trip accepted meanwhile
+    # waits for the sweep instead of being marked as swept.
+    with transaction.atomic():
+        swept_ids = [
+            str(driver_id) for driver_id in
+            Driver.objects.select_for_update().filter(id__in=stale_ids, is_available=True).values_list("id", flat=True)
+        ]
+        swept = Driver.objects.filter(id__in=swept_ids).update(is_available=False) if swept_ids else 0
+    for driver_id in stale_ids:
+        driver_index.remove(driver_id)
+        try:
+            get_location_store().remove(driver_id)
+        except redis.RedisError as e:
+            logger.warning(f"Could not remove stale driver {driver_id} from location store: {e}")
+    presence.mark_swept(swept_ids)
+    presence.forget(set(stale_ids) - set(swept_ids))
+    logger.info(f"Swept {swept} stale drivers")
+    return swept
+
+
+_sweeper_task = None
+
+
+async def _sweep_forever():
+    while True:
+        await asyncio.sleep(DRIVER_SWEEP_INTERVAL_SECONDS)
+        try:
+            await database_sync_to_async(sweep_stale_drivers)()
+        except Exception as e:
+            logger.error(f"Stale driver sweep failed: {e}", exc_info=True)
+
+
+def ensure_sweeper_running():
+    """Start the per-process background sweeper if it is not already running."""
+    global _sweeper_task
+    if _sweeper_task is None or _sweeper_task.done():
+        _sweeper_task = asyncio.get_running_loop().create_task(_sweep_forever())
@@ -0,0 +1,66 @@
+"""
+Vectorized fare quotes for every vehicle type at once, using the same tariff
+as Trip.calculate_fare but without needing a Trip row.
+"""
+import numpy as np
+
+from .models import Trip
+
+VEHICLE_TYPES = list(Trip.VEHICLE_BASE_FARES)
+BASE_FARES = np.array([Trip.VEHICLE_BASE_FARES[vehicle] for vehicle in VEHICLE_TYPES], dtype=np.float64)
+# Trip.calculate_fare's base fare for vehicle types missing from the tariff.
+DEFAULT_BASE_FARE = 100.0
+
+
+def base_fares(vehicle_types=None):
+    if vehicle_types is None:
+        return BASE_FARES
+    return np.array([Trip.VEHICLE_BASE_FARES.get(vehicle, DEFAULT_BASE_FARE) for vehicle in vehicle_types],
+                    dtype=np.float64)
+
+
+def fare_matrix(distances_km, minutes, surge_multipliers=1.0, vehicle_types=None):
+    """
+    Unrounded fares with one row per route and one column per vehicle type.
+
+    :param distances_km: Route distances (array-like, one per route).
+    :param minutes: Route durations in minutes, same length as distances_km.
+    :param surge_multipliers: Scalar or one multiplier per route.
+    :param vehicle_types: Columns to price; defaults to every type in the tariff.
+    """
+    distances_km = np.asarray(distances_km, dtype=np.float64).reshape(-1)
+    minutes = np.asarray(minutes, dtype=np.float64).reshape(-1)
+    surge = np.broadcast_to(np.asarray(surge_multipliers, dtype=np.float64), distances_km.shape)
+    # Same order of operations as Trip.calculate_fare, so rounding agrees to the cent.
+    fares = base_fares(vehicle_types)[None, :] + (distances_km * Trip.COST_PER_KM)[:, None]
+    fares += (minutes * Trip.COST_PER_MINUTE)[:, None]
+    return fares * surge[:, None]
+
+
+def surge_multiplier(surge):
+    """Trip.calculate_fare's surge argument (a flag or a multiplier) as a multiplier."""
+    if not surge:
+        return 1.0
+    return Trip.SURGE_MULTIPLIER if surge is True else float(surge)
+
+
+def price_sheet(routes, surge=False, vehicle_types=None):
+    """
+    {vehicle_type: fare} for every RouteResult in routes, priced in one pass.
+    Fares are rounded exactly like Trip.calculate_fare.
+    """
+    routes = list(routes)
+    vehicle_types = VEHICLE_TYPES if vehicle_types is None else list(vehicle_types)
+    fares = fare_matrix(
+        [route.distance_km for route in routes], [route.duration_minutes for route in routes],
+        surge_multiplier(surge), vehicle_types,
+    )
+    return [
+        {vehicle: round(float(fare), 2) for vehicle, fare in zip(vehicle_types, row)}
+        for row in fares
+    ]
+
+
+def quote(route, surge=False, vehicle_types=None):
+    """Price sheet for a single route."""
+    return price_sheet([route], surge, vehicle_types)[0]
@@ -0,0 +1,51 @@
+"""
+Signed fare quotes.
+
+create_trip hands the rider a token carrying the fare and the route and surge
+it was priced on. The payment step checks the token's HMAC instead of loading
+the trip; confirm-driver still loads the trip for its status and addresses but
+takes the fare and route from the token. Tokens that were altered, have expired
+or belong to another trip are rejected.
+"""
+from django.conf import settings
+from django.core import signing
+
+from .route_result import RouteResult
+
+QUOTE_TOKEN_MAX_AGE_SECONDS = getattr(settings, 'QUOTE_TOKEN_MAX_AGE_SECONDS', 900)
+QUOTE_TOKEN_SALT = "trips.quote"
+
+
+class InvalidQuoteToken(Exception):
+    """The quote token was tampered with, has expired or is for another trip."""
+
+
+def sign_quote(trip_id, fare, route, surge=1.0, vehicle_type=None):
+    """Token for a fare quoted on `route` (a RouteResult) with the given surge multiplier."""
+    return signing.dumps({
+        "trip_id": str(trip_id),
+        "fare": float(fare),
+        "distance_m": route.distance_m,
+        "duration_s": route.duration_s,
+        "estimated": route.estimated,
+        "surge": float(surge),
+        "vehicle_type": vehicle_type,
+    }, salt=QUOTE_TOKEN_SALT)
+
+
+def verify_quote(token, trip_id=None, max_age=QUOTE_TOKEN_MAX_AGE_SECONDS):
+    """The quote inside `token`, or InvalidQuoteToken. Pass trip_id to bind the quote to a trip."""
+    try:
+        quote = signing.loads(token, salt=QUOTE_TOKEN_SALT, max_age=max_age)
+    except signing.SignatureExpired:
+        raise InvalidQuoteToken("Quote has expired")
+    except signing.BadSignature:
+        raise InvalidQuoteToken("Quote token is invalid")
+    if trip_id is not None and quote["trip_id"] != str(trip_id):
+        raise InvalidQuoteToken("Quote is for another trip")
+    return quote
+
+
+def quote_route(quote):
+    """The RouteResult a verified quote was priced on."""
+    return RouteResult(quote["distance_m"], quote["duration_s"], estimated=quote["estimated"])
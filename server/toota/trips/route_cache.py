@@ -0,0 +1,134 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import redis
+from django.conf import settings
+from django.core.cache import caches
+
+from .route_result import RouteResult
+
+logger = logging.getLogger(__name__)
+
+# Coordinates are rounded to this many decimals before lookup (4 decimals is ~11 m).
+ROUTE_CACHE_PRECISION = getattr(settings, 'ROUTE_CACHE_PRECISION', 4)
+ROUTE_CACHE_TTL_SECONDS = getattr(settings, 'ROUTE_CACHE_TTL_SECONDS', 15 * 60)
+ROUTE_CACHE_MAX_ENTRIES = getattr(settings, 'ROUTE_CACHE_MAX_ENTRIES', 4096)
+# Cache alias for the shared tier, or None to keep routes in-process only.
+ROUTE_CACHE_SHARED_ALIAS = getattr(settings, 'ROUTE_CACHE_SHARED_ALIAS', 'default')
+
+
+class RouteCache:
+    """
+    Two-tier route cache: an in-process LRU with TTL in front of an optional
+    shared Django cache (Redis), keyed on rounded pickup/destination coordinates.
+    Values are RouteResults; the shared tier stores them as plain tuples.
+    """
+    def __init__(self, max_entries=ROUTE_CACHE_MAX_ENTRIES, ttl=ROUTE_CACHE_TTL_SECONDS,
+                 precision=ROUTE_CACHE_PRECISION, shared_alias=ROUTE_CACHE_SHARED_ALIAS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.precision = precision
+        self.shared_alias = shared_alias
+        self._entries = OrderedDict()  # key -> (expires_at, route)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def key(self, pickup_lat, pickup_lon, dest_lat, dest_lon):
+        return tuple(round(float(value), self.precision) for value in (pickup_lat, pickup_lon, dest_lat, dest_lon))
+
+    def _shared_key(self, key):
+        return "route:" + ",".join(f"{value:.{self.precision}f}" for value in key)
+
+    def _get_local(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+        return None
+
+    @staticmethod
+    def _from_shared(values):
+        return RouteResult.from_tuple(values) if values is not None else None
+
+    def _record_shared(self, key, route):
+        with self._lock:
+            if route is None:
+                self.misses += 1
+                return
+            self.shared_hits += 1
+        self._store_local(key, route)
+
+    def get(self, key):
+        route = self._get_local(key)
+        if route is not None:
+            return route
+        if self.shared_alias:
+            try:
+                route = self._from_shared(caches[self.shared_alias].get(self._shared_key(key)))
+            except redis.RedisError as e:
+                logger.warning(f"Shared route cache unavailable: {e}")
+        self._record_shared(key, route)
+        return route
+
+    async def aget(self, key):
+        route = self._get_local(key)
+        if route is not None:
+            return route
+        if self.shared_alias:
+            try:
+                route = self._from_shared(await caches[self.shared_alias].aget(self._shared_key(key)))
+            except redis.RedisError as e:
+                logger.warning(f"Shared route cache unavailable: {e}")
+        self._record_shared(key, route)
+        return route
+
+    def set(self, key, route):
+        self._store_local(key, route)
+        if self.shared_alias:
+            try:
+                caches[self.shared_alias].set(self._shared_key(key), route.to_tuple(), self.ttl)
+            except redis.RedisError as e:
+                logger.warning(f"Could not write shared route cache: {e}")
+
+    async def aset(self, key, route):
+        self._store_local(key, route)
+        if self.shared_alias:
+            try:
+                await caches[self.shared_alias].aset(self._shared_key(key), route.to_tuple(), self.ttl)
+            except redis.RedisError as e:
+                logger.warning(f"Could not write shared route cache: {e}")
+
+    def _store_local(self, key, route):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, route)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.shared_hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "hit_ratio": round((self.hits + self.shared_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+
+route_cache = RouteCache()
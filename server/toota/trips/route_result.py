@@ -0,0 +1,59 @@
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True, slots=True)
+class RouteResult:
+    """
+    Raw route metrics as returned by OSRM (or the offline estimator).
+    Keep these unformatted until the response is built; use as_dict() there.
+    """
+    distance_m: float
+    duration_s: float
+    estimated: bool = False
+    polyline: str = None  # encoded (precision 5) geometry, when requested from OSRM
+
+    @property
+    def distance_km(self):
+        return self.distance_m / 1000.0
+
+    @property
+    def duration_minutes(self):
+        return self.duration_s / 60.0
+
+    def format_duration(self):
+        """Human-readable duration, e.g. '45 sec', '12 min' or '1 hour 5 min 3 sec'."""
+        duration_sec = self.duration_s
+        if duration_sec < 60:
+            return f"{int(duration_sec)} sec"
+        if duration_sec < 3600:
+            return f"{int(duration_sec // 60)} min"
+        hours = int(duration_sec // 3600)
+        minutes = int((duration_sec % 3600) // 60)
+        seconds = int(duration_sec % 60)
+        duration_str = f"{hours} hour{'s' if hours > 1 else ''} {minutes} min"
+        if seconds > 0:
+            duration_str += f" {seconds} sec"
+        return duration_str
+
+    def as_dict(self):
+        """The route as sent to clients: distance rounded to 2 decimals and a formatted duration."""
+        return {"distance_km": round(self.distance_km, 2), "duration": self.format_duration()}
+
+    def to_tuple(self):
+        """Compact form for the shared cache."""
+        if self.polyline is None:
+            return (self.distance_m, self.duration_s, self.estimated)
+        return (self.distance_m, self.duration_s, self.estimated, self.polyline)
+
+    @classmethod
+    def from_tuple(cls, values):
+        return cls(*values)
+
+    @classmethod
+    def from_osrm(cls, route):
+        geometry = route.get("geometry")
+        return cls(float(route["distance"]), float(route["duration"]),
+                   polyline=geometry if isinstance(geometry, str) else None)
+
+
+NO_ROUTE = RouteResult(0.0, 0.0, estimated=True)
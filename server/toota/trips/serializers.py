@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from authentication.models import Driver
+from .models import Trip
 
 class FindDriversSerializer(serializers.ModelSerializer):
     class Meta:
@@ -8,3 +9,12 @@ class FindDriversSerializer(serializers.ModelSerializer):
 
 class CheckTripStatusSerializer(serializers.Serializer):
     trip_id = serializers.UUIDField(required=True)
+
+class FareQuoteSerializer(serializers.Serializer):
+    pickup_lat = serializers.FloatField(min_value=-90, max_value=90)
+    pickup_lon = serializers.FloatField(min_value=-180, max_value=180)
+    dest_lat = serializers.FloatField(min_value=-90, max_value=90)
+    dest_lon = serializers.FloatField(min_value=-180, max_value=180)
+    vehicle_types = serializers.ListField(
+        child=serializers.ChoiceField(choices=list(Trip.VEHICLE_BASE_FARES)), required=False, allow_empty=False
+    )
@@ -0,0 +1,14 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from authentication.models import Driver
+from .driver_cards import LOCATION_FIELDS, invalidate_driver_card, patch_driver_card_location
+
+
+@receiver(post_save, sender=Driver)
+def refresh_driver_card(sender, instance, update_fields=None, **kwargs):
+    """Location-only saves patch the cached card; any other save invalidates it."""
+    if update_fields and set(update_fields) <= LOCATION_FIELDS:
+        patch_driver_card_location(instance.id, instance.latitude, instance.longitude, instance.updated_at)
+    else:
+        invalidate_driver_card(instance.id)
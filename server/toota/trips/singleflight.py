@@ -0,0 +1,49 @@
+import asyncio
+import threading
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical async calls: the first caller for a key
+    starts the work, later callers with the same key await the same result
+    instead of starting their own. Nothing is remembered once the call finishes;
+    caching is the caller's job.
+    """
+    def __init__(self):
+        self._inflight = {}  # (loop, key) -> task
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.executions = 0
+
+    async def do(self, key, fn):
+        """Await fn() once per key across all concurrent callers and return its result."""
+        loop = asyncio.get_running_loop()
+        flight_key = (loop, key)
+        with self._lock:
+            self.calls += 1
+            task = self._inflight.get(flight_key)
+            if task is None:
+                self.executions += 1
+                task = loop.create_task(fn())
+                self._inflight[flight_key] = task
+                task.add_done_callback(lambda done: self._finished(flight_key, done))
+        # Shielded so one caller being cancelled does not cancel the shared call.
+        return await asyncio.shield(task)
+
+    def _finished(self, flight_key, task):
+        with self._lock:
+            if self._inflight.get(flight_key) is task:
+                del self._inflight[flight_key]
+        if not task.cancelled():
+            task.exception()  # Mark as retrieved even if every waiter was cancelled.
+
+    def stats(self):
+        with self._lock:
+            coalesced = self.calls - self.executions
+            return {
+                "in_flight": len(self._inflight),
+                "calls": self.calls,
+                "executions": self.executions,
+                "coalesced": coalesced,
+                "coalescing_ratio": round(coalesced / self.calls, 4) if self.calls else 0.0,
+            }
@@ -0,0 +1,175 @@
+import math
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+from .distance import bounding_box
+
+# Size of one grid cell in degrees; 0.05 deg is roughly 5.5 km of latitude.
+GRID_CELL_SIZE_DEG = getattr(settings, 'DRIVER_GRID_CELL_SIZE_DEG', 0.05)
+# How often (in seconds) each searched region of the index is re-synced from
+# the database so drivers that pinged another worker process are picked up as well.
+GRID_REFRESH_SECONDS = getattr(settings, 'DRIVER_GRID_REFRESH_SECONDS', 60)
+
+
+class DriverGridIndex:
+    """
+    Per-process spatial index of available drivers bucketed into fixed
+    lat/lon grid cells.
+
+    The index only answers "which drivers could be within X km of this point";
+    exact distances are still computed by the caller, so a coarse cell size is fine.
+
+    Cells are re-synced from the database region by region, as pickups near
+    them are searched, instead of reloading the whole fleet.
+    """
+    def __init__(self, cell_size_deg=GRID_CELL_SIZE_DEG, refresh_seconds=GRID_REFRESH_SECONDS):
+        self.cell_size = cell_size_deg
+        self.refresh_seconds = refresh_seconds
+        self._cells = defaultdict(dict)  # cell -> {driver_id: (lat, lon, vehicle_type)}
+        self._drivers = {}  # driver_id -> cell
+        self._lock = threading.Lock()
+        self._warmed_at = None
+        self._cell_warmed_at = {}  # cell -> monotonic time its region was last synced
+
+    def __len__(self):
+        return len(self._drivers)
+
+    def _cell_for(self, lat, lon):
+        return (math.floor(lat / self.cell_size), math.floor(lon / self.cell_size))
+
+    def _remove_locked(self, driver_id):
+        cell = self._drivers.pop(driver_id, None)
+        if cell is not None:
+            bucket = self._cells[cell]
+            bucket.pop(driver_id, None)
+            if not bucket:
+                del self._cells[cell]
+
+    def update(self, driver_id, lat, lon, vehicle_type=None, is_available=True):
+        """
+        Insert or move a driver. Drivers that are unavailable or have no
+        coordinates are dropped from the index.
+        """
+        driver_id = str(driver_id)
+        with self._lock:
+            self._remove_locked(driver_id)
+            if not is_available or lat is None or lon is None:
+                return
+            lat, lon = float(lat), float(lon)
+            cell = self._cell_for(lat, lon)
+            self._cells[cell][driver_id] = (lat, lon, vehicle_type)
+            self._drivers[driver_id] = cell
+
+    def remove(self, driver_id):
+        with self._lock:
+            self._remove_locked(str(driver_id))
+
+    def clear(self):
+        with self._lock:
+            self._cells.clear()
+            self._drivers.clear()
+            self._warmed_at = None
+            self._cell_warmed_at.clear()
+
+    def needs_refresh(self):
+        return self._warmed_at is None or time.monotonic() - self._warmed_at > self.refresh_seconds
+
+    def warm(self, rows):
+        """
+        Rebuild the index from an iterable of (driver_id, lat, lon, vehicle_type) rows.
+        """
+        cells = defaultdict(dict)
+        drivers = {}
+        for driver_id, lat, lon, vehicle_type in rows:
+            if lat is None or lon is None:
+                continue
+            driver_id = str(driver_id)
+            cell = self._cell_for(float(lat), float(lon))
+            cells[cell][driver_id] = (float(lat), float(lon), vehicle_type)
+            drivers[driver_id] = cell
+        with self._lock:
+            self._cells = cells
+            self._drivers = drivers
+            self._warmed_at = time.monotonic()
+            self._cell_warmed_at = {}
+
+    def _region_cells(self, lat, lon, radius_km):
+        min_lat, max_lat, min_lon, max_lon = bounding_box(lat, lon, radius_km)
+        min_row, min_col = self._cell_for(min_lat, min_lon)
+        max_row, max_col = self._cell_for(max_lat, max_lon)
+        return min_row, max_row, min_col, max_col
+
+    def region_bounds(self, lat, lon, radius_km):
+        """(min_lat, max_lat, min_lon, max_lon) of the cells covering radius_km around (lat, lon)."""
+        min_row, max_row, min_col, max_col = self._region_cells(lat, lon, radius_km)
+        return (min_row * self.cell_size, (max_row + 1) * self.cell_size,
+                min_col * self.cell_size, (max_col + 1) * self.cell_size)
+
+    def region_needs_refresh(self, lat, lon, radius_km):
+        """True if any cell within radius_km of (lat, lon) was not synced in the last refresh_seconds."""
+        if not self.needs_refresh():
+            return False
+        cutoff = time.monotonic() - self.refresh_seconds
+        min_row, max_row, min_col, max_col = self._region_cells(lat, lon, radius_km)
+        with self._lock:
+            return any(
+                self._cell_warmed_at.get((row, col), float("-inf")) < cutoff
+                for row in range(min_row, max_row + 1) for col in range(min_col, max_col + 1)
+            )
+
+    def warm_region(self, lat, lon, radius_km, rows):
+        """
+        Replace the cells covering radius_km around (lat, lon) with the
+        (driver_id, lat, lon, vehicle_type) rows inside region_bounds().
+        """
+        min_row, max_row, min_col, max_col = self._region_cells(lat, lon, radius_km)
+
+        def in_region(cell):
+            return min_row <= cell[0] <= max_row and min_col <= cell[1] <= max_col
+
+        rows = list(rows)
+        now = time.monotonic()
+        with self._lock:
+            for driver_id in [driver_id for driver_id, cell in self._drivers.items() if in_region(cell)]:
+                self._remove_locked(driver_id)
+            for driver_id, d_lat, d_lon, vehicle_type in rows:
+                if d_lat is None or d_lon is None:
+                    continue
+                driver_id = str(driver_id)
+                cell = self._cell_for(float(d_lat), float(d_lon))
+                if not in_region(cell):
+                    continue
+                self._remove_locked(driver_id)
+                self._cells[cell][driver_id] = (float(d_lat), float(d_lon), vehicle_type)
+                self._drivers[driver_id] = cell
+            for row in range(min_row, max_row + 1):
+                for col in range(min_col, max_col + 1):
+                    self._cell_warmed_at[(row, col)] = now
+
+    def nearby(self, lat, lon, radius_km, vehicle_types=None):
+        """
+        Return (driver_id, lat, lon) for every indexed driver in the cells that
+        overlap the bounding box of radius_km around (lat, lon).
+        """
+        min_lat, max_lat, min_lon, max_lon = bounding_box(lat, lon, radius_km)
+        min_row, min_col = self._cell_for(min_lat, min_lon)
+        max_row, max_col = self._cell_for(max_lat, max_lon)
+        vehicle_types = set(vehicle_types) if vehicle_types else None
+
+        results = []
+        with self._lock:
+            for row in range(min_row, max_row + 1):
+                for col in range(min_col, max_col + 1):
+                    bucket = self._cells.get((row, col))
+                    if not bucket:
+                        continue
+                    for driver_id, (d_lat, d_lon, d_vehicle) in bucket.items():
+                        if vehicle_types is None or d_vehicle in vehicle_types:
+                            results.append((driver_id, d_lat, d_lon))
+        return results
+
+
+driver_index = DriverGridIndex()
@@ -0,0 +1,225 @@
+"""
+Supply/demand surge per grid cell.
+
+Trip requests and available-driver pings are counted per cell in fixed-size
+time buckets (a ring of SURGE_WINDOW_SECONDS / SURGE_BUCKET_SECONDS slots), so
+recording an event is O(1). A fare reads the pickup cell's demand against the
+supply of the pickup cell and its eight neighbours (a driver just across a
+cell border is still close), instead of running aggregate queries over Trip
+and Driver.
+"""
+import logging
+import math
+import threading
+import time
+
+import redis
+from django.conf import settings
+
+from .holidays import country_for_point, is_peak_hour_or_festive
+from .location_store import DRIVER_LOCATION_BACKEND, REDIS_URL
+from .models import Trip
+
+logger = logging.getLogger(__name__)
+
+# 0.02 deg is roughly 2 km: about the distance a driver will come for a pickup.
+SURGE_CELL_SIZE_DEG = getattr(settings, 'SURGE_CELL_SIZE_DEG', 0.02)
+SURGE_WINDOW_SECONDS = getattr(settings, 'SURGE_WINDOW_SECONDS', 300)
+SURGE_BUCKET_SECONDS = getattr(settings, 'SURGE_BUCKET_SECONDS', 30)
+SURGE_MAX_MULTIPLIER = getattr(settings, 'SURGE_MAX_MULTIPLIER', 2.5)
+# Multiplier added per request-per-driver above 1 (2 requests per driver -> 1.5x).
+SURGE_SENSITIVITY = getattr(settings, 'SURGE_SENSITIVITY', 0.5)
+# Fewer requests than this in the window never surge, however few drivers are near.
+SURGE_MIN_DEMAND = getattr(settings, 'SURGE_MIN_DEMAND', 3)
+# Multipliers are rounded down to this step so prices do not jitter on every ping.
+SURGE_STEP = 0.1
+
+DEMAND = "demand"
+SUPPLY = "supply"
+KEY_PREFIX = "surge"
+
+
+def cell_for(lat, lon, cell_size=SURGE_CELL_SIZE_DEG):
+    return f"{math.floor(float(lat) / cell_size)}:{math.floor(float(lon) / cell_size)}"
+
+
+def neighbourhood(cell):
+    """The cell and the eight cells around it."""
+    row, col = (int(part) for part in cell.split(":"))
+    return [f"{row + d_row}:{col + d_col}" for d_row in (-1, 0, 1) for d_col in (-1, 0, 1)]
+
+
+def multiplier_for(demand, supply, sensitivity=SURGE_SENSITIVITY, max_multiplier=SURGE_MAX_MULTIPLIER,
+                   min_demand=SURGE_MIN_DEMAND):
+    """
+    Multiplier for `demand` requests against `supply` available drivers.
+    No drivers counts as one, so a handful of requests in an empty area
+    raises the price gradually instead of jumping to the cap.
+    """
+    if demand < max(min_demand, 1):
+        return 1.0
+    multiplier = 1.0 + sensitivity * (demand / max(supply, 1) - 1.0)
+    multiplier = math.floor(round(multiplier / SURGE_STEP, 6)) * SURGE_STEP
+    return round(min(max(multiplier, 1.0), max_multiplier), 2)
+
+
+class InMemorySurgeCounters:
+    """Process-local bucket counters; used by the tests and single-process servers."""
+    def __init__(self, slots):
+        self.slots = slots
+        self._rings = {}  # (kind, cell) -> [[epoch, count], ...]
+        self._seen = {}  # driver_id -> (cell, epoch) last counted
+        self._lock = threading.Lock()
+
+    def _incr_locked(self, kind, cell, epoch):
+        ring = self._rings.setdefault((kind, cell), [[None, 0] for _ in range(self.slots)])
+        slot = ring[epoch % self.slots]
+        if slot[0] != epoch:
+            slot[0], slot[1] = epoch, 0
+        slot[1] += 1
+
+    def incr(self, kind, cell, epoch):
+        with self._lock:
+            self._incr_locked(kind, cell, epoch)
+
+    def incr_once(self, kind, cell, epoch, member):
+        """Count `member` at most once per cell and bucket."""
+        with self._lock:
+            if self._seen.get(member) != (cell, epoch):
+                self._seen[member] = (cell, epoch)
+                self._incr_locked(kind, cell, epoch)
+
+    def counts(self, kind, cell, epochs):
+        with self._lock:
+            ring = self._rings.get((kind, cell))
+            if ring is None:
+                return [0] * len(epochs)
+            return [ring[epoch % self.slots][1] if ring[epoch % self.slots][0] == epoch else 0 for epoch in epochs]
+
+    def counts_many(self, kind, cells, epochs):
+        return [self.counts(kind, cell, epochs) for cell in cells]
+
+
+class RedisSurgeCounters:
+    """
+    Bucket counters shared by every worker: one hash per (kind, cell) keyed by
+    bucket epoch, trimmed as it is written and expired once the cell goes quiet.
+    """
+    def __init__(self, client, slots, bucket_seconds):
+        self.client = client
+        self.slots = slots
+        self.ttl = (slots + 1) * bucket_seconds
+
+    def _key(self, kind, cell):
+        return f"{KEY_PREFIX}:{kind}:{cell}"
+
+    def incr(self, kind, cell, epoch):
+        key = self._key(kind, cell)
+        pipe = self.client.pipeline()
+        pipe.hincrby(key, epoch, 1)
+        pipe.hdel(key, epoch - self.slots)
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+
+    def incr_once(self, kind, cell, epoch, member):
+        previous = self.client.set(f"{KEY_PREFIX}:seen:{member}", f"{cell}/{epoch}", ex=self.ttl, get=True)
+        if isinstance(previous, bytes):
+            previous = previous.decode()
+        if previous != f"{cell}/{epoch}":
+            self.incr(kind, cell, epoch)
+
+    def counts(self, kind, cell, epochs):
+        return [int(count or 0) for count in self.client.hmget(self._key(kind, cell), epochs)]
+
+    def counts_many(self, kind, cells, epochs):
+        pipe = self.client.pipeline()
+        for cell in cells:
+            pipe.hmget(self._key(kind, cell), epochs)
+        return [[int(count or 0) for count in counts] for counts in pipe.execute()]
+
+
+class SurgeEngine:
+    """
+    Demand is the number of trip requests at the pickup cell in the window;
+    supply is the number of distinct available drivers seen around it in the
+    most recent bucket (or the one before it, so a bucket boundary does not
+    empty the area).
+    """
+    def __init__(self, counters, window_seconds=SURGE_WINDOW_SECONDS, bucket_seconds=SURGE_BUCKET_SECONDS,
+                 cell_size_deg=SURGE_CELL_SIZE_DEG, sensitivity=SURGE_SENSITIVITY,
+                 max_multiplier=SURGE_MAX_MULTIPLIER, min_demand=SURGE_MIN_DEMAND):
+        self.counters = counters
+        self.slots = max(int(window_seconds // bucket_seconds), 1)
+        self.bucket_seconds = bucket_seconds
+        self.cell_size = cell_size_deg
+        self.sensitivity = sensitivity
+        self.max_multiplier = max_multiplier
+        self.min_demand = min_demand
+
+    def _epoch(self, now=None):
+        return int((now if now is not None else time.time()) // self.bucket_seconds)
+
+    def record_request(self, lat, lon, now=None):
+        """Count a trip request at the pickup point."""
+        if lat is None or lon is None:
+            return
+        cell = cell_for(lat, lon, self.cell_size)
+        try:
+            self.counters.incr(DEMAND, cell, self._epoch(now))
+        except redis.RedisError as e:
+            logger.warning(f"Could not record surge demand for cell {cell}: {e}")
+
+    def record_driver(self, driver_id, lat, lon, now=None):
+        """Count an available driver's ping, once per bucket."""
+        if lat is None or lon is None:
+            return
+        cell = cell_for(lat, lon, self.cell_size)
+        try:
+            self.counters.incr_once(SUPPLY, cell, self._epoch(now), str(driver_id))
+        except redis.RedisError as e:
+            logger.warning(f"Could not record surge supply for cell {cell}: {e}")
+
+    def cell_counts(self, cell, epoch):
+        """(demand at the cell, supply in the cell and its neighbours) for the bucket `epoch`."""
+        demand = sum(self.counters.counts(DEMAND, cell, list(range(epoch - self.slots + 1, epoch + 1))))
+        supply = max(
+            sum(counts) for counts in zip(*self.counters.counts_many(SUPPLY, neighbourhood(cell), [epoch - 1, epoch]))
+        )
+        return demand, supply
+
+    def multiplier(self, lat, lon, now=None):
+        """Multiplier for a pickup at (lat, lon); 1.0 if the area is quiet or the counters are unreachable."""
+        if lat is None or lon is None:
+            return 1.0
+        cell = cell_for(lat, lon, self.cell_size)
+        try:
+            demand, supply = self.cell_counts(cell, self._epoch(now))
+        except redis.RedisError as e:
+            logger.warning(f"Could not read surge counts for cell {cell}: {e}")
+            return 1.0
+        return multiplier_for(demand, supply, self.sensitivity, self.max_multiplier, self.min_demand)
+
+
+_surge_engine = None
+
+
+def get_surge_engine():
+    """Return the process-wide surge engine, on the same backend as the location store."""
+    global _surge_engine
+    if _surge_engine is None:
+        slots = max(int(SURGE_WINDOW_SECONDS // SURGE_BUCKET_SECONDS), 1)
+        if DRIVER_LOCATION_BACKEND == "memory":
+            counters = InMemorySurgeCounters(slots)
+        else:
+            counters = RedisSurgeCounters(redis.Redis.from_url(REDIS_URL), slots, SURGE_BUCKET_SECONDS)
+        _surge_engine = SurgeEngine(counters)
+    return _surge_engine
+
+
+def current_multiplier(lat, lon, dt=None):
+    """
+    Fare multiplier for a pickup at (lat, lon): the cell's supply/demand surge,
+    but never below the flat peak-hour/holiday multiplier.
+    """
+    peak = Trip.SURGE_MULTIPLIER if is_peak_hour_or_festive(dt, country_for_point(lat, lon)) else 1.0
+    return max(peak, get_surge_engine().multiplier(lat, lon))
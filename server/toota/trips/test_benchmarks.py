@@ -0,0 +1,20 @@
+import numpy as np
+import pytest
+from trips.benchmarks import CITY_CENTRES, summarize, synthetic_points
+
+
+def test_summarize_reports_percentiles_and_queries():
+    summary = summarize(list(range(1, 101)), [2, 4])
+    assert summary["calls"] == 100
+    assert summary["p50_ms"] == pytest.approx(50.5)
+    assert summary["p95_ms"] == pytest.approx(95.05)
+    assert summary["p99_ms"] == pytest.approx(99.01)
+    assert summary["queries_per_call"] == 3.0
+
+
+def test_synthetic_points_cluster_around_city_centres():
+    points = synthetic_points(1000, np.random.default_rng(0), spread=0.01)
+    centres = np.array(list(CITY_CENTRES.values()))
+    nearest_centre = np.abs(points[:, None, :] - centres[None, :, :]).max(axis=2).min(axis=1)
+    assert points.shape == (1000, 2)
+    assert (nearest_centre < 0.1).all()
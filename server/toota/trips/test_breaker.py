@@ -0,0 +1,148 @@
+import asyncio
+import time
+from functools import partial
+from unittest.mock import patch
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from trips.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from trips.osrm import AsyncRoutingClient
+
+ROUTE = {"code": "Ok", "routes": [{"distance": 12340.0, "duration": 1290.0}]}
+
+
+def test_breaker_opens_after_failures_and_probes_once():
+    breaker = CircuitBreaker(failure_threshold=3, open_seconds=10, slow_call_seconds=1.0)
+    breaker.record_failure()
+    breaker.record_success(0.1)  # resets the streak
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_success(5.0)  # too slow counts as a failure
+    assert breaker.state == OPEN and not breaker.allow()
+
+    later = time.monotonic() + 11
+    with patch("trips.breaker.time.monotonic", return_value=later):
+        assert breaker.state == HALF_OPEN
+        assert breaker.allow()
+        assert not breaker.allow()  # only one probe at a time
+        breaker.abandon()
+        assert breaker.allow()
+        breaker.record_failure()
+        assert breaker.state == OPEN
+
+    with patch("trips.breaker.time.monotonic", return_value=later + 11):
+        assert breaker.allow()
+        breaker.record_success(0.1)
+        assert breaker.state == CLOSED
+
+
+class FakeOsrm:
+    """Local OSRM stand-in whose latency and health can be changed mid-test."""
+    def __init__(self, delay=0.0, status=200):
+        self.delay = delay
+        self.status = status
+        self.calls = 0
+
+    async def route(self, request):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.status >= 500:
+            return web.json_response({"code": "Error"}, status=self.status)
+        return web.json_response(ROUTE)
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/route/v1/driving/{coordinates}", self.route)
+        self.server = TestServer(app)
+        await self.server.start_server()
+        return str(self.server.make_url(""))
+
+
+route_args = (-26.2041, 28.0473, -25.7479, 28.2293)
+
+
+@pytest.mark.asyncio
+async def test_open_breaker_fails_fast_without_calling_upstream():
+    osrm = FakeOsrm(status=503)
+    client = AsyncRoutingClient(
+        base_url=await osrm.start(), breaker_factory=partial(CircuitBreaker, failure_threshold=2, open_seconds=60),
+    )
+    try:
+        for _ in range(5):
+            assert await client.route(*route_args) is None
+        assert osrm.calls == 2
+        assert client.stats()["primary"]["breaker"] == OPEN
+    finally:
+        await client.close()
+        await osrm.server.close()
+
+
+@pytest.mark.asyncio
+async def test_half_open_probe_closes_breaker_after_recovery():
+    osrm = FakeOsrm(status=503)
+    client = AsyncRoutingClient(
+        base_url=await osrm.start(), breaker_factory=partial(CircuitBreaker, failure_threshold=1, open_seconds=0.05),
+    )
+    try:
+        assert await client.route(*route_args) is None
+        osrm.status = 200
+        assert await client.route(*route_args) is None  # still open
+        await asyncio.sleep(0.06)
+        assert await client.route(*route_args) == ROUTE["routes"][0]
+        assert client.stats()["primary"]["breaker"] == CLOSED
+        assert osrm.calls == 2
+    finally:
+        await client.close()
+        await osrm.server.close()
+
+
+@pytest.mark.asyncio
+async def test_slow_primary_is_hedged_to_secondary():
+    primary, secondary = FakeOsrm(delay=1.0), FakeOsrm()
+    client = AsyncRoutingClient(
+        base_url=await primary.start(), secondary_url=await secondary.start(), hedge_max_delay=0.05,
+    )
+    try:
+        started = time.monotonic()
+        assert await client.route(*route_args) == ROUTE["routes"][0]
+        assert time.monotonic() - started < 0.5
+        assert client.stats()["hedges"] == 1 and client.stats()["hedge_wins"] == 1
+    finally:
+        await client.close()
+        await primary.server.close()
+        await secondary.server.close()
+
+
+@pytest.mark.asyncio
+async def test_failed_or_open_primary_goes_to_secondary():
+    primary, secondary = FakeOsrm(status=500), FakeOsrm()
+    client = AsyncRoutingClient(
+        base_url=await primary.start(), secondary_url=await secondary.start(), hedge_max_delay=1.0,
+        breaker_factory=partial(CircuitBreaker, failure_threshold=1, open_seconds=60),
+    )
+    try:
+        started = time.monotonic()
+        assert await client.route(*route_args) == ROUTE["routes"][0]  # hedged as soon as the primary failed
+        assert time.monotonic() - started < 0.5
+        assert await client.route(*route_args) == ROUTE["routes"][0]  # primary open: secondary only
+        assert (primary.calls, secondary.calls) == (1, 2)
+    finally:
+        await client.close()
+        await primary.server.close()
+        await secondary.server.close()
+
+
+@pytest.mark.asyncio
+async def test_local_queueing_is_not_counted_as_upstream_latency():
+    osrm = FakeOsrm(delay=0.1)
+    client = AsyncRoutingClient(base_url=await osrm.start(), max_concurrency=1)
+    try:
+        await asyncio.gather(*(client.route(*route_args) for _ in range(3)))
+        latencies = list(client.primary.latencies)
+        assert len(latencies) == 3
+        assert max(latencies) < 0.18  # the last call waited ~0.2 s for the semaphore
+    finally:
+        await client.close()
+        await osrm.server.close()
@@ -0,0 +1,112 @@
+import asyncio
+import itertools
+
+import numpy as np
+import pytest
+from trips.dispatch import (
+    DispatchBatcher, DispatchRequest, InMemoryOfferHolds, RedisOfferHolds, min_cost_assignment,
+    rating_weighted_cost, solve_batch,
+)
+
+
+@pytest.fixture(params=["memory", "redis"])
+def holds(request):
+    if request.param == "memory":
+        return InMemoryOfferHolds()
+    fakeredis = pytest.importorskip("fakeredis")
+    return RedisOfferHolds(fakeredis.FakeRedis())
+
+
+def brute_force_cost(cost):
+    n, m = cost.shape
+    if n <= m:
+        return min(sum(cost[i, cols[i]] for i in range(n)) for cols in itertools.permutations(range(m), n))
+    return brute_force_cost(cost.T)
+
+
+@pytest.mark.parametrize("shape", [(3, 3), (3, 5), (5, 3), (1, 4), (6, 6)])
+def test_min_cost_assignment_is_optimal(shape):
+    rng = np.random.default_rng(sum(shape))
+    for _ in range(10):
+        cost = rng.uniform(0, 20, shape)
+        pairs = min_cost_assignment(cost)
+        assert len(pairs) == min(shape)
+        assert len({row for row, _ in pairs}) == len({col for _, col in pairs}) == len(pairs)
+        assert sum(cost[row, col] for row, col in pairs) == pytest.approx(brute_force_cost(cost))
+
+
+def test_min_cost_assignment_never_uses_forbidden_pairs():
+    cost = np.array([
+        [1.0, np.inf],
+        [2.0, np.inf],
+    ])
+    assert min_cost_assignment(cost) == [(0, 0)]
+    assert min_cost_assignment(np.full((2, 2), np.inf)) == []
+
+
+def candidate(driver_id, distance, rating="5.00"):
+    return {"driver": {"id": driver_id, "rating": rating}, "distance": distance}
+
+
+def test_solve_batch_gives_conflicting_riders_different_drivers():
+    # Both riders are closest to "a"; greedy matching would offer it twice.
+    requests = [
+        DispatchRequest("trip-1", [candidate("a", 1.0), candidate("b", 2.0)]),
+        DispatchRequest("trip-2", [candidate("a", 1.5), candidate("b", 9.0)]),
+    ]
+    offers = solve_batch(requests)
+    assert offers["trip-1"]["driver"]["id"] == "b"
+    assert offers["trip-2"]["driver"]["id"] == "a"
+
+
+def test_solve_batch_respects_exclusions_and_missing_candidates():
+    requests = [
+        DispatchRequest("trip-1", [candidate("a", 1.0)]),
+        DispatchRequest("trip-2", [{"driver": {"id": "b"}, "distance": None}]),
+    ]
+    assert solve_batch(requests, excluded_driver_ids={"a"}) == {"trip-1": None, "trip-2": None}
+
+
+def test_rating_weighted_cost_prefers_better_rated_driver():
+    requests = [DispatchRequest("trip-1", [candidate("near", 1.0, "3.00"), candidate("rated", 2.0, "5.00")])]
+    offers = solve_batch(requests, cost_fn=rating_weighted_cost(km_per_star=1.0))
+    assert offers["trip-1"]["driver"]["id"] == "rated"
+
+
+@pytest.mark.asyncio
+async def test_batcher_solves_concurrent_requests_together(holds):
+    batcher = DispatchBatcher(window=0.01, holds=holds)
+    first, second = await asyncio.gather(
+        batcher.submit("trip-1", [candidate("a", 1.0), candidate("b", 2.0)]),
+        batcher.submit("trip-2", [candidate("a", 1.5), candidate("b", 9.0)]),
+    )
+    assert {first["driver"]["id"], second["driver"]["id"]} == {"a", "b"}
+
+    # Both drivers are held for their riders until released.
+    assert await batcher.submit("trip-3", [candidate("a", 0.5)]) is None
+    batcher.release_trip("trip-2")
+    offer = await batcher.submit("trip-3", [candidate("a", 0.5)])
+    assert offer["driver"]["id"] == "a"
+
+
+@pytest.mark.asyncio
+async def test_workers_sharing_holds_never_offer_the_same_driver():
+    fakeredis = pytest.importorskip("fakeredis")
+    client = fakeredis.FakeRedis()
+    first = DispatchBatcher(window=0.01, holds=RedisOfferHolds(client))
+    second = DispatchBatcher(window=0.01, holds=RedisOfferHolds(client))
+
+    assert (await first.submit("trip-1", [candidate("a", 1.0)]))["driver"]["id"] == "a"
+    assert await second.submit("trip-2", [candidate("a", 0.5)]) is None
+    first.release_trip("trip-1")
+    assert (await second.submit("trip-2", [candidate("a", 0.5)]))["driver"]["id"] == "a"
+
+
+def test_lost_claim_withdraws_the_offer():
+    holds = InMemoryOfferHolds()
+    batcher = DispatchBatcher(holds=holds)
+    # Held by another worker after this batch read the holds.
+    holds.held = lambda: set()
+    holds.claim("trip-0", "a", 30)
+    offers = batcher.assign([DispatchRequest("trip-1", [candidate("a", 1.0)])])
+    assert offers == {"trip-1": None}
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+from geopy.distance import geodesic
+from trips.distance import CandidateCoordinates, bounding_box, haversine_km, top_k
+
+SANDTON = (-26.1076, 28.0567)
+ROSEBANK = (-26.1457, 28.0416)
+PRETORIA = (-25.7479, 28.2293)
+
+
+def test_haversine_matches_geodesic_closely():
+    distances = haversine_km(*SANDTON, [ROSEBANK[0], PRETORIA[0]], [ROSEBANK[1], PRETORIA[1]])
+    for distance, point in zip(distances, [ROSEBANK, PRETORIA]):
+        assert distance == pytest.approx(geodesic(SANDTON, point).km, rel=0.005)
+
+
+def test_top_k_returns_smallest_in_order():
+    distances = np.array([7.0, 1.0, 5.0, 3.0, 9.0])
+    assert list(top_k(distances, 3)) == [1, 3, 2]
+    assert list(top_k(distances, None)) == [1, 3, 2, 0, 4]
+    assert list(top_k(distances, 0)) == []
+
+
+def test_nearest_applies_limit_and_radius():
+    candidates = CandidateCoordinates.from_rows([
+        ("pretoria", *PRETORIA),
+        ("rosebank", *ROSEBANK),
+        ("sandton", *SANDTON),
+        ("no-gps", None, None),
+    ])
+    assert len(candidates) == 3
+
+    ranked = candidates.nearest(*SANDTON, limit=2)
+    assert [driver_id for driver_id, _ in ranked] == ["sandton", "rosebank"]
+    assert ranked[0][1] == pytest.approx(0.0)
+
+    within_10km = candidates.nearest(*SANDTON, max_distance_km=10)
+    assert [driver_id for driver_id, _ in within_10km] == ["sandton", "rosebank"]
+
+
+def test_nearest_on_empty_candidates():
+    assert CandidateCoordinates.from_rows([]).nearest(*SANDTON, limit=5) == []
+
+
+def test_ranks_large_fleet_in_one_pass():
+    rng = np.random.default_rng(0)
+    n = 100_000
+    candidates = CandidateCoordinates(
+        range(n), SANDTON[0] + rng.uniform(-1, 1, n), SANDTON[1] + rng.uniform(-1, 1, n)
+    )
+    ranked = candidates.nearest(*SANDTON, limit=20)
+    distances = [distance for _, distance in ranked]
+    assert len(ranked) == 20
+    assert distances == pytest.approx(np.sort(candidates.distances_from(*SANDTON))[:20])
+
+
+def test_bounding_box_contains_radius():
+    min_lat, max_lat, min_lon, max_lon = bounding_box(*SANDTON, radius_km=50)
+    rng = np.random.default_rng(1)
+    lats = SANDTON[0] + rng.uniform(-1, 1, 50_000)
+    lons = SANDTON[1] + rng.uniform(-1, 1, 50_000)
+    within = haversine_km(*SANDTON, lats, lons) <= 50
+
+    assert within.any() and not within.all()
+    assert ((lats[within] >= min_lat) & (lats[within] <= max_lat)).all()
+    assert ((lons[within] >= min_lon) & (lons[within] <= max_lon)).all()
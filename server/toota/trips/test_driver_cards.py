@@ -0,0 +1,91 @@
+import datetime
+import uuid
+from unittest.mock import patch
+
+import pytest
+from django.contrib.auth.models import Group, Permission
+from django.test import override_settings
+from authentication.models import Driver
+from trips.driver_cards import card_key, get_driver_cards, patch_driver_card_locations
+from trips.signals import refresh_driver_card
+
+LOCMEM = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+@pytest.fixture(autouse=True)
+def locmem_cache():
+    with override_settings(CACHES=LOCMEM):
+        from django.core.cache import cache
+        cache.clear()
+        yield cache
+
+
+def make_driver(**fields):
+    return Driver(id=uuid.uuid4(), email="driver@example.com", vehicle_type="Bakkie",
+                  latitude=-26.1, longitude=28.05, **fields)
+
+
+def test_missing_cards_are_built_once_and_cached(locmem_cache):
+    driver = make_driver(first_name="Thabo")
+    # What prefetch_related("groups", "user_permissions") leaves on the instance.
+    driver._prefetched_objects_cache = {"groups": Group.objects.none(), "user_permissions": Permission.objects.none()}
+    with patch("trips.driver_cards.Driver.objects.filter") as query:
+        query.return_value.prefetch_related.return_value = [driver]
+        first = get_driver_cards([driver.id])
+        second = get_driver_cards([driver.id])
+
+    assert query.call_count == 1
+    card = first[str(driver.id)]
+    assert card == second[str(driver.id)]
+    assert card["first_name"] == "Thabo"
+    assert "password" not in card
+    assert {"is_available", "current_location", "updated_at"} <= set(card)  # same payload as before caching
+    assert locmem_cache.get(card_key(driver.id)) == card
+
+
+def test_location_save_updates_the_served_card_without_rewriting_it(locmem_cache):
+    driver = make_driver()
+    stored = {"id": str(driver.id), "latitude": 0.0, "longitude": 0.0, "updated_at": "2024-03-05T09:00:00Z"}
+    locmem_cache.set(card_key(driver.id), stored)
+
+    driver.latitude, driver.longitude = -26.2, 28.1
+    driver.updated_at = datetime.datetime(2024, 3, 5, 10, 0, tzinfo=datetime.timezone.utc)
+    refresh_driver_card(Driver, driver, update_fields=frozenset(["latitude", "longitude", "updated_at"]))
+
+    assert locmem_cache.get(card_key(driver.id)) == stored
+    assert get_driver_cards([driver.id])[str(driver.id)] == {
+        "id": str(driver.id), "latitude": -26.2, "longitude": 28.1, "updated_at": "2024-03-05T10:00:00Z",
+    }
+
+
+def test_batched_location_patch_never_resurrects_an_invalidated_card(locmem_cache):
+    cached, uncached = make_driver(), make_driver()
+    locmem_cache.set(card_key(cached.id), {"id": str(cached.id), "latitude": 0.0, "longitude": 0.0})
+
+    seen_at = datetime.datetime(2024, 3, 5, 10, 0, tzinfo=datetime.timezone.utc)
+    # A profile save invalidates the card while the position flush is running.
+    refresh_driver_card(Driver, cached, update_fields=None)
+    patch_driver_card_locations({str(cached.id): (-26.2, 28.1, seen_at), str(uncached.id): (-25.7, 28.2, seen_at)})
+
+    assert locmem_cache.get(card_key(cached.id)) is None
+    assert locmem_cache.get(card_key(uncached.id)) is None
+
+
+def test_card_built_after_the_cached_position_keeps_its_own_location(locmem_cache):
+    driver = make_driver()
+    locmem_cache.set(card_key(driver.id), {"id": str(driver.id), "latitude": -26.3, "longitude": 28.3,
+                                           "updated_at": "2024-03-05T11:00:00Z"})
+    patch_driver_card_locations({str(driver.id): (-26.2, 28.1, datetime.datetime(2024, 3, 5, 10, 0,
+                                                                                  tzinfo=datetime.timezone.utc))})
+
+    card = get_driver_cards([driver.id])[str(driver.id)]
+    assert (card["latitude"], card["longitude"]) == (-26.3, 28.3)
+
+
+def test_profile_save_invalidates_card(locmem_cache):
+    driver = make_driver()
+    locmem_cache.set(card_key(driver.id), {"id": str(driver.id)})
+
+    refresh_driver_card(Driver, driver, update_fields=None)
+
+    assert locmem_cache.get(card_key(driver.id)) is None
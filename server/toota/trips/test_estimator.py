@@ -0,0 +1,108 @@
+import datetime
+from unittest.mock import patch
+
+import pytest
+from django.test import override_settings
+from trips.dispatch import eta_cost
+from trips.estimator import (DEFAULT_DETOUR_FACTOR, MIN_FIT_SAMPLES, RouteEstimator, fit_profile,
+                             publish_profile, region_for, straight_line_km, time_band)
+
+LOCMEM = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+SAST = datetime.timezone(datetime.timedelta(hours=2))
+
+
+def test_time_band_uses_local_time():
+    assert time_band(datetime.datetime(2024, 3, 5, 5, 30, tzinfo=datetime.timezone.utc)) == "peak"  # 07:30 SAST
+    assert time_band(datetime.datetime(2024, 3, 5, 12, 0, tzinfo=SAST)) == "day"
+    assert time_band(datetime.datetime(2024, 3, 5, 23, 0, tzinfo=SAST)) == "night"
+
+
+def test_estimate_applies_detour_and_vehicle_speed():
+    estimator = RouteEstimator(cache_alias=None)
+    noon = datetime.datetime(2024, 3, 5, 12, 0, tzinfo=SAST)
+    straight_km = straight_line_km(-26.2041, 28.0473, -25.7479, 28.2293)
+
+    distance_m, truck_sec = estimator.estimate(-26.2041, 28.0473, -25.7479, 28.2293, "8 ton Truck", noon)
+    _, bike_sec = estimator.estimate(-26.2041, 28.0473, -25.7479, 28.2293, "Motorbike", noon)
+
+    assert distance_m == pytest.approx(straight_km * DEFAULT_DETOUR_FACTOR * 1000)
+    assert truck_sec == pytest.approx(distance_m / 1000 / 22.0 * 3600)
+    assert bike_sec < truck_sec
+
+
+def test_observe_moves_detour_towards_osrm_distance():
+    estimator = RouteEstimator(cache_alias=None)
+    straight_km = straight_line_km(-26.2041, 28.0473, -26.1041, 28.0473)
+    for _ in range(200):
+        estimator.observe(-26.2041, 28.0473, -26.1041, 28.0473, straight_km * 1.6 * 1000)
+    estimator.observe(-26.2041, 28.0473, -26.1041, 28.0473, straight_km * 10 * 1000)  # implausible, ignored
+
+    assert estimator.detour_factor(-26.2, 28.05) == pytest.approx(1.6, abs=0.01)
+    assert estimator.detour_factor(6.5, 3.4) == DEFAULT_DETOUR_FACTOR
+
+
+def test_fit_profile_uses_median_speed_per_group():
+    start = datetime.datetime(2024, 3, 5, 12, 0, tzinfo=SAST)
+    route_km = 15.0
+    trips = [
+        (-26.2041, 28.0473, -26.1041, 28.0473, "Bakkie", start, route_km, route_km / 20.0 * 3600, False)
+        for _ in range(MIN_FIT_SAMPLES)
+    ]
+    trips.append((-26.2041, 28.0473, -26.1041, 28.0473, "Bakkie", start, route_km, 1.0, False))
+    trips += [(-26.2041, 28.0473, -26.1041, 28.0473, "Motorbike", start, route_km, 1800.0, False)] * 3
+
+    profile = fit_profile(trips)
+
+    assert profile["speeds"] == {"Bakkie|day": pytest.approx(20.0)}
+    assert profile["samples"] == {"Bakkie|day": MIN_FIT_SAMPLES, "Motorbike|day": 3}
+    assert RouteEstimator(profile, cache_alias=None).speed_kmh("Bakkie", start) == pytest.approx(20.0)
+
+
+def test_fit_profile_learns_detour_from_stored_routes():
+    start = datetime.datetime(2024, 3, 5, 12, 0, tzinfo=SAST)
+    straight_km = straight_line_km(-26.2041, 28.0473, -26.1041, 28.0473)
+    trips = [
+        (-26.2041, 28.0473, -26.1041, 28.0473, "Bakkie", start, straight_km * 1.45, 3600.0, False)
+    ] * MIN_FIT_SAMPLES
+
+    profile = fit_profile(trips)
+
+    assert profile["detour"] == {region_for(-26.2041, 28.0473): pytest.approx(1.45)}
+    assert profile["speeds"]["Bakkie|day"] == pytest.approx(straight_km * 1.45, abs=0.01)
+
+
+def test_fit_profile_skips_estimated_routes():
+    start = datetime.datetime(2024, 3, 5, 12, 0, tzinfo=SAST)
+    straight_km = straight_line_km(-26.2041, 28.0473, -26.1041, 28.0473)
+    trips = [
+        (-26.2041, 28.0473, -26.1041, 28.0473, "Bakkie", start, straight_km * 2.0, 600.0, True)
+    ] * MIN_FIT_SAMPLES
+
+    profile = fit_profile(trips)
+
+    assert profile["detour"] == {}
+    assert profile["speeds"] == {}
+
+
+def test_published_profile_reaches_other_estimators():
+    with override_settings(CACHES=LOCMEM):
+        with patch("trips.estimator.route_estimator", RouteEstimator(cache_alias=None)):
+            publish_profile({"detour": {region_for(-26.2, 28.0): 1.5}, "speeds": {"Bakkie|day": 18.0}})
+        worker = RouteEstimator(cache_alias="default")
+        assert worker.detour_factor(-26.2, 28.0) == 1.5
+
+
+def test_eta_cost_ranks_by_vehicle_speed():
+    with patch("trips.dispatch.route_estimator", RouteEstimator(cache_alias=None)):
+        bike = eta_cost(None, {"driver": {"vehicle_type": "Motorbike"}, "distance": 5.0})
+        truck = eta_cost(None, {"driver": {"vehicle_type": "8 ton Truck"}, "distance": 5.0})
+    assert bike < truck
+
+
+def test_eta_cost_uses_the_drivers_region_detour_factor():
+    estimator = RouteEstimator(cache_alias=None)
+    estimator.detour = {region_for(-26.2, 28.0): 2.0}
+    with patch("trips.dispatch.route_estimator", estimator):
+        winding = eta_cost(None, {"driver": {"latitude": "-26.2", "longitude": "28.0"}, "distance": 5.0})
+        unknown = eta_cost(None, {"driver": {}, "distance": 5.0})
+    assert winding == pytest.approx(unknown * 2.0 / DEFAULT_DETOUR_FACTOR)
@@ -0,0 +1,118 @@
+import time
+
+import pytest
+from trips.heartbeat import PING_FRAME, HeartbeatMixin, HeartbeatWheel, heartbeat
+
+
+class FakeConnection:
+    def __init__(self, fail=False):
+        self.sent = []
+        self.closed = False
+        self.fail = fail
+
+    async def base_send(self, message):
+        if self.fail:
+            raise ConnectionResetError("peer gone")
+        self.sent.append(message)
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.mark.asyncio
+async def test_each_tick_pings_one_slot_with_the_shared_frame():
+    wheel = HeartbeatWheel(interval=30, slots=3, dead_after=90)
+    connections = [FakeConnection() for _ in range(6)]
+    for connection in connections:
+        wheel.register(connection)
+
+    await wheel.tick()
+    assert sum(len(connection.sent) for connection in connections) == 2
+    for _ in range(2):
+        await wheel.tick()
+    assert all(connection.sent == [{"type": "websocket.send", "text": PING_FRAME}] for connection in connections)
+    assert connections[0].sent[0] is connections[1].sent[0]
+    wheel._task.cancel()
+
+
+@pytest.mark.asyncio
+async def test_failed_send_evicts_peer():
+    wheel = HeartbeatWheel(slots=1)
+    dead, live = FakeConnection(fail=True), FakeConnection()
+    wheel.register(dead)
+    wheel.register(live)
+
+    await wheel.tick()
+    assert dead.closed and not live.closed
+    assert len(wheel) == 1 and wheel.stats()["evictions"] == 1
+    wheel._task.cancel()
+
+
+@pytest.mark.asyncio
+async def test_peer_that_stops_answering_is_evicted():
+    wheel = HeartbeatWheel(slots=1, dead_after=90)
+    answering, silent_legacy = FakeConnection(), FakeConnection()
+    wheel.register(answering)
+    wheel.register(silent_legacy)  # never sends a pong, so it is only evicted on send errors
+    wheel.touch(answering, pong=True)
+    seen = wheel._last_seen[answering]
+
+    await wheel.tick(now=seen + 60)
+    assert not answering.closed
+    await wheel.tick(now=seen + 120)
+    assert answering.closed and not silent_legacy.closed
+    assert len(wheel) == 1
+    wheel._task.cancel()
+
+
+class Base:
+    def __init__(self):
+        self.received = []
+
+    async def accept(self):
+        pass
+
+    async def websocket_receive(self, message):
+        self.received.append(message)
+
+    async def websocket_disconnect(self, message):
+        pass
+
+
+class Consumer(HeartbeatMixin, Base):
+    pass
+
+
+@pytest.mark.asyncio
+async def test_mixin_registers_and_swallows_pongs():
+    consumer = Consumer()
+    await consumer.accept()
+    assert consumer in heartbeat._slot_of
+
+    await consumer.websocket_receive({"type": "websocket.receive", "text": '{"action": "create_trip"}'})
+    assert consumer not in heartbeat._last_seen
+    await consumer.websocket_receive({"type": "websocket.receive", "text": '{"type": "pong"}'})
+    assert consumer.received == [{"type": "websocket.receive", "text": '{"action": "create_trip"}'}]
+    assert consumer in heartbeat._last_seen
+
+    await consumer.websocket_disconnect({"type": "websocket.disconnect"})
+    assert consumer not in heartbeat._slot_of
+    heartbeat._task.cancel()
+
+
+@pytest.mark.asyncio
+async def test_client_that_sends_a_message_then_listens_is_not_evicted():
+    consumer = Consumer()
+    connection = FakeConnection()
+    consumer.base_send, consumer.close = connection.base_send, connection.close
+    await consumer.accept()
+    await consumer.websocket_receive({"type": "websocket.receive", "text": '{"action": "confirm_driver"}'})
+
+    # Long after the dead-peer timeout, the next ping still goes out and the socket stays open.
+    heartbeat._cursor = heartbeat._slot_of[consumer]
+    await heartbeat.tick(now=time.monotonic() + 10 * heartbeat.dead_after)
+    assert consumer in heartbeat._slot_of
+    assert len(connection.sent) == 1 and not connection.closed
+
+    await consumer.websocket_disconnect({"type": "websocket.disconnect"})
+    heartbeat._task.cancel()
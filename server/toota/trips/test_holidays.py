@@ -0,0 +1,57 @@
+import datetime
+from unittest.mock import patch
+
+from trips import holidays
+from trips.holidays import calculate_easter, country_for_point, holidays_for, is_holiday, is_peak_hour_or_festive
+
+UTC = datetime.timezone.utc
+
+
+def test_easter_and_good_friday():
+    assert calculate_easter(2024) == datetime.date(2024, 3, 31)
+    assert calculate_easter(2025) == datetime.date(2025, 4, 20)
+    assert is_holiday(datetime.date(2025, 4, 18), "ZA")  # Good Friday
+    assert is_holiday(datetime.date(2025, 4, 21), "ZA")  # Family Day / Easter Monday
+
+
+def test_sunday_holidays_are_observed_on_monday():
+    # Youth Day 2024 (16 June) was a Sunday.
+    assert is_holiday(datetime.date(2024, 6, 17), "ZA")
+    assert not is_holiday(datetime.date(2024, 6, 18), "ZA")
+    # Nigeria does not move holidays.
+    assert not is_holiday(datetime.date(2024, 6, 13), "NG")
+
+
+def test_country_specific_holidays():
+    assert is_holiday(datetime.date(2024, 12, 16), "ZA")
+    assert not is_holiday(datetime.date(2024, 12, 16), "NG")
+    assert is_holiday(datetime.date(2024, 10, 1), "NG")
+    assert is_holiday(datetime.date(2024, 12, 6), "GH")  # Farmers' Day, first Friday of December
+
+
+def test_extra_holidays_from_settings():
+    holidays_for.cache_clear()
+    try:
+        with patch.object(holidays, "EXTRA_HOLIDAYS", {"NG": ["2025-03-31"]}):
+            assert is_holiday(datetime.date(2025, 3, 31), "NG")
+            assert not is_holiday(datetime.date(2025, 3, 31), "ZA")
+    finally:
+        holidays_for.cache_clear()
+
+
+def test_country_for_point():
+    assert country_for_point(-26.2041, 28.0473) == "ZA"
+    assert country_for_point(6.5244, 3.3792) == "NG"
+    assert country_for_point(-1.2921, 36.8219) == "KE"
+    assert country_for_point(5.6037, -0.1870) == "GH"
+    assert country_for_point(48.85, 2.35) == holidays.DEFAULT_COUNTRY
+    assert country_for_point(None, None) == holidays.DEFAULT_COUNTRY
+
+
+def test_peak_hours_use_local_time():
+    # 16:30 UTC is 18:30 in Johannesburg but 17:30 in Lagos.
+    dt = datetime.datetime(2024, 3, 5, 16, 30, tzinfo=UTC)
+    assert is_peak_hour_or_festive(dt, "ZA")
+    assert not is_peak_hour_or_festive(dt, "NG")
+    assert not is_peak_hour_or_festive(datetime.datetime(2024, 3, 5, 12, 0), "ZA")  # naive = local
+    assert is_peak_hour_or_festive(datetime.datetime(2024, 12, 25, 12, 0), "ZA")
@@ -0,0 +1,99 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from authentication.models import Driver
+from trips.consumers import DriverLocationConsumer
+from trips.ingest import LocationCoalescer
+from trips.location_store import InMemoryLocationStore
+from trips.spatial import DriverGridIndex
+
+START = (-26.2041, 28.0473)
+# Roughly 110 m north per step.
+STEPS = [(START[0] + 0.001 * i, START[1]) for i in range(10)]
+
+
+def recorder():
+    published = []
+
+    async def publish(lat, lon):
+        published.append((lat, lon))
+    return published, publish
+
+
+@pytest.mark.asyncio
+async def test_burst_collapses_to_latest_position():
+    published, publish = recorder()
+    locations = LocationCoalescer(publish, min_interval=0.05, min_distance_m=20)
+
+    assert await locations.offer(*STEPS[0]) is True
+    for step in STEPS[1:]:
+        assert await locations.offer(*step) is False
+    assert published == [STEPS[0]]
+
+    await asyncio.sleep(0.08)
+    assert published == [STEPS[0], STEPS[-1]]
+    assert locations.stats() == {"received": 10, "published": 2}
+
+
+@pytest.mark.asyncio
+async def test_small_moves_are_dropped_until_keepalive():
+    published, publish = recorder()
+    locations = LocationCoalescer(publish, min_interval=0.0, min_distance_m=20, keepalive=0.05)
+
+    await locations.offer(*START)
+    assert await locations.offer(START[0] + 0.00005, START[1]) is False  # ~5 m
+    assert published == [START]
+    await asyncio.sleep(0.06)
+    assert await locations.offer(START[0] + 0.00005, START[1]) is True
+    assert len(published) == 2
+
+
+@pytest.mark.asyncio
+async def test_returning_to_published_spot_cancels_pending_move():
+    published, publish = recorder()
+    locations = LocationCoalescer(publish, min_interval=0.05, min_distance_m=20)
+
+    await locations.offer(*START)
+    await locations.offer(*STEPS[3])
+    await locations.offer(*START)
+    await asyncio.sleep(0.08)
+    assert published == [START]
+
+
+@pytest.mark.asyncio
+async def test_flush_publishes_pending_position():
+    published, publish = recorder()
+    locations = LocationCoalescer(publish, min_interval=10, min_distance_m=20)
+
+    await locations.offer(*STEPS[0])
+    await locations.offer(*STEPS[5])
+    await locations.flush()
+    assert published == [STEPS[0], STEPS[5]]
+
+
+@pytest.mark.asyncio
+async def test_ping_after_accepting_a_trip_keeps_driver_out_of_matching():
+    consumer = DriverLocationConsumer()
+    consumer.driver = Driver(email="driver@example.com", vehicle_type="Bakkie", is_available=True)  # as at connect
+    consumer.driver_id = consumer.driver.id
+    consumer.room_group_name = f"driver_{consumer.driver_id}"
+    consumer.channel_layer = MagicMock(group_send=AsyncMock())
+    consumer.mark_seen = AsyncMock(return_value=False)
+    consumer.get_driver_details = AsyncMock(return_value={})
+    index, store, surge = DriverGridIndex(), InMemoryLocationStore(), MagicMock()
+
+    with patch("trips.consumers.driver_index", index), \
+            patch("trips.consumers.get_location_store", return_value=store), \
+            patch("trips.consumers.get_surge_engine", return_value=surge), \
+            patch("trips.consumers.position_buffer"), \
+            patch("trips.consumers.Driver.objects") as driver_query:
+        # DriverTripConsumer announces the accepted trip to this socket.
+        await consumer.driver_availability_update({"type": "driver_availability_update", "is_available": False})
+        await consumer.publish_location(*START)
+
+    driver_query.filter.assert_not_called()  # no database read per ping
+    assert consumer.driver.is_available is False
+    assert len(index) == 0
+    assert store.search(*START, 5) == []
+    surge.record_driver.assert_not_called()
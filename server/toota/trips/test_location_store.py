@@ -0,0 +1,46 @@
+import pytest
+from trips.location_store import InMemoryLocationStore, RedisLocationStore, location_key
+
+SANDTON = (-26.1076, 28.0567)
+ROSEBANK = (-26.1457, 28.0416)  # ~4.5 km from Sandton
+LAGOS = (6.4541, 3.3947)
+
+
+@pytest.fixture(params=["memory", "redis"])
+def store(request):
+    if request.param == "memory":
+        return InMemoryLocationStore()
+    fakeredis = pytest.importorskip("fakeredis")
+    return RedisLocationStore(fakeredis.FakeRedis())
+
+
+def test_search_returns_nearest_first(store):
+    store.update("rosebank", *ROSEBANK, vehicle_type="Bakkie")
+    store.update("sandton", SANDTON[0] + 0.001, SANDTON[1], vehicle_type="Bakkie")
+    store.update("lagos", *LAGOS, vehicle_type="Bakkie")
+
+    matches = store.search(*SANDTON, radius_km=10, vehicle_types=["Bakkie"])
+    assert [driver_id for driver_id, *_ in matches] == ["sandton", "rosebank"]
+    assert matches[1][3] == pytest.approx(4.5, abs=0.3)
+
+
+def test_search_filters_vehicle_type(store):
+    store.update("bakkie", *SANDTON, vehicle_type="Bakkie")
+    store.update("truck", *SANDTON, vehicle_type="8 ton Truck")
+
+    assert [m[0] for m in store.search(*SANDTON, 5, ["8 ton Truck"])] == ["truck"]
+    assert sorted(m[0] for m in store.search(*SANDTON, 5)) == ["bakkie", "truck"]
+
+
+def test_busy_and_removed_drivers_are_not_returned(store):
+    store.update("busy", *SANDTON, vehicle_type="Bakkie")
+    store.update("busy", *SANDTON, vehicle_type="Bakkie", is_available=False)
+    store.update("gone", *SANDTON, vehicle_type="Bakkie")
+    store.remove("gone")
+
+    assert store.search(*SANDTON, 5) == []
+
+
+def test_location_key():
+    assert location_key("Bakkie") == "driver_geo:Bakkie:available"
+    assert location_key(None, is_available=False) == "driver_geo:none:busy"
@@ -0,0 +1,202 @@
+import time
+from unittest.mock import patch
+
+import pytest
+from django.test import override_settings
+from authentication.models import Driver
+from trips import utils
+from trips.driver_cards import card_key
+from trips.presence import InMemoryPresence
+from trips.spatial import DriverGridIndex
+from trips.utils import _bounding_box_candidates, _nearest_in_rings, find_nearest_drivers
+
+SANDTON = (-26.1076, 28.0567)
+LOCMEM = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+class Grid:
+    """Grid index plus presence, so added drivers count as live."""
+    def __init__(self):
+        self.index = DriverGridIndex()
+        self.index.warm([])
+        self.presence = InMemoryPresence()
+
+    def update(self, driver_id, lat, lon, seen_seconds_ago=0):
+        self.index.update(driver_id, lat, lon)
+        self.presence.mark_seen(driver_id, time.time() - seen_seconds_ago)
+
+
+@pytest.fixture
+def grid():
+    grid = Grid()
+    with patch("trips.utils.driver_index", grid.index), patch("trips.utils.get_presence", return_value=grid.presence):
+        yield grid
+
+
+@pytest.fixture
+def card_cache():
+    with override_settings(CACHES=LOCMEM):
+        from django.core.cache import cache
+        cache.clear()
+        yield cache
+
+
+def spy_on_rings():
+    return patch("trips.utils._ring_candidates", wraps=utils._ring_candidates)
+
+
+def test_bounding_box_candidates_filters_in_sql():
+    sql = str(_bounding_box_candidates(*SANDTON, 50, ["Bakkie"]).query)
+    assert sql.count("BETWEEN") == 2
+    assert '"is_available"' in sql and '"vehicle_type" IN' in sql
+    # Only the columns needed for ranking are selected.
+    assert sql.split("FROM")[0].count(",") == 2
+
+
+def test_ring_search_stops_once_limit_is_reached(grid):
+    for i in range(3):
+        grid.update(f"close-{i}", SANDTON[0] + 0.001 * i, SANDTON[1])
+    grid.update("far", SANDTON[0] + 0.3, SANDTON[1])  # ~33 km north
+
+    with spy_on_rings() as rings:
+        distances = _nearest_in_rings(*SANDTON, None, limit=3, mode="grid")
+
+    assert sorted(distances) == ["close-0", "close-1", "close-2"]
+    assert rings.call_count == 1  # the 5 km ring was enough
+
+
+def test_ring_search_widens_and_returns_each_driver_once(grid):
+    grid.update("near", SANDTON[0] + 0.01, SANDTON[1])
+    grid.update("far", SANDTON[0] + 0.3, SANDTON[1])
+
+    with spy_on_rings() as rings:
+        distances = _nearest_in_rings(*SANDTON, None, limit=5, mode="grid")
+
+    assert set(distances) == {"near", "far"}
+    assert distances["far"] == pytest.approx(33.4, abs=0.5)
+    assert rings.call_count == len(utils.SEARCH_RADII_KM)
+
+
+def test_ring_search_keeps_only_the_nearest(grid):
+    for i in range(10):
+        grid.update(f"d{i}", SANDTON[0] + 0.02 * i, SANDTON[1])
+
+    distances = _nearest_in_rings(*SANDTON, None, limit=4, mode="grid")
+    assert sorted(distances) == ["d0", "d1", "d2", "d3"]
+
+
+def test_ring_search_skips_stale_drivers(grid):
+    grid.update("live", SANDTON[0] + 0.02, SANDTON[1])
+    grid.update("silent", SANDTON[0] + 0.001, SANDTON[1], seen_seconds_ago=utils.DRIVER_STALE_AFTER_SECONDS + 1)
+
+    assert list(_nearest_in_rings(*SANDTON, None, limit=5, mode="grid")) == ["live"]
+
+
+def test_stale_drivers_nearest_the_pickup_do_not_hide_live_ones(grid):
+    stale_for = utils.DRIVER_STALE_AFTER_SECONDS + 1
+    for i in range(3):
+        grid.update(f"silent-{i}", SANDTON[0] + 0.001 * i, SANDTON[1], seen_seconds_ago=stale_for)
+    grid.update("live", SANDTON[0] + 0.02, SANDTON[1])  # ~2.2 km
+
+    distances = _nearest_in_rings(*SANDTON, None, limit=3, mode="grid")
+    assert list(distances) == ["live"]
+    assert distances["live"] == pytest.approx(2.22, abs=0.01)
+
+
+@pytest.mark.django_db
+def test_fallback_skips_stale_drivers(grid, card_cache):
+    # Nobody is in the grid near the pickup, so the most recently active drivers are returned.
+    stale_for = utils.DRIVER_STALE_AFTER_SECONDS + 1
+    silent = [Driver.objects.create(email=f"silent-{i}@example.com", is_available=True) for i in range(3)]
+    live = Driver.objects.create(email="live@example.com", is_available=True)
+    Driver.objects.filter(id=live.id).update(updated_at=live.updated_at.replace(year=2020))  # least recent
+    for driver in silent:
+        grid.presence.mark_seen(driver.id, time.time() - stale_for)
+    grid.presence.mark_seen(live.id)
+
+    drivers = find_nearest_drivers(*SANDTON, None, limit=2)
+
+    assert [(d["driver"]["email"], d["distance"]) for d in drivers] == [("live@example.com", None)]
+
+
+@pytest.mark.django_db
+def test_grid_mode_loads_only_drivers_around_the_pickup(card_cache):
+    near = Driver.objects.create(email="near@example.com", latitude=SANDTON[0] + 0.01, longitude=SANDTON[1],
+                                 vehicle_type="Bakkie", is_available=True)
+    Driver.objects.create(email="cape-town@example.com", latitude=-33.92, longitude=18.42,
+                          vehicle_type="Bakkie", is_available=True)
+    Driver.objects.create(email="busy@example.com", latitude=SANDTON[0], longitude=SANDTON[1],
+                          vehicle_type="Bakkie", is_available=False)
+    presence = InMemoryPresence()
+    for driver in Driver.objects.all():
+        presence.mark_seen(driver.id)
+    index = DriverGridIndex()
+
+    with patch("trips.utils.driver_index", index), patch("trips.utils.get_presence", return_value=presence):
+        drivers = find_nearest_drivers(*SANDTON, ["Bakkie"], limit=5, mode="grid")
+
+    assert [d["driver"]["email"] for d in drivers] == ["near@example.com"]
+    assert len(index) == 1  # the Cape Town driver was never loaded
+    assert drivers[0]["driver"]["id"] == str(near.id)
+
+
+def seed_driver(name, lat_offset, vehicle_type="Bakkie", is_available=True):
+    return Driver.objects.create(email=f"{name}@example.com", first_name=name, vehicle_type=vehicle_type,
+                                 latitude=SANDTON[0] + lat_offset, longitude=SANDTON[1], is_available=is_available)
+
+
+@pytest.fixture
+def live_drivers():
+    """Everyone in the database counts as pinging; a fresh grid index per test."""
+    presence = InMemoryPresence()
+
+    def fresh(driver_ids, max_age=None):
+        return {str(driver_id) for driver_id in driver_ids}
+    presence.fresh = fresh
+    with patch("trips.utils.driver_index", DriverGridIndex()), patch("trips.utils.get_presence", return_value=presence):
+        yield
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("mode", ["grid", "db"])
+def test_find_nearest_drivers_orders_by_distance_with_cached_cards(mode, live_drivers, card_cache):
+    far = seed_driver("far", 0.05)  # ~5.6 km
+    near = seed_driver("near", 0.01)  # ~1.1 km
+    seed_driver("motorbike", 0.005, vehicle_type="Motorbike")
+    seed_driver("busy", 0.002, is_available=False)
+
+    drivers = find_nearest_drivers(*SANDTON, ["Bakkie"], limit=5, mode=mode)
+
+    assert [d["driver"]["id"] for d in drivers] == [str(near.id), str(far.id)]
+    assert [d["distance"] for d in drivers] == [pytest.approx(1.11, abs=0.01), pytest.approx(5.56, abs=0.01)]
+    card = drivers[0]["driver"]
+    assert card["email"] == "near@example.com" and card["first_name"] == "near"
+    assert "password" not in card
+    assert card_cache.get(card_key(near.id)) is not None
+
+
+@pytest.mark.django_db
+def test_find_nearest_drivers_rechecks_availability_in_the_database(live_drivers, card_cache):
+    taken = seed_driver("taken", 0.001)
+    free = seed_driver("free", 0.02)
+    assert len(find_nearest_drivers(*SANDTON, None, limit=5)) == 2
+
+    # Accepted a trip on another worker: this process's grid index still lists them.
+    Driver.objects.filter(id=taken.id).update(is_available=False)
+    drivers = find_nearest_drivers(*SANDTON, None, limit=5)
+
+    assert [d["driver"]["id"] for d in drivers] == [str(free.id)]
+
+
+@pytest.mark.django_db
+def test_find_nearest_drivers_falls_back_to_a_capped_list_of_recent_drivers(live_drivers, card_cache):
+    # Everyone is in Cape Town, far outside the largest search radius.
+    for i in range(5):
+        Driver.objects.create(email=f"cpt-{i}@example.com", latitude=-33.92, longitude=18.42, is_available=True)
+
+    drivers = find_nearest_drivers(*SANDTON, None, limit=3)
+
+    assert len(drivers) == 3
+    assert all(d["distance"] is None for d in drivers)
+    # Most recently active first.
+    assert [d["driver"]["email"] for d in drivers] == [f"cpt-{i}@example.com" for i in (4, 3, 2)]
@@ -0,0 +1,221 @@
+import asyncio
+import time
+from unittest.mock import patch
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from trips.osrm import AsyncRoutingClient
+from trips.route_cache import RouteCache
+from trips.route_result import NO_ROUTE, RouteResult
+from trips.utils import get_driver_etas, get_route_data_async
+
+
+async def fake_osrm(calls, delay=0.0, code="Ok"):
+    async def route(request):
+        calls.append(request.match_info["coordinates"])
+        await asyncio.sleep(delay)
+        return web.json_response({"code": code, "routes": [{"distance": 12340.0, "duration": 1290.0}]})
+
+    app = web.Application()
+    app.router.add_get("/route/v1/driving/{coordinates}", route)
+    server = TestServer(app)
+    await server.start_server()
+    return server
+
+
+@pytest.mark.asyncio
+async def test_route_reuses_one_pooled_session():
+    calls = []
+    server = await fake_osrm(calls)
+    client = AsyncRoutingClient(base_url=str(server.make_url("")))
+    try:
+        first = await client.route(-26.2041, 28.0473, -25.7479, 28.2293)
+        session = client._session
+        await client.route(-26.2041, 28.0473, -25.7479, 28.2293)
+
+        assert first == {"distance": 12340.0, "duration": 1290.0}
+        assert client._session is session
+        assert calls == ["28.0473,-26.2041;28.2293,-25.7479"] * 2
+    finally:
+        await client.close()
+        await server.close()
+
+
+@pytest.mark.asyncio
+async def test_slow_and_failed_responses_return_none():
+    calls = []
+    slow = await fake_osrm(calls, delay=0.5)
+    failing = await fake_osrm(calls, code="NoRoute")
+    slow_client = AsyncRoutingClient(base_url=str(slow.make_url("")), timeout=0.05)
+    failing_client = AsyncRoutingClient(base_url=str(failing.make_url("")))
+    try:
+        assert await slow_client.route(-26.2, 28.0, -25.7, 28.2) is None
+        assert await failing_client.route(-26.2, 28.0, -25.7, 28.2) is None
+    finally:
+        await slow_client.close()
+        await failing_client.close()
+        await slow.close()
+        await failing.close()
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_capped():
+    in_flight, peak = 0, 0
+
+    async def route(request):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.02)
+        in_flight -= 1
+        return web.json_response({"code": "Ok", "routes": [{"distance": 1.0, "duration": 1.0}]})
+
+    app = web.Application()
+    app.router.add_get("/route/v1/driving/{coordinates}", route)
+    server = TestServer(app)
+    await server.start_server()
+    client = AsyncRoutingClient(base_url=str(server.make_url("")), max_concurrency=3)
+    try:
+        await asyncio.gather(*(client.route(-26.2, 28.0, -25.7 + i / 100, 28.2) for i in range(10)))
+        assert peak == 3
+    finally:
+        await client.close()
+        await server.close()
+
+
+@pytest.mark.asyncio
+async def test_get_route_data_async_formats_and_caches():
+    calls = []
+    server = await fake_osrm(calls)
+    client = AsyncRoutingClient(base_url=str(server.make_url("")))
+    try:
+        with patch("trips.utils.routing_client", client), \
+                patch("trips.utils.route_cache", RouteCache(shared_alias=None)):
+            first = await get_route_data_async(-26.2041, 28.0473, -25.7479, 28.2293)
+            second = await get_route_data_async(-26.2041, 28.0473, -25.7479, 28.2293)
+    finally:
+        await client.close()
+        await server.close()
+
+    assert first == second == RouteResult(12340.0, 1290.0)
+    assert first.as_dict() == {"distance_km": 12.34, "duration": "21 min"}
+    assert len(calls) == 1
+
+
+async def fake_osrm_table(calls, table_ok=True):
+    async def table(request):
+        calls.append(("table", request.match_info["coordinates"], dict(request.query)))
+        if not table_ok:
+            return web.json_response({"code": "InvalidQuery"}, status=400)
+        sources = request.query["sources"].split(";")
+        return web.json_response({
+            "code": "Ok",
+            "durations": [[60.0 * (i + 1)] for i in range(len(sources))],
+            "distances": [[1000.0 * (i + 1)] for i in range(len(sources))],
+        })
+
+    async def route(request):
+        calls.append(("route", request.match_info["coordinates"], {}))
+        return web.json_response({"code": "Ok", "routes": [{"distance": 500.0, "duration": 30.0}]})
+
+    app = web.Application()
+    app.router.add_get("/table/v1/driving/{coordinates}", table)
+    app.router.add_get("/route/v1/driving/{coordinates}", route)
+    server = TestServer(app)
+    await server.start_server()
+    return server
+
+
+@pytest.mark.asyncio
+async def test_driver_etas_use_one_table_request():
+    calls = []
+    server = await fake_osrm_table(calls)
+    client = AsyncRoutingClient(base_url=str(server.make_url("")))
+    cache = RouteCache(shared_alias=None)
+    drivers = [(-26.10, 28.01), (-26.11, 28.02), (None, None), (-26.12, 28.03)]
+    cache.set(cache.key(-26.11, 28.02, -26.2, 28.0), RouteResult(9990.0, 540.0))
+    try:
+        with patch("trips.utils.routing_client", client), patch("trips.utils.route_cache", cache):
+            etas = await get_driver_etas(-26.2, 28.0, drivers)
+    finally:
+        await client.close()
+        await server.close()
+
+    assert etas == [RouteResult(1000.0, 60.0), RouteResult(9990.0, 540.0), NO_ROUTE, RouteResult(2000.0, 120.0)]
+    assert len(calls) == 1
+    kind, coordinates, query = calls[0]
+    assert kind == "table"
+    assert coordinates == "28.01,-26.1;28.03,-26.12;28.0,-26.2"
+    assert query["sources"] == "0;1" and query["destinations"] == "2"
+
+
+@pytest.mark.asyncio
+async def test_driver_etas_fall_back_to_parallel_routes():
+    calls = []
+    server = await fake_osrm_table(calls, table_ok=False)
+    client = AsyncRoutingClient(base_url=str(server.make_url("")))
+    try:
+        with patch("trips.utils.routing_client", client), \
+                patch("trips.utils.route_cache", RouteCache(shared_alias=None)):
+            etas = await get_driver_etas(-26.2, 28.0, [(-26.10, 28.01), (-26.11, 28.02)])
+    finally:
+        await client.close()
+        await server.close()
+
+    assert etas == [RouteResult(500.0, 30.0)] * 2
+    assert [kind for kind, _, _ in calls] == ["table", "route", "route"]
+
+
+@pytest.mark.asyncio
+async def test_trip_route_is_read_from_the_trip():
+    from trips.models import Trip
+    from trips.utils import get_trip_route
+
+    trip = Trip(pickup_lat=-26.2, pickup_long=28.0, dest_lat=-25.7, dest_long=28.2)
+    trip.set_route(RouteResult(5000.0, 600.0))
+    with patch("trips.utils.get_route_data_async") as routed:
+        assert await get_trip_route(trip) == RouteResult(5000.0, 600.0)
+    routed.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_stored_estimate_is_replaced_once_osrm_has_answered():
+    from trips.models import Trip
+    from trips.utils import get_trip_route
+
+    trip = Trip(pickup_lat=-26.2, pickup_long=28.0, dest_lat=-25.7, dest_long=28.2)
+    trip.set_route(RouteResult(7000.0, 700.0, estimated=True))
+    with patch("trips.utils.get_route_data_async", return_value=RouteResult(7000.0, 650.0, estimated=True)), \
+            patch.object(Trip, "asave") as saved:
+        assert await get_trip_route(trip) == RouteResult(7000.0, 700.0, estimated=True)
+    saved.assert_not_called()
+
+    with patch("trips.utils.get_route_data_async", return_value=RouteResult(8200.0, 900.0)), \
+            patch.object(Trip, "asave") as saved:
+        assert await get_trip_route(trip) == RouteResult(8200.0, 900.0)
+    saved.assert_called_once_with(update_fields=Trip.ROUTE_FIELDS)
+    assert trip.stored_route() == RouteResult(8200.0, 900.0)
+
+
+@pytest.mark.asyncio
+async def test_slow_osrm_does_not_hold_up_the_first_answer():
+    calls = []
+    server = await fake_osrm(calls, delay=0.5)
+    client = AsyncRoutingClient(base_url=str(server.make_url("")))
+    cache = RouteCache(shared_alias=None)
+    try:
+        with patch("trips.utils.routing_client", client), patch("trips.utils.route_cache", cache):
+            started = time.monotonic()
+            first = await get_route_data_async(-26.2041, 28.0473, -25.7479, 28.2293)
+            waited = time.monotonic() - started
+            await asyncio.sleep(0.6)
+            refined = await get_route_data_async(-26.2041, 28.0473, -25.7479, 28.2293)
+    finally:
+        await client.close()
+        await server.close()
+
+    assert first.estimated
+    assert waited < 0.4
+    assert refined == RouteResult(12340.0, 1290.0)
+    assert len(calls) == 1
@@ -0,0 +1,56 @@
+from unittest.mock import patch
+
+from django.db import OperationalError
+from django.utils import timezone
+from trips.position_buffer import PositionBuffer
+
+
+def test_flush_writes_latest_position_per_driver_in_one_bulk_update():
+    before = timezone.now()
+    buffer = PositionBuffer()
+    buffer.put("d1", -26.20, 28.04)
+    buffer.put("d2", -25.74, 28.22)
+    buffer.put("d1", -26.21, 28.05)
+
+    with patch("trips.position_buffer.Driver.objects.bulk_update") as bulk_update, \
+            patch("trips.position_buffer.patch_driver_card_locations") as patch_cards:
+        assert buffer.flush() == 2
+
+    bulk_update.assert_called_once()
+    drivers, fields = bulk_update.call_args.args
+    assert fields == ["latitude", "longitude", "updated_at"]
+    assert {(str(driver.id), driver.latitude, driver.longitude) for driver in drivers} == {
+        ("d1", -26.21, 28.05), ("d2", -25.74, 28.22),
+    }
+    assert all(before <= driver.updated_at <= timezone.now() for driver in drivers)
+    positions = patch_cards.call_args.args[0]
+    assert {driver_id: position[:2] for driver_id, position in positions.items()} == {
+        "d1": (-26.21, 28.05), "d2": (-25.74, 28.22),
+    }
+    assert len(buffer) == 0
+    assert buffer.stats() == {"pending": 0, "buffered": 3, "written": 2, "flushes": 1}
+
+
+def test_failed_flush_keeps_positions_without_overwriting_newer_ones():
+    buffer = PositionBuffer()
+    buffer.put("d1", -26.20, 28.04)
+    buffer.put("d2", -25.74, 28.22)
+
+    def fail(*args, **kwargs):
+        buffer.put("d1", -26.30, 28.10)  # arrives while the batch is being written
+        raise OperationalError("database is locked")
+
+    with patch("trips.position_buffer.Driver.objects.bulk_update", side_effect=fail):
+        assert buffer.flush() == 0
+    assert {driver_id: position[:2] for driver_id, position in buffer._positions.items()} == {
+        "d1": (-26.30, 28.10), "d2": (-25.74, 28.22),
+    }
+
+
+def test_discarded_and_empty_buffers_write_nothing():
+    buffer = PositionBuffer()
+    buffer.put("d1", -26.20, 28.04)
+    buffer.discard("d1")
+    with patch("trips.position_buffer.Driver.objects.bulk_update") as bulk_update:
+        assert buffer.flush() == 0
+    bulk_update.assert_not_called()
@@ -0,0 +1,76 @@
+import time
+from unittest.mock import patch
+
+import pytest
+from authentication.models import Driver
+from trips.location_store import InMemoryLocationStore
+from trips.presence import InMemoryPresence, RedisPresence, sweep_stale_drivers
+from trips.spatial import DriverGridIndex
+
+
+@pytest.fixture(params=["memory", "redis"])
+def presence(request):
+    if request.param == "memory":
+        return InMemoryPresence()
+    fakeredis = pytest.importorskip("fakeredis")
+    return RedisPresence(fakeredis.FakeRedis())
+
+
+def test_fresh_and_stale(presence):
+    presence.mark_seen("live")
+    presence.mark_seen("silent", time.time() - 600)
+
+    assert presence.fresh(["live", "silent", "never-seen"], max_age=120) == {"live"}
+    assert presence.stale(max_age=120) == ["silent"]
+
+
+def test_ping_after_sweep_revives_driver(presence):
+    presence.mark_seen("d1", time.time() - 600)
+    presence.mark_swept(["d1"])
+
+    assert presence.stale(max_age=120) == []
+    assert presence.mark_seen("d1") is True
+    assert presence.mark_seen("d1") is False
+
+
+@pytest.mark.django_db
+def test_sweep_marks_silent_drivers_unavailable():
+    silent = Driver.objects.create(email="silent@example.com", latitude=-26.1, longitude=28.05, is_available=True)
+    live = Driver.objects.create(email="live@example.com", latitude=-26.1, longitude=28.05, is_available=True)
+    presence = InMemoryPresence()
+    presence.mark_seen(silent.id, time.time() - 600)
+    presence.mark_seen(live.id)
+    index = DriverGridIndex()
+    index.update(str(silent.id), -26.1, 28.05)
+    store = InMemoryLocationStore()
+    store.update(str(silent.id), -26.1, 28.05)
+
+    with patch("trips.presence.get_presence", return_value=presence), \
+            patch("trips.presence.get_location_store", return_value=store), \
+            patch("trips.presence.driver_index", index):
+        assert sweep_stale_drivers(max_age=120) == 1
+
+    assert not Driver.objects.get(id=silent.id).is_available
+    assert Driver.objects.get(id=live.id).is_available
+    assert len(index) == 0
+    assert store.search(-26.1, 28.05, 5) == []
+    assert presence.stale(max_age=120) == []
+
+
+@pytest.mark.django_db
+def test_busy_stale_driver_is_not_revived_by_next_ping():
+    # "on_trip" was taken off when they accepted a trip, then lost signal.
+    on_trip = Driver.objects.create(email="busy@example.com", is_available=False)
+    idle = Driver.objects.create(email="idle@example.com", is_available=True)
+    presence = InMemoryPresence()
+    presence.mark_seen(on_trip.id, time.time() - 600)
+    presence.mark_seen(idle.id, time.time() - 600)
+
+    with patch("trips.presence.get_presence", return_value=presence), \
+            patch("trips.presence.get_location_store", return_value=InMemoryLocationStore()), \
+            patch("trips.presence.driver_index", DriverGridIndex()):
+        assert sweep_stale_drivers(max_age=120) == 1
+
+    assert presence.stale(max_age=120) == []
+    assert presence.mark_seen(on_trip.id) is False  # reconnecting does not make them available
+    assert presence.mark_seen(idle.id) is True
@@ -0,0 +1,52 @@
+from unittest.mock import patch
+
+import numpy as np
+from rest_framework.test import APIRequestFactory, force_authenticate
+from authentication.models import User
+from trips.models import Trip
+from trips.pricing import VEHICLE_TYPES, fare_matrix, price_sheet
+from trips.route_result import RouteResult
+from trips.views import FareQuoteView
+
+
+def test_price_sheet_matches_calculate_fare_to_the_cent():
+    rng = np.random.default_rng(7)
+    routes = [RouteResult(float(m), float(s)) for m, s in zip(rng.uniform(0, 90000, 500), rng.uniform(0, 9000, 500))]
+    for surge in (False, True, 1.8):
+        sheet = price_sheet(routes, surge)
+        for route, fares in zip(routes, sheet):
+            for vehicle in VEHICLE_TYPES:
+                assert fares[vehicle] == Trip(vehicle_type=vehicle).calculate_route_fare(route, surge)
+
+
+def test_fare_matrix_prices_routes_by_vehicles_with_per_route_surge():
+    fares = fare_matrix([10.0, 2.0], [20.0, 5.0], surge_multipliers=[1.0, 2.0], vehicle_types=["Bakkie", "Unknown"])
+    assert fares.shape == (2, 2)
+    assert fares.tolist() == [[220.0, 240.0], [(80 + 20 + 10) * 2, (100 + 20 + 10) * 2]]
+
+
+def test_quote_view_prices_without_creating_a_trip():
+    request = APIRequestFactory().post("/trip/quote/", {
+        "pickup_lat": -26.2041, "pickup_lon": 28.0473, "dest_lat": -25.7479, "dest_lon": 28.2293,
+        "vehicle_types": ["Bakkie", "Motorbike"],
+    }, format="json")
+    force_authenticate(request, user=User(email="rider@example.com"))
+    with patch("trips.views.get_route_data", return_value=RouteResult(10000.0, 1200.0)), \
+            patch("trips.views.current_multiplier", return_value=1.0), \
+            patch("trips.models.Trip.save") as save:
+        response = FareQuoteView.as_view()(request)
+
+    assert response.status_code == 200
+    assert response.data == {
+        "distance_km": 10.0, "estimated_time": "20 min", "surge": False, "surge_multiplier": 1.0,
+        "fares": {"Bakkie": 220.0, "Motorbike": 190.0},
+    }
+    save.assert_not_called()
+
+
+def test_quote_view_rejects_unknown_vehicle_types():
+    request = APIRequestFactory().post("/trip/quote/", {
+        "pickup_lat": -26.2, "pickup_lon": 28.0, "dest_lat": -25.7, "dest_lon": 28.2, "vehicle_types": ["Bus"],
+    }, format="json")
+    force_authenticate(request, user=User(email="rider@example.com"))
+    assert FareQuoteView.as_view()(request).status_code == 400
@@ -0,0 +1,59 @@
+import time
+import uuid
+from unittest.mock import patch
+
+import pytest
+from rest_framework import serializers
+from payments.serializers import PaymentSerializer
+from trips.quotes import InvalidQuoteToken, quote_route, sign_quote, verify_quote
+from trips.route_result import RouteResult
+
+TRIP_ID = uuid.uuid4()
+ROUTE = RouteResult(12340.0, 1290.0)
+
+
+def test_quote_round_trip():
+    token = sign_quote(TRIP_ID, 263.4, ROUTE, surge=1.5, vehicle_type="Bakkie")
+    quote = verify_quote(token, TRIP_ID)
+    assert quote["fare"] == 263.4 and quote["surge"] == 1.5 and quote["vehicle_type"] == "Bakkie"
+    assert quote_route(quote) == ROUTE
+
+
+def test_tampered_token_is_rejected():
+    token = sign_quote(TRIP_ID, 263.4, ROUTE)
+    _, rest = token.split(":", 1)
+    forged = sign_quote(TRIP_ID, 1.0, ROUTE).split(":", 1)[0]
+    with pytest.raises(InvalidQuoteToken, match="invalid"):
+        verify_quote(f"{forged}:{rest}")
+    with pytest.raises(InvalidQuoteToken, match="invalid"):
+        verify_quote(token[:-1] + ("A" if token[-1] != "A" else "B"))
+
+
+def test_expired_or_foreign_token_is_rejected():
+    token = sign_quote(TRIP_ID, 263.4, ROUTE)
+    with pytest.raises(InvalidQuoteToken, match="another trip"):
+        verify_quote(token, uuid.uuid4())
+    with patch("django.core.signing.time.time", return_value=time.time() + 3600):
+        with pytest.raises(InvalidQuoteToken, match="expired"):
+            verify_quote(token, TRIP_ID, max_age=900)
+
+
+def test_payment_serializer_takes_fare_from_quote_without_loading_the_trip():
+    serializer = PaymentSerializer()
+    with patch("payments.serializers.Trip.objects") as trips:
+        attrs = serializer.validate({"trip_id": TRIP_ID, "quote_token": sign_quote(TRIP_ID, 263.4, ROUTE)})
+    assert "quote_token" not in attrs and attrs["quote"]["fare"] == 263.4
+    trips.filter.assert_not_called()
+    trips.get.assert_not_called()
+
+    with pytest.raises(serializers.ValidationError):
+        serializer.validate({"trip_id": TRIP_ID, "quote_token": "not-a-token"})
+
+
+def test_payment_serializer_without_quote_checks_the_trip_exists():
+    serializer = PaymentSerializer()
+    with patch("payments.serializers.Trip.objects") as trips:
+        trips.filter.return_value.exists.return_value = False
+        with pytest.raises(serializers.ValidationError, match="does not exist"):
+            serializer.validate({"trip_id": TRIP_ID})
+    trips.filter.assert_called_once_with(id=TRIP_ID)
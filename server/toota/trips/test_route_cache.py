@@ -0,0 +1,179 @@
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+from django.test import override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+from authentication.models import User
+from trips.estimator import RouteEstimator
+from trips.osrm import AsyncRoutingClient
+from trips.route_cache import RouteCache
+from trips.route_result import RouteResult
+from trips.singleflight import SingleFlight
+from trips.utils import get_route_data
+from trips.views import RoutingStatsView
+
+LOCMEM = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+ROUTE = RouteResult(12340.0, 1290.0)
+
+
+@pytest.fixture(autouse=True)
+def routing_client():
+    # A fresh breaker per test, so failures recorded by one test do not open it for the next.
+    client = AsyncRoutingClient(base_url="http://osrm.invalid")
+    with patch("trips.utils.routing_client", client):
+        yield client
+
+
+@pytest.fixture(autouse=True)
+def locmem_cache():
+    with override_settings(CACHES=LOCMEM):
+        from django.core.cache import cache
+        cache.clear()
+        yield cache
+
+
+def test_key_rounds_coordinates():
+    cache = RouteCache(precision=3, shared_alias=None)
+    assert cache.key(-26.20411, 28.04729, "-25.7479", 28.2293) == (-26.204, 28.047, -25.748, 28.229)
+    assert cache.key(-26.20411, 28.04729, -25.7479, 28.2293) == cache.key(-26.20449, 28.0471, -25.7481, 28.22899)
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = RouteCache(max_entries=2, shared_alias=None)
+    cache.set("a", ROUTE)
+    cache.set("b", ROUTE)
+    cache.get("a")
+    cache.set("c", ROUTE)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == ROUTE
+    assert cache.get("c") == ROUTE
+    assert cache.stats()["entries"] == 2
+
+
+def test_entries_expire_after_ttl():
+    cache = RouteCache(ttl=10, shared_alias=None)
+    with patch("trips.route_cache.time.monotonic", return_value=100.0):
+        cache.set("a", ROUTE)
+    with patch("trips.route_cache.time.monotonic", return_value=109.0):
+        assert cache.get("a") == ROUTE
+    with patch("trips.route_cache.time.monotonic", return_value=111.0):
+        assert cache.get("a") is None
+
+    assert cache.stats() == {"entries": 0, "hits": 1, "shared_hits": 0, "misses": 1, "hit_ratio": 0.5}
+
+
+def test_shared_tier_serves_other_processes(locmem_cache):
+    writer = RouteCache(shared_alias="default")
+    reader = RouteCache(shared_alias="default")
+    key = writer.key(-26.2041, 28.0473, -25.7479, 28.2293)
+    writer.set(key, ROUTE)
+
+    assert reader.get(key) == ROUTE
+    assert reader.get(key) == ROUTE
+    assert reader.stats()["shared_hits"] == 1
+    assert reader.stats()["hits"] == 1
+
+
+def test_get_route_data_only_calls_osrm_once_per_route():
+    osrm = {"code": "Ok", "routes": [{"distance": 12340.0, "duration": 1290.0}]}
+    with patch("trips.utils.route_cache", RouteCache(shared_alias=None)), \
+            patch("trips.utils.requests.get") as get:
+        get.return_value.status_code = 200
+        get.return_value.json.return_value = osrm
+        first = get_route_data(-26.2041, 28.0473, -25.7479, 28.2293)
+        second = get_route_data(-26.20412, 28.04731, -25.7479, 28.2293)
+
+    assert get.call_count == 1
+    assert first == second == ROUTE
+
+
+def test_failed_routes_are_not_cached():
+    with patch("trips.utils.route_cache", RouteCache(shared_alias=None)), \
+            patch("trips.utils.route_estimator", RouteEstimator(cache_alias=None)), \
+            patch("trips.utils.requests.get", side_effect=ConnectionError("down")) as get:
+        estimate = get_route_data(-26.2041, 28.0473, -25.7479, 28.2293)
+        get_route_data(-26.2041, 28.0473, -25.7479, 28.2293)
+
+    assert get.call_count == 2
+    assert estimate.estimated and estimate.distance_km > 0
+
+
+def test_slow_osrm_answers_with_the_estimate_and_caches_the_route_later():
+    released = threading.Event()
+    osrm = {"code": "Ok", "routes": [{"distance": 12340.0, "duration": 1290.0}]}
+
+    def slow_get(*args, **kwargs):
+        released.wait(5)
+        response = MagicMock(status_code=200)
+        response.json.return_value = osrm
+        return response
+
+    cache = RouteCache(shared_alias=None)
+    with patch("trips.utils.route_cache", cache), \
+            patch("trips.utils.route_estimator", RouteEstimator(cache_alias=None)), \
+            patch("trips.utils.requests.get", side_effect=slow_get) as get:
+        started = time.monotonic()
+        first = get_route_data(-26.2041, 28.0473, -25.7479, 28.2293)
+        waited = time.monotonic() - started
+        again = get_route_data(-26.2041, 28.0473, -25.7479, 28.2293)
+        released.set()
+        for _ in range(100):
+            if cache.get(cache.key(-26.2041, 28.0473, -25.7479, 28.2293)):
+                break
+            time.sleep(0.01)
+        refined = get_route_data(-26.2041, 28.0473, -25.7479, 28.2293)
+
+    assert first.estimated and again.estimated
+    assert waited < 1.0
+    assert refined == ROUTE
+    assert get.call_count == 1
+
+
+def test_routing_stats_view_reports_coalescing_to_staff_only():
+    flights = SingleFlight()
+    flights.calls, flights.executions = 4, 1
+    with patch("trips.utils.route_flights", flights):
+        staff = APIRequestFactory().get("/trip/routing/stats/")
+        force_authenticate(staff, user=User(email="ops@example.com", is_staff=True))
+        rider = APIRequestFactory().get("/trip/routing/stats/")
+        force_authenticate(rider, user=User(email="rider@example.com"))
+        response = RoutingStatsView.as_view()(staff)
+        forbidden = RoutingStatsView.as_view()(rider)
+
+    assert response.status_code == 200
+    assert response.data["coalescing"]["coalescing_ratio"] == 0.75
+    assert set(response.data) == {"cache", "coalescing", "backend"}
+    assert forbidden.status_code == 403
+
+
+def test_blocking_lookups_share_the_osrm_breaker(routing_client):
+    with patch("trips.utils.route_cache", RouteCache(shared_alias=None)), \
+            patch("trips.utils.route_estimator", RouteEstimator(cache_alias=None)), \
+            patch("trips.utils.requests.get", side_effect=ConnectionError("down")) as get:
+        for i in range(8):
+            assert get_route_data(-26.2041 + i * 0.01, 28.0473, -25.7479, 28.2293).estimated
+
+    # The breaker opened after its failure threshold; later routes were not sent to OSRM.
+    assert get.call_count == routing_client.primary.breaker.failure_threshold
+    assert routing_client.primary.breaker.state == "open"
+
+
+def test_background_lookups_are_dropped_when_the_pool_is_full():
+    released = threading.Event()
+
+    def stuck_get(*args, **kwargs):
+        released.wait(5)
+        raise ConnectionError("down")
+
+    with patch("trips.utils.route_cache", RouteCache(shared_alias=None)), \
+            patch("trips.utils.route_estimator", RouteEstimator(cache_alias=None)), \
+            patch("trips.utils.ROUTE_REFINE_MAX_PENDING", 2), \
+            patch("trips.utils.requests.get", side_effect=stuck_get) as get:
+        routes = [get_route_data(-26.2041 + i * 0.01, 28.0473, -25.7479, 28.2293) for i in range(5)]
+        released.set()
+
+    assert all(route.estimated for route in routes)
+    assert get.call_count <= 2
@@ -0,0 +1,54 @@
+import pickle
+
+import pytest
+from trips.models import Trip
+from trips.route_result import RouteResult
+
+
+@pytest.mark.parametrize("seconds, expected", [
+    (45.9, "45 sec"),
+    (754.0, "12 min"),
+    (3600.0, "1 hour 0 min"),
+    (3903.0, "1 hour 5 min 3 sec"),
+    (7380.0, "2 hours 3 min"),
+])
+def test_format_duration(seconds, expected):
+    assert RouteResult(1000.0, seconds).format_duration() == expected
+
+
+def test_round_trips_through_tuple_and_pickle():
+    route = RouteResult(12345.6, 789.0, estimated=True)
+    assert RouteResult.from_tuple(route.to_tuple()) == route
+    assert pickle.loads(pickle.dumps(route)) == route
+    assert not hasattr(route, "__dict__")
+
+
+def test_fare_uses_unrounded_route():
+    trip = Trip(vehicle_type="Bakkie")
+    route = RouteResult(10004.0, 1250.0)  # "20 min" when formatted, 20.83 min exactly
+    assert trip.calculate_route_fare(route) == trip.calculate_fare(10.004, 1250.0 / 60.0)
+    assert route.as_dict() == {"distance_km": 10.0, "duration": "20 min"}
+
+
+def test_trip_stores_route_once():
+    trip = Trip(vehicle_type="Bakkie")
+    assert trip.stored_route() is None
+
+    trip.set_route(RouteResult(12340.0, 1290.0, polyline="_p~iF~ps|U_ulLnnqC"))
+
+    assert (trip.route_distance_km, trip.route_duration_sec) == (12.34, 1290.0)
+    assert trip.stored_route() == RouteResult(12340.0, 1290.0, polyline="_p~iF~ps|U_ulLnnqC")
+
+
+def test_polyline_survives_the_shared_cache_and_osrm_parsing():
+    route = RouteResult.from_osrm({"distance": 1.0, "duration": 2.0, "geometry": "abc"})
+    assert route.polyline == "abc"
+    assert RouteResult.from_tuple(route.to_tuple()) == route
+    assert RouteResult.from_osrm({"distance": 1.0, "duration": 2.0}).to_tuple() == (1.0, 2.0, False)
+
+
+def test_stored_estimate_stays_marked_as_estimated():
+    trip = Trip(vehicle_type="Bakkie")
+    trip.set_route(RouteResult(12340.0, 1290.0, estimated=True))
+    assert trip.route_estimated
+    assert trip.stored_route().estimated
@@ -0,0 +1,75 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+from trips.route_cache import RouteCache
+from trips.route_result import RouteResult
+from trips.singleflight import SingleFlight
+from trips.utils import get_route_data_async
+
+
+@pytest.mark.asyncio
+async def test_concurrent_callers_share_one_execution():
+    flights = SingleFlight()
+    started = 0
+
+    async def slow():
+        nonlocal started
+        started += 1
+        await asyncio.sleep(0.01)
+        return started
+
+    results = await asyncio.gather(*(flights.do("a", slow) for _ in range(5)), flights.do("b", slow))
+
+    assert results[:5] == [results[0]] * 5
+    assert started == 2
+    assert flights.stats() == {
+        "in_flight": 0, "calls": 6, "executions": 2, "coalesced": 4, "coalescing_ratio": 0.6667,
+    }
+    # Finished calls are not remembered.
+    await flights.do("a", slow)
+    assert started == 3
+
+
+@pytest.mark.asyncio
+async def test_errors_reach_every_waiter_and_cancellation_does_not_spread():
+    flights = SingleFlight()
+
+    async def boom():
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream failed")
+
+    results = await asyncio.gather(flights.do("a", boom), flights.do("a", boom), return_exceptions=True)
+    assert [type(r) for r in results] == [ValueError, ValueError]
+
+    async def value():
+        await asyncio.sleep(0.02)
+        return 42
+
+    first = asyncio.create_task(flights.do("b", value))
+    second = asyncio.create_task(flights.do("b", value))
+    await asyncio.sleep(0)
+    first.cancel()
+    assert await second == 42
+
+
+@pytest.mark.asyncio
+async def test_identical_route_lookups_hit_osrm_once():
+    calls = []
+
+    async def route(*args):
+        calls.append(args)
+        await asyncio.sleep(0.01)
+        return {"distance": 12340.0, "duration": 1290.0}
+
+    with patch("trips.utils.routing_client.route", side_effect=route), \
+            patch("trips.utils.route_cache", RouteCache(shared_alias=None)), \
+            patch("trips.utils.route_flights", SingleFlight()) as flights:
+        # Pickups a few metres apart round to the same key.
+        results = await asyncio.gather(*(
+            get_route_data_async(-26.20411 + i * 1e-6, 28.0473, -25.7479, 28.2293) for i in range(10)
+        ))
+
+    assert results == [RouteResult(12340.0, 1290.0)] * 10
+    assert len(calls) == 1
+    assert flights.stats()["coalesced"] == 9
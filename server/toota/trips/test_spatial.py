@@ -0,0 +1,66 @@
+from trips.spatial import DriverGridIndex
+
+# Sandton and Lagos Island are far enough apart to never share a cell.
+SANDTON = (-26.1076, 28.0567)
+LAGOS = (6.4541, 3.3947)
+
+
+def test_nearby_returns_only_drivers_in_surrounding_cells():
+    index = DriverGridIndex(cell_size_deg=0.05)
+    index.update("near", SANDTON[0] + 0.01, SANDTON[1] + 0.01, vehicle_type="Bakkie")
+    index.update("far", *LAGOS, vehicle_type="Bakkie")
+
+    ids = [driver_id for driver_id, _, _ in index.nearby(*SANDTON, radius_km=50)]
+    assert ids == ["near"]
+
+
+def test_update_moves_driver_between_cells():
+    index = DriverGridIndex(cell_size_deg=0.05)
+    index.update("d1", *SANDTON)
+    index.update("d1", *LAGOS)
+
+    assert len(index) == 1
+    assert index.nearby(*SANDTON, radius_km=10) == []
+    assert index.nearby(*LAGOS, radius_km=10) == [("d1", LAGOS[0], LAGOS[1])]
+
+
+def test_unavailable_driver_is_dropped():
+    index = DriverGridIndex()
+    index.update("d1", *SANDTON)
+    index.update("d1", *SANDTON, is_available=False)
+    assert len(index) == 0
+
+
+def test_vehicle_type_filter():
+    index = DriverGridIndex()
+    index.update("bakkie", *SANDTON, vehicle_type="Bakkie")
+    index.update("truck", *SANDTON, vehicle_type="8 ton Truck")
+
+    ids = [driver_id for driver_id, _, _ in index.nearby(*SANDTON, 5, vehicle_types=["Bakkie"])]
+    assert ids == ["bakkie"]
+
+
+def test_warm_replaces_contents():
+    index = DriverGridIndex()
+    index.update("stale", *LAGOS)
+    assert index.needs_refresh()
+
+    index.warm([("fresh", SANDTON[0], SANDTON[1], "Bakkie"), ("no-gps", None, None, "Bakkie")])
+
+    assert not index.needs_refresh()
+    assert len(index) == 1
+    assert index.nearby(*SANDTON, 5) == [("fresh", SANDTON[0], SANDTON[1])]
+
+
+def test_warm_region_only_replaces_cells_around_the_point():
+    index = DriverGridIndex(refresh_seconds=60)
+    index.update("lagos", *LAGOS)
+    index.update("gone", SANDTON[0] + 0.01, SANDTON[1])  # no longer available in the database
+    assert index.region_needs_refresh(*SANDTON, 50)
+
+    index.warm_region(*SANDTON, 50, [("fresh", SANDTON[0], SANDTON[1], "Bakkie"), ("far", *LAGOS, "Bakkie")])
+
+    assert not index.region_needs_refresh(*SANDTON, 50)
+    assert index.region_needs_refresh(*LAGOS, 50)
+    assert index.nearby(*SANDTON, 5) == [("fresh", SANDTON[0], SANDTON[1])]
+    assert [driver_id for driver_id, _, _ in index.nearby(*LAGOS, 5)] == ["lagos"]
@@ -0,0 +1,90 @@
+from unittest.mock import patch
+
+import pytest
+from trips.surge import (
+    InMemorySurgeCounters, RedisSurgeCounters, SurgeEngine, cell_for, current_multiplier, multiplier_for,
+)
+
+PICKUP = (-26.2041, 28.0473)
+NOW = 1_700_000_000.0
+
+
+@pytest.fixture(params=["memory", "redis"])
+def engine(request):
+    if request.param == "memory":
+        counters = InMemorySurgeCounters(slots=10)
+    else:
+        fakeredis = pytest.importorskip("fakeredis")
+        counters = RedisSurgeCounters(fakeredis.FakeRedis(), slots=10, bucket_seconds=30)
+    return SurgeEngine(counters, window_seconds=300, bucket_seconds=30, sensitivity=0.5, max_multiplier=2.5,
+                       min_demand=3)
+
+
+def test_multiplier_for_ratio():
+    assert multiplier_for(0, 0) == 1.0
+    assert multiplier_for(2, 0, min_demand=3) == 1.0
+    assert multiplier_for(3, 0, sensitivity=0.5, min_demand=3) == 2.0  # no drivers counts as one
+    assert multiplier_for(2, 4, min_demand=1) == 1.0
+    assert multiplier_for(4, 2, sensitivity=0.5, min_demand=1) == 1.5
+    assert multiplier_for(7, 3, sensitivity=0.5, min_demand=1) == 1.6  # 1.666 rounds down to a 0.1 step
+    assert multiplier_for(100, 1, max_multiplier=2.5) == 2.5
+
+
+def test_a_single_request_without_drivers_does_not_surge(engine):
+    engine.record_request(*PICKUP, now=NOW)
+    assert engine.multiplier(*PICKUP, now=NOW) == 1.0
+
+
+def test_requests_without_drivers_surge_gradually_and_locally(engine):
+    for _ in range(3):
+        engine.record_request(*PICKUP, now=NOW)
+    assert engine.multiplier(*PICKUP, now=NOW) == 2.0
+    for _ in range(3):
+        engine.record_request(*PICKUP, now=NOW)
+    assert engine.multiplier(*PICKUP, now=NOW) == 2.5
+    assert engine.multiplier(-25.7479, 28.2293, now=NOW) == 1.0
+
+
+def test_drivers_in_neighbouring_cells_count_as_supply(engine):
+    for _ in range(4):
+        engine.record_request(*PICKUP, now=NOW)
+    # Just across the cell border, about 2 km away.
+    engine.record_driver("d1", PICKUP[0] + 0.02, PICKUP[1], now=NOW)
+    engine.record_driver("d2", PICKUP[0], PICKUP[1] - 0.02, now=NOW)
+    # Two cells away: too far to count.
+    engine.record_driver("d3", PICKUP[0] + 0.05, PICKUP[1], now=NOW)
+    assert engine.cell_counts(cell_for(*PICKUP), engine._epoch(NOW)) == (4, 2)
+    assert engine.multiplier(*PICKUP, now=NOW) == 1.5
+
+
+def test_driver_pings_count_once_per_bucket(engine):
+    for _ in range(5):
+        engine.record_driver("d1", *PICKUP, now=NOW)
+    engine.record_driver("d2", *PICKUP, now=NOW)
+    for _ in range(4):
+        engine.record_request(*PICKUP, now=NOW)
+    assert engine.cell_counts(cell_for(*PICKUP), engine._epoch(NOW)) == (4, 2)
+    assert engine.multiplier(*PICKUP, now=NOW) == 1.5
+
+
+def test_demand_slides_out_of_the_window(engine):
+    engine.record_driver("d1", *PICKUP, now=NOW)
+    for _ in range(3):
+        engine.record_request(*PICKUP, now=NOW)
+    cell = cell_for(*PICKUP)
+    later = NOW + 300
+    engine.record_driver("d1", *PICKUP, now=later)
+    assert engine.cell_counts(cell, engine._epoch(later)) == (0, 1)
+    assert engine.multiplier(*PICKUP, now=later) == 1.0
+
+
+def test_current_multiplier_keeps_peak_floor(engine):
+    with patch("trips.surge.get_surge_engine", return_value=engine), \
+            patch("trips.surge.is_peak_hour_or_festive", return_value=True):
+        assert current_multiplier(*PICKUP) == 1.5
+        for _ in range(6):
+            engine.record_request(*PICKUP)
+        assert current_multiplier(*PICKUP) == 2.5
+    with patch("trips.surge.get_surge_engine", return_value=engine), \
+            patch("trips.surge.is_peak_hour_or_festive", return_value=False):
+        assert current_multiplier(-25.7479, 28.2293) == 1.0
@@ -0,0 +1,108 @@
+import os
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from trips.distance import haversine_km
+from trips.osrm import AsyncRoutingClient
+from trips.route_result import RouteResult
+from trips.utils import get_route_data
+from trips.zones import ZoneMatrix, _MatrixHolder, build_matrix
+
+ZONES = [
+    ("city-deep", -26.2180, 28.0686, 3.0),
+    ("kempton-park", -26.1000, 28.2300, 3.0),
+    ("soweto", -26.2485, 27.8540, 5.0),
+]
+
+
+async def local_osrm(calls):
+    """Table stand-in: road distance is 1.3x straight line at 40 km/h; Soweto -> City Deep is unroutable."""
+    async def table(request):
+        points = [tuple(map(float, p.split(","))) for p in request.match_info["coordinates"].split(";")]
+        sources = [points[int(i)] for i in request.query["sources"].split(";")]
+        destinations = [points[int(i)] for i in request.query["destinations"].split(";")]
+        calls.append((len(sources), len(destinations)))
+        distances = [
+            [float(haversine_km(s_lat, s_lon, [d_lat], [d_lon])[0]) * 1300 for d_lon, d_lat in destinations]
+            for s_lon, s_lat in sources
+        ]
+        distances = [
+            [None if (s[1], d[1]) == (ZONES[2][1], ZONES[0][1]) else value for d, value in zip(destinations, row)]
+            for s, row in zip(sources, distances)
+        ]
+        durations = [[None if v is None else v / 1000 / 40 * 3600 for v in row] for row in distances]
+        return web.json_response({"code": "Ok", "distances": distances, "durations": durations})
+
+    app = web.Application()
+    app.router.add_get("/table/v1/driving/{coordinates}", table)
+    server = TestServer(app)
+    await server.start_server()
+    return server
+
+
+@pytest_asyncio.fixture
+async def built_matrix():
+    calls = []
+    server = await local_osrm(calls)
+    client = AsyncRoutingClient(base_url=str(server.make_url("")))
+    try:
+        matrix = await build_matrix(ZONES, client, chunk=2)
+    finally:
+        await client.close()
+        await server.close()
+    assert calls == [(2, 2), (2, 1), (1, 2), (1, 1)]
+    return matrix
+
+
+@pytest.mark.asyncio
+async def test_build_matrix_routes_every_pair_in_blocks(built_matrix):
+    matrix = built_matrix
+    assert matrix.matrix.shape == (2, 3, 3)
+    assert matrix.matrix.dtype == np.float32
+    assert np.isnan(matrix.matrix[0, 2, 0])
+    assert matrix.matrix[0, 0, 1] == pytest.approx(
+        haversine_km(ZONES[0][1], ZONES[0][2], [ZONES[1][1]], [ZONES[1][2]])[0] * 1300, rel=1e-6,
+    )
+
+
+@pytest.mark.asyncio
+async def test_lookup_matches_points_inside_zones(built_matrix):
+    matrix = built_matrix
+    route = matrix.lookup(-26.2200, 28.0700, -26.1010, 28.2290)
+    assert isinstance(route, RouteResult)
+    assert route.distance_m == pytest.approx(float(matrix.matrix[0, 0, 1]))
+    assert matrix.lookup(-26.2200, 28.0700, -26.2190, 28.0690) is None  # same zone
+    assert matrix.lookup(-26.2200, 28.0700, -25.7479, 28.2293) is None  # Pretoria is not a zone
+    assert matrix.lookup(-26.2485, 27.8540, -26.2180, 28.0686) is None  # unroutable pair
+
+
+@pytest.mark.asyncio
+async def test_saved_matrix_is_memory_mapped_and_reloaded_on_rebuild(built_matrix, tmp_path):
+    path = str(tmp_path / "zone_matrix")
+    holder = _MatrixHolder(path=path, check_seconds=0)
+    assert holder.get() is None
+
+    built_matrix.save(path)
+    loaded = holder.get()
+    assert isinstance(loaded.matrix, np.memmap)
+    assert loaded.ids == ["city-deep", "kempton-park", "soweto"]
+    assert holder.get() is loaded
+
+    smaller = ZoneMatrix(loaded.ids[:2], loaded.lats[:2], loaded.lons[:2], loaded.radii_km[:2],
+                         np.array(loaded.matrix[:, :2, :2]))
+    smaller.save(path)
+    os.utime(f"{path}.npy", (1, 1))
+    assert len(holder.get()) == 2
+
+
+@pytest.mark.asyncio
+async def test_get_route_data_uses_the_matrix_before_routing(built_matrix):
+    with patch("trips.utils.get_zone_matrix", return_value=built_matrix), \
+            patch("trips.utils.requests.get") as get:
+        route = get_route_data(-26.2200, 28.0700, -26.1010, 28.2290)
+    get.assert_not_called()
+    assert route.distance_m == pytest.approx(float(built_matrix.matrix[0, 0, 1]))
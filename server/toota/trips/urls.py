@@ -1,6 +1,8 @@
 from django.urls import path
 from .views import (
     CheckTripStatusView,
+    FareQuoteView,
+    RoutingStatsView,
     WebSocketAvailableDriversDocView,
     WebSocketTripRequestDocView,
     WebSocketDriverTripStatusView,
@@ -9,6 +11,8 @@ from .views import (
 
 urlpatterns = [
     path("<uuid:trip_id>/status/", CheckTripStatusView.as_view(), name="update-trip-status"),
+    path("quote/", FareQuoteView.as_view(), name="fare-quote"),
+    path("routing/stats/", RoutingStatsView.as_view(), name="routing-stats"),
 
     # WebSocket Documentation Views
     path("docs/available-drivers/", WebSocketAvailableDriversDocView.as_view(), name="websocket-available-drivers"),
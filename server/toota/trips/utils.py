@@ -1,133 +1,422 @@
 from authentication.models import Driver
 import decimal
-import datetime
+import asyncio
+import heapq
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from django.conf import settings
+from django.db import DatabaseError
 from dotenv import load_dotenv
+import redis
 import requests
+from .spatial import driver_index
+from .location_store import get_location_store
+from .distance import CandidateCoordinates, bounding_box
+from .driver_cards import get_driver_cards
+from .presence import DRIVER_STALE_AFTER_SECONDS, get_presence
+from .route_cache import route_cache
+from .route_result import NO_ROUTE, RouteResult
+from .singleflight import SingleFlight
+from .zones import get_zone_matrix
+from .estimator import route_estimator
+from .breaker import OPEN
+from .osrm import OSRM_BASE_URL, OSRM_TIMEOUT_SECONDS, RoutingUnavailable, routing_client
 load_dotenv()
 
-def find_nearest_drivers(pickup_lat, pickup_lon, vehicle_type, limit=20):
-    from .serializers import FindDriversSerializer
-    from geopy.distance import geodesic
+logger = logging.getLogger(__name__)
+
+# "grid" uses the per-process grid index, "geo" queries the shared Redis GEO store,
+# "db" pushes a bounding box for the largest radius into the Driver query.
+DRIVER_MATCHING_MODE = getattr(settings, 'DRIVER_MATCHING_MODE', 'grid')
+
+# Search radii (km) used when matching drivers to a pickup point.
+SEARCH_RADII_KM = [5, 10, 20, 30, 40, 50]
+
+# In-flight OSRM route lookups, keyed like the route cache.
+route_flights = SingleFlight()
+
+# How long a route lookup waits for OSRM before answering with the offline
+# estimate. A slower OSRM reply still lands in the route cache for the next call.
+ROUTE_FIRST_ANSWER_SECONDS = getattr(settings, 'ROUTE_FIRST_ANSWER_SECONDS', 0.15)
+
+# Background OSRM lookups for the blocking get_route_data, keyed like the route cache.
+_route_refinements = {}
+_route_refinements_lock = threading.Lock()
+_route_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'ROUTE_REFINE_WORKERS', 4), thread_name_prefix="route-refine"
+)
+# Running plus queued background lookups; past this, new routes are answered with the estimate only.
+ROUTE_REFINE_MAX_PENDING = getattr(settings, 'ROUTE_REFINE_MAX_PENDING', 32)
+
+
+def _refresh_driver_region(pickup_lat, pickup_lon):
     """
-    Find a list of available drivers near the given pickup location.
-    Uses geopy to calculate real distances.
+    Re-sync the grid cells around a pickup (out to the largest search radius)
+    with one bounding-box query, if they were not synced recently.
+    """
+    radius_km = SEARCH_RADII_KM[-1]
+    if not driver_index.region_needs_refresh(pickup_lat, pickup_lon, radius_km):
+        return
+    min_lat, max_lat, min_lon, max_lon = driver_index.region_bounds(pickup_lat, pickup_lon, radius_km)
+    driver_index.warm_region(pickup_lat, pickup_lon, radius_km, Driver.objects.filter(
+        is_available=True,
+        latitude__range=(min_lat, max_lat),
+        longitude__range=(min_lon, max_lon),
+    ).values_list("id", "latitude", "longitude", "vehicle_type"))
+
+
+def _bounding_box_candidates(pickup_lat, pickup_lon, radius_km, vehicle_type):
     """
-    if not vehicle_type:
-        available_drivers = Driver.objects.filter(is_available=True)  # Get all available drivers
+    (driver_id, lat, lon) rows for available drivers inside the bounding box of
+    radius_km around the pickup. Served by the Driver composite index.
+    """
+    min_lat, max_lat, min_lon, max_lon = bounding_box(pickup_lat, pickup_lon, radius_km)
+    candidates = Driver.objects.filter(
+        is_available=True,
+        latitude__range=(min_lat, max_lat),
+        longitude__range=(min_lon, max_lon),
+    )
+    if vehicle_type:
+        candidates = candidates.filter(vehicle_type__in=vehicle_type)
+    return candidates.values_list("id", "latitude", "longitude")
+
+
+def _ring_candidates(mode, pickup_lat, pickup_lon, radius_km, vehicle_type, limit):
+    """
+    Nearest `limit` (driver_id, distance_km) pairs within radius_km of the
+    pickup, taken from the candidate source for the given matching mode.
+    """
+    if mode == "geo":
+        matches = get_location_store().search(pickup_lat, pickup_lon, radius_km, vehicle_type, count=limit)
+        return [(driver_id, distance) for driver_id, _, _, distance in matches]
+
+    if mode == "db":
+        rows = (
+            (str(driver_id), lat, lon) for driver_id, lat, lon in
+            _bounding_box_candidates(pickup_lat, pickup_lon, radius_km, vehicle_type)
+        )
     else:
-        available_drivers = Driver.objects.filter(is_available=True, vehicle_type__in=vehicle_type)  # Get available drivers
-    drivers_list = []
-    pickup_location = (float(pickup_lat), float(pickup_lon))
-
-    for driver in available_drivers:
-        driver_location = (driver.latitude, driver.longitude)
-        distance = geodesic(pickup_location, driver_location).km  # Calculate distance in KM
-        
-        for radius in [5, 10, 20, 30, 40, 50]:
-            if distance <= radius:  # Only include drivers within the radius
-                drivers_list.append({
-                    "driver": FindDriversSerializer(driver).data,
-                    "distance": round(distance, 2)
-                })
-
-    # Sort drivers by nearest distance and limit results
-    drivers_list = sorted(drivers_list, key=lambda x: x["distance"])[:limit]
-
-    # If no driver was found within the radius, serialize all available drivers.
+        _refresh_driver_region(pickup_lat, pickup_lon)
+        rows = driver_index.nearby(pickup_lat, pickup_lon, radius_km, vehicle_type)
+    candidates = CandidateCoordinates.from_rows(rows)
+    return candidates.nearest(pickup_lat, pickup_lon, limit, max_distance_km=radius_km)
+
+
+def _fresh_only(ring):
+    """Drop drivers whose last GPS ping is older than DRIVER_STALE_AFTER_SECONDS."""
+    if not DRIVER_STALE_AFTER_SECONDS or not ring:
+        return ring
+    try:
+        fresh = get_presence().fresh([driver_id for driver_id, _ in ring])
+    except redis.RedisError as e:
+        logger.warning(f"Driver presence unavailable, skipping freshness filter: {e}")
+        return ring
+    return [(driver_id, distance) for driver_id, distance in ring if driver_id in fresh]
+
+
+def _fresh_ring(mode, pickup_lat, pickup_lon, radius_km, vehicle_type, limit):
+    """
+    Nearest `limit` fresh (driver_id, distance_km) pairs within radius_km.
+    Stale drivers are filtered before the cut: while they crowd out the
+    nearest `limit`, the ring is fetched again with twice the count.
+    """
+    fetch = limit
+    while True:
+        ring = _ring_candidates(mode, pickup_lat, pickup_lon, radius_km, vehicle_type, fetch)
+        fresh = _fresh_only(ring)
+        if len(fresh) >= limit or len(ring) < fetch:
+            return fresh[:limit]
+        fetch *= 2
+
+
+def _nearest_in_rings(pickup_lat, pickup_lon, vehicle_type, limit, mode):
+    """
+    Expanding-ring search over SEARCH_RADII_KM. Stops at the first radius that
+    already holds `limit` fresh drivers and returns {driver_id: distance_km}
+    for the nearest ones, kept in a bounded heap.
+    """
+    nearest = []  # max-heap of (-distance, driver_id), never larger than limit
+    seen = set()
+
+    for radius in SEARCH_RADII_KM:
+        try:
+            ring = _fresh_ring(mode, pickup_lat, pickup_lon, radius, vehicle_type, limit)
+        except redis.RedisError as e:
+            logger.warning(f"Driver location store unavailable, falling back to grid index: {e}")
+            mode = "grid"
+            ring = _fresh_ring(mode, pickup_lat, pickup_lon, radius, vehicle_type, limit)
+
+        for driver_id, distance in ring:
+            if driver_id in seen:
+                continue
+            seen.add(driver_id)
+            if len(nearest) < limit:
+                heapq.heappush(nearest, (-distance, driver_id))
+            elif distance < -nearest[0][0]:
+                heapq.heapreplace(nearest, (-distance, driver_id))
+
+        # Every driver closer than `radius` has been seen, so a full heap is final.
+        if len(nearest) >= limit:
+            break
+
+    return {driver_id: -negative_distance for negative_distance, driver_id in nearest}
+
+
+def _fresh_fallback(vehicle_type, limit):
+    """
+    Ids of the `limit` most recently active available drivers that are still
+    pinging, over-fetching like _fresh_ring while stale drivers crowd the top.
+    """
+    candidates = Driver.objects.filter(is_available=True)
+    if vehicle_type:
+        candidates = candidates.filter(vehicle_type__in=vehicle_type)
+    candidates = candidates.order_by("-updated_at").values_list("id", flat=True)
+    fetch = limit
+    while True:
+        recent = [(str(driver_id), None) for driver_id in candidates[:fetch]]
+        fresh = [driver_id for driver_id, _ in _fresh_only(recent)]
+        if len(fresh) >= limit or len(recent) < fetch:
+            return fresh[:limit]
+        fetch *= 2
+
+
+def find_nearest_drivers(pickup_lat, pickup_lon, vehicle_type, limit=20, mode=None):
+    """
+    Find a list of available drivers near the given pickup location.
+
+    Searches rings of SEARCH_RADII_KM outwards until `limit` drivers are found.
+    Candidates come from the grid index (mode="grid"), the Redis GEO store
+    (mode="geo") or a bounding-box query (mode="db"). Driver payloads are
+    served from the driver card cache.
+    If nobody is within the largest radius, at most `limit` available
+    drivers are returned with a distance of None.
+    """
+    distances = _nearest_in_rings(pickup_lat, pickup_lon, vehicle_type, limit, mode or DRIVER_MATCHING_MODE)
+    available_ids = Driver.objects.filter(is_available=True, id__in=list(distances))
+    if vehicle_type:
+        available_ids = available_ids.filter(vehicle_type__in=vehicle_type)
+    available_ids = [str(driver_id) for driver_id in available_ids.values_list("id", flat=True)]
+    cards = get_driver_cards(available_ids)
+
+    drivers_list = sorted(
+        (
+            {"driver": cards[driver_id], "distance": round(distances[driver_id], 2)}
+            for driver_id in available_ids
+        ),
+        key=lambda x: x["distance"]
+    )
+
+    # If no driver was found within the radius, return a capped list of
+    # the most recently active available drivers.
     if not drivers_list:
-        drivers_list = [
-            {"driver": FindDriversSerializer(driver).data, "distance": None}
-            for driver in available_drivers
-        ]
-    
+        fallback_ids = _fresh_fallback(vehicle_type, limit)
+        cards = get_driver_cards(fallback_ids)
+        drivers_list = [{"driver": cards[driver_id], "distance": None} for driver_id in fallback_ids]
+
     return drivers_list
 
-def get_route_data(pickup_lat, pickup_lon, dest_lat, dest_lon):
+def get_route_data(pickup_lat, pickup_lon, dest_lat, dest_lon, vehicle_type=None):
     """
-    Call OSRM's public API to calculate route data between two coordinates.
-    Returns a dict with 'distance_km' (rounded to 2 decimals) and 'duration' (formatted as 'X min' or 'X sec').
+    Route between two coordinates as a RouteResult. Trips between two known
+    zones come from the precomputed zone matrix; otherwise the route cache is
+    used when the same (rounded) pickup/destination pair was routed recently.
+    OSRM is asked in the background and waited on for at most
+    ROUTE_FIRST_ANSWER_SECONDS; until it answers, the offline estimate is returned.
     """
-    url = f"http://router.project-osrm.org/route/v1/driving/{pickup_lon},{pickup_lat};{dest_lon},{dest_lat}?overview=false"
+    route = _zone_route(pickup_lat, pickup_lon, dest_lat, dest_lon)
+    if route is not None:
+        return route
+    key = route_cache.key(pickup_lat, pickup_lon, dest_lat, dest_lon)
+    route = route_cache.get(key)
+    if route is None:
+        refine = _refine_route(key, pickup_lat, pickup_lon, dest_lat, dest_lon)
+        try:
+            route = refine.result(timeout=ROUTE_FIRST_ANSWER_SECONDS) if refine is not None else None
+        except FutureTimeoutError:
+            route = None
+        if route is None:
+            # Estimates are not cached so the next call picks up the OSRM route.
+            return _estimated_route(pickup_lat, pickup_lon, dest_lat, dest_lon, vehicle_type)
+    return route
+
+
+def _refine_route(key, pickup_lat, pickup_lon, dest_lat, dest_lon):
+    """
+    Future for the OSRM lookup of `key`, started on the refine pool unless one
+    is already running. None while OSRM's breaker is open or the pool is full.
+    """
+    with _route_refinements_lock:
+        future = _route_refinements.get(key)
+        if future is None:
+            if routing_client.primary.breaker.state == OPEN:
+                return None
+            if len(_route_refinements) >= ROUTE_REFINE_MAX_PENDING:
+                logger.warning(f"{len(_route_refinements)} route lookups pending, answering with the estimate only")
+                return None
+            future = _route_executor.submit(_fetch_and_cache_route, key, pickup_lat, pickup_lon, dest_lat, dest_lon)
+            _route_refinements[key] = future
+            future.add_done_callback(lambda done: _route_refinements.pop(key, None))
+    return future
+
+
+def _fetch_and_cache_route(key, pickup_lat, pickup_lon, dest_lat, dest_lon):
+    route = _fetch_route_data(pickup_lat, pickup_lon, dest_lat, dest_lon)
+    if route is not None:
+        route_cache.set(key, route)
+    return route
+
+
+async def get_route_data_async(pickup_lat, pickup_lon, dest_lat, dest_lon, vehicle_type=None):
+    """
+    Same as get_route_data, but awaits the pooled async OSRM client instead of
+    blocking a thread. Use this from consumers.
+    """
+    route = _zone_route(pickup_lat, pickup_lon, dest_lat, dest_lon)
+    if route is not None:
+        return route
+    key = route_cache.key(pickup_lat, pickup_lon, dest_lat, dest_lon)
+    route = await route_cache.aget(key)
+    if route is None:
+        # Riders requesting the same (rounded) route at the same moment share one OSRM call,
+        # which keeps running (and fills the cache) after the first answer has been given.
+        flight = asyncio.ensure_future(route_flights.do(
+            key, lambda: _fetch_route_data_async(key, pickup_lat, pickup_lon, dest_lat, dest_lon)
+        ))
+        flight.add_done_callback(_retrieve_exception)
+        try:
+            route = await asyncio.wait_for(asyncio.shield(flight), ROUTE_FIRST_ANSWER_SECONDS)
+        except asyncio.TimeoutError:
+            route = None
+        if route is None:
+            return _estimated_route(pickup_lat, pickup_lon, dest_lat, dest_lon, vehicle_type)
+    return route
+
+
+def _retrieve_exception(task):
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning(f"Background route lookup failed: {task.exception()}")
+
+
+async def _fetch_route_data_async(key, pickup_lat, pickup_lon, dest_lat, dest_lon):
+    osrm_route = await routing_client.route(pickup_lat, pickup_lon, dest_lat, dest_lon)
+    if osrm_route is None:
+        return None
+    route = RouteResult.from_osrm(osrm_route)
+    route_estimator.observe(pickup_lat, pickup_lon, dest_lat, dest_lon, route.distance_m)
+    await route_cache.aset(key, route)
+    return route
+
+
+def routing_stats():
+    """Route cache, request coalescing and routing backend counters for this process."""
+    return {"cache": route_cache.stats(), "coalescing": route_flights.stats(), "backend": routing_client.stats()}
+
 
+async def get_trip_route(trip):
+    """
+    The route stored on the trip, routing it only for trips created before
+    routes were stored. A stored estimate is replaced (and saved) once OSRM
+    has answered for the same route.
+    """
+    stored = trip.stored_route()
+    if stored is not None and not stored.estimated:
+        return stored
+    route = await get_route_data_async(
+        trip.pickup_lat, trip.pickup_long, trip.dest_lat, trip.dest_long, trip.vehicle_type
+    )
+    if stored is None:
+        return route
+    if route.estimated:
+        return stored
+    trip.set_route(route)
     try:
-        response = requests.get(url)
-        data = response.json()
+        await trip.asave(update_fields=trip.ROUTE_FIELDS)
+    except DatabaseError as e:
+        logger.warning(f"Could not store the OSRM route for trip {trip.id}: {e}")
+    return route
+
+
+async def get_driver_etas(rider_lat, rider_lon, driver_points, vehicle_type=None):
+    """
+    RouteResult from each (lat, lon) in driver_points to the rider, in the same
+    order. Cached pairs are reused and the rest are resolved with a single OSRM
+    table request; if that fails, individual routes are fetched concurrently.
+    Pairs OSRM cannot route are estimated offline.
+    """
+    routes = [None] * len(driver_points)
+    keys = {}
+    for i, (lat, lon) in enumerate(driver_points):
+        if lat is not None and lon is not None:
+            keys[i] = route_cache.key(lat, lon, rider_lat, rider_lon)
+            routes[i] = await route_cache.aget(keys[i])
+
+    missing = [i for i in keys if routes[i] is None]
+    if missing:
+        table = await routing_client.table([driver_points[i] for i in missing], [(rider_lat, rider_lon)])
+        if table is not None:
+            for row, i in enumerate(missing):
+                duration, distance = table["durations"][row][0], table["distances"][row][0]
+                if duration is not None and distance is not None:
+                    routes[i] = RouteResult(float(distance), float(duration))
+                    await route_cache.aset(keys[i], routes[i])
+                else:
+                    routes[i] = _estimated_route(*driver_points[i], rider_lat, rider_lon, vehicle_type)
+        else:
+            # The client's semaphore bounds how many of these run at once.
+            fetched = await asyncio.gather(*(
+                get_route_data_async(*driver_points[i], rider_lat, rider_lon, vehicle_type) for i in missing
+            ))
+            for i, route in zip(missing, fetched):
+                routes[i] = route
+
+    return [route if route is not None else NO_ROUTE for route in routes]
+
 
-        if data.get("code") == "Ok" and "routes" in data and len(data["routes"]) > 0:
-            route = data["routes"][0]
-
-            distance_km = round(float(route["distance"]) / 1000.0, 2)  # Rounded to 2 decimals
-            duration_sec = float(route["duration"])  # Convert duration to seconds
-            
-            # Format duration to be human-readable
-            if duration_sec < 60:
-                duration_str = f"{int(duration_sec)} sec"
-            elif duration_sec < 3600:
-                duration_str = f"{int(duration_sec // 60)} min"
-            else:
-                hours = int(duration_sec // 3600)
-                minutes = int((duration_sec % 3600) // 60)
-                seconds = int(duration_sec % 60)
-                duration_str = f"{hours} hour{'s' if hours > 1 else ''} {minutes} min"
-                if seconds > 0:
-                    duration_str += f" {seconds} sec"
-
-            return {"distance_km": distance_km, "duration": duration_str}
+def _zone_route(pickup_lat, pickup_lon, dest_lat, dest_lon):
+    matrix = get_zone_matrix()
+    if matrix is None or None in (pickup_lat, pickup_lon, dest_lat, dest_lon):
+        return None
+    return matrix.lookup(float(pickup_lat), float(pickup_lon), float(dest_lat), float(dest_lon))
 
+
+def _estimated_route(pickup_lat, pickup_lon, dest_lat, dest_lon, vehicle_type=None):
+    """Offline estimate as a RouteResult; NO_ROUTE only if a coordinate is missing."""
+    if None in (pickup_lat, pickup_lon, dest_lat, dest_lon):
+        return NO_ROUTE
+    distance_m, duration_sec = route_estimator.estimate(pickup_lat, pickup_lon, dest_lat, dest_lon, vehicle_type)
+    return RouteResult(distance_m, duration_sec, estimated=True)
+
+
+def _fetch_route_data(pickup_lat, pickup_lon, dest_lat, dest_lon):
+    """
+    Call OSRM's public API to calculate route data between two coordinates.
+    Returns a RouteResult, or None if OSRM could not be reached, its breaker
+    is open or it found no route. Shares the async client's primary breaker.
+    """
+    breaker = routing_client.primary.breaker
+    if not breaker.allow():
+        return None
+    url = f"{OSRM_BASE_URL}/route/v1/driving/{pickup_lon},{pickup_lat};{dest_lon},{dest_lat}?overview=false"
+
+    started = time.monotonic()
+    try:
+        response = requests.get(url, timeout=OSRM_TIMEOUT_SECONDS)
+        if response.status_code >= 500:
+            raise RoutingUnavailable(f"HTTP {response.status_code}")
+        data = response.json()
     except Exception as e:
-        print(f"Error calling OSRM API: {e}")
-
-    return {"distance_km": 0.0, "duration": "0 min"}
-
-
-
-def calculate_easter(year):
-    """
-    Calculate Easter for the given year (Gregorian calendar)
-    using the Anonymous Gregorian algorithm.
-    Returns a datetime.date object.
-    """
-    a = year % 19
-    b = year // 100
-    c = year % 100
-    d = b // 4
-    e = b % 4
-    f = (b + 8) // 25
-    g = (b - f + 1) // 3
-    h = (19 * a + b - d - g + 15) % 30
-    i = c // 4
-    k = c % 4
-    l = (32 + 2 * e + 2 * i - h - k) % 7
-    m = (a + 11 * h + 22 * l) // 451
-    month = (h + l - 7 * m + 114) // 31  # Month: 3=March, 4=April
-    day = ((h + l - 7 * m + 114) % 31) + 1
-    return datetime.date(year, month, day)
-
-def is_peak_hour_or_festive(dt):
-    """
-    Check if the given datetime (dt) is during peak hours
-    (6 PM to 6 AM) or falls on a festive day (New Year, Christmas, or Easter).
-    
-    Returns True if any condition is met, otherwise False.
-    """
-    # Check fixed-date festive days: New Year's Day and Christmas.
-    fixed_holidays = [
-        (1, 1),    # New Year's Day
-        (12, 25)   # Christmas Day
-    ]
-    if (dt.month, dt.day) in fixed_holidays:
-        return True
-
-    # Check if it's Easter.
-    easter_date = calculate_easter(dt.year)
-    if dt.date() == easter_date:
-        return True
-
-    # Check for peak hours: from 6 PM (18:00) to 9 AM (09:00).
-    if dt.hour >= 18 or dt.hour <= 9:
-        return True
-
-    return False
+        breaker.record_failure()
+        logger.warning(f"OSRM route request to {OSRM_BASE_URL} failed: {e!r}")
+        return None
+    breaker.record_success(time.monotonic() - started)
+
+    if data.get("code") == "Ok" and "routes" in data and len(data["routes"]) > 0:
+        route = RouteResult.from_osrm(data["routes"][0])
+        route_estimator.observe(pickup_lat, pickup_lon, dest_lat, dest_lon, route.distance_m)
+        return route
+    return None
 
 
 def convert_decimals(obj):
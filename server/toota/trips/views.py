@@ -3,13 +3,15 @@ from dotenv import load_dotenv
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
 from .models import Trip
-from .serializers import CheckTripStatusSerializer
-from .utils import find_nearest_drivers
+from .serializers import CheckTripStatusSerializer, FareQuoteSerializer
+from .utils import find_nearest_drivers, get_route_data, routing_stats
+from .surge import current_multiplier
+from .pricing import quote
 from authentication.models import Driver
 
 load_dotenv()
@@ -35,6 +37,44 @@ class CheckTripStatusView(APIView):
         return Response({"trip_status": trip.status}, status=status.HTTP_200_OK)
 
 
+class FareQuoteView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="Quote the fare for every vehicle type (or the requested ones) before creating a trip.",
+        request_body=FareQuoteSerializer,
+        responses={200: "Route and fares per vehicle type.", 400: "Invalid data."}
+    )
+    def post(self, request):
+        serializer = FareQuoteSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({"error": "Invalid input", "details": serializer.errors},
+                            status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+        route = get_route_data(data["pickup_lat"], data["pickup_lon"], data["dest_lat"], data["dest_lon"])
+        surge = current_multiplier(data["pickup_lat"], data["pickup_lon"])
+
+        return Response({
+            "distance_km": round(route.distance_km, 2),
+            "estimated_time": route.format_duration(),
+            "surge": surge > 1.0,
+            "surge_multiplier": surge,
+            "fares": quote(route, surge, data.get("vehicle_types")),
+        }, status=status.HTTP_200_OK)
+
+
+class RoutingStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    @swagger_auto_schema(
+        operation_description="Route cache, OSRM request coalescing and routing backend counters of the worker "
+                              "that serves the request.",
+        responses={200: "Routing counters for this process."}
+    )
+    def get(self, request):
+        return Response(routing_stats(), status=status.HTTP_200_OK)
+
+
 class WebSocketDocBaseView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -0,0 +1,155 @@
+"""
+Precomputed zone-to-zone routes for the depots, townships and industrial
+areas most freight trips run between.
+
+`python manage.py build_zone_matrix` routes every pair of active zones through
+the OSRM table API and writes two files next to ZONE_MATRIX_PATH:
+
+- `<path>.npy`: float32 array of shape (2, n, n) holding metres and seconds
+  (NaN where OSRM found no route), memory-mapped by every worker;
+- `<path>.json`: the zone ids, centres and radii in matrix order.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .distance import haversine_km
+from .route_result import RouteResult
+
+logger = logging.getLogger(__name__)
+
+ZONE_MATRIX_PATH = str(getattr(settings, 'ZONE_MATRIX_PATH', os.path.join(settings.BASE_DIR, 'zone_matrix')))
+# How often workers check whether a rebuilt matrix has been written.
+ZONE_MATRIX_CHECK_SECONDS = getattr(settings, 'ZONE_MATRIX_CHECK_SECONDS', 60)
+# Sources/destinations per OSRM table request (OSRM's default limit is 100 coordinates).
+ZONE_TABLE_CHUNK = 50
+
+
+class ZoneMatrix:
+    """Zone centres plus the (2, n, n) distance/duration matrix between them."""
+    __slots__ = ("ids", "lats", "lons", "radii_km", "matrix")
+
+    def __init__(self, ids, lats, lons, radii_km, matrix):
+        self.ids = [str(zone_id) for zone_id in ids]
+        self.lats = np.ascontiguousarray(lats, dtype=np.float64)
+        self.lons = np.ascontiguousarray(lons, dtype=np.float64)
+        self.radii_km = np.ascontiguousarray(radii_km, dtype=np.float64)
+        self.matrix = matrix
+
+    def __len__(self):
+        return len(self.ids)
+
+    def zone_for(self, lat, lon):
+        """Index of the nearest zone whose radius covers (lat, lon), or None."""
+        if not len(self):
+            return None
+        distances = haversine_km(lat, lon, self.lats, self.lons)
+        inside = np.flatnonzero(distances <= self.radii_km)
+        if not len(inside):
+            return None
+        return int(inside[np.argmin(distances[inside])])
+
+    def lookup(self, pickup_lat, pickup_lon, dest_lat, dest_lon):
+        """Precomputed route between the zones of both points, or None if either is outside every zone."""
+        origin = self.zone_for(pickup_lat, pickup_lon)
+        if origin is None:
+            return None
+        destination = self.zone_for(dest_lat, dest_lon)
+        # Trips inside one zone are too short for a centre-to-centre route to mean anything.
+        if destination is None or destination == origin:
+            return None
+        distance_m, duration_s = self.matrix[0, origin, destination], self.matrix[1, origin, destination]
+        if np.isnan(distance_m) or np.isnan(duration_s):
+            return None
+        return RouteResult(float(distance_m), float(duration_s))
+
+    def save(self, path=ZONE_MATRIX_PATH):
+        """Write both files via temporary names so readers never see a half-written matrix."""
+        with open(f"{path}.json.tmp", "w") as f:
+            json.dump({
+                "ids": self.ids, "lats": self.lats.tolist(), "lons": self.lons.tolist(),
+                "radii_km": self.radii_km.tolist(), "built_at": timezone.now().isoformat(),
+            }, f)
+        with open(f"{path}.npy.tmp", "wb") as f:
+            np.save(f, np.asarray(self.matrix, dtype=np.float32))
+        os.replace(f"{path}.json.tmp", f"{path}.json")
+        os.replace(f"{path}.npy.tmp", f"{path}.npy")
+
+    @classmethod
+    def load(cls, path=ZONE_MATRIX_PATH, mmap=True):
+        with open(f"{path}.json") as f:
+            meta = json.load(f)
+        matrix = np.load(f"{path}.npy", mmap_mode="r" if mmap else None)
+        if matrix.shape != (2, len(meta["ids"]), len(meta["ids"])):
+            raise ValueError(f"Zone matrix {matrix.shape} does not match {len(meta['ids'])} zones")
+        return cls(meta["ids"], meta["lats"], meta["lons"], meta["radii_km"], matrix)
+
+
+async def build_matrix(zones, client, chunk=ZONE_TABLE_CHUNK):
+    """
+    Route every pair of zones with OSRM table requests of at most chunk x chunk pairs.
+    `zones` is a list of (id, lat, lon, radius_km); pairs OSRM cannot route stay NaN.
+    """
+    zones = list(zones)
+    n = len(zones)
+    matrix = np.full((2, n, n), np.nan, dtype=np.float32)
+    points = [(lat, lon) for _, lat, lon, _ in zones]
+    for src in range(0, n, chunk):
+        for dst in range(0, n, chunk):
+            table = await client.table(points[src:src + chunk], points[dst:dst + chunk])
+            if table is None:
+                logger.warning(f"Zone matrix block {src}:{dst} could not be routed")
+                continue
+            distances = np.array(table["distances"], dtype=np.float64)  # None -> nan
+            durations = np.array(table["durations"], dtype=np.float64)
+            matrix[0, src:src + chunk, dst:dst + chunk] = distances
+            matrix[1, src:src + chunk, dst:dst + chunk] = durations
+    return ZoneMatrix(
+        [zone[0] for zone in zones], [zone[1] for zone in zones], [zone[2] for zone in zones],
+        [zone[3] for zone in zones], matrix,
+    )
+
+
+class _MatrixHolder:
+    """Lazily loads the matrix file and picks up rebuilds by watching its mtime."""
+    def __init__(self, path=ZONE_MATRIX_PATH, check_seconds=ZONE_MATRIX_CHECK_SECONDS):
+        self.path = path
+        self.check_seconds = check_seconds
+        self._matrix = None
+        self._mtime = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.check_seconds:
+            return self._matrix
+        with self._lock:
+            self._checked_at = now
+            try:
+                mtime = os.stat(f"{self.path}.npy").st_mtime
+            except OSError:
+                self._matrix, self._mtime = None, None
+                return None
+            if mtime != self._mtime:
+                try:
+                    self._matrix = ZoneMatrix.load(self.path)
+                    self._mtime = mtime
+                    logger.info(f"Loaded zone matrix with {len(self._matrix)} zones")
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Could not load zone matrix: {e}")
+            return self._matrix
+
+
+_holder = _MatrixHolder()
+
+
+def get_zone_matrix():
+    """The process-wide zone matrix, or None if none has been built."""
+    return _holder.get()